@@ -0,0 +1,168 @@
+import asyncio
+import hashlib
+import math
+import os
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+
+import metrics
+
+# ==============================================================================
+# 🚧 ADMISSION CONTROL (generation only)
+# Gemini quota is the scarce thing, so only requests that are about to call it
+# go through here; cache hits and file-link answers never do. Three checks:
+#   1. token buckets per caller: one per client IP + ChatRequest.token, and one
+#      per client IP worth USERS_PER_IP callers, since the token is whatever
+#      the client sends (rotating it must not buy a fresh bucket). The
+#      pipeline charges every caller before it joins a coalesced flight and
+#      refunds the token unless Gemini answered (cache hit, shed, failure).
+#   2. at most GENERATE_CONCURRENCY generations at once
+#   3. a bounded wait line: if the expected wait already blows the deadline,
+#      or the line is full, we answer 429 + Retry-After right away instead of
+#      letting the request time out into "My brain is having a hiccup!"
+# ==============================================================================
+
+GENERATE_CONCURRENCY = int(os.getenv("GENERATE_CONCURRENCY", "8"))
+GENERATE_QUEUE = int(os.getenv("GENERATE_QUEUE", "32"))
+GENERATE_MAX_WAIT = float(os.getenv("GENERATE_MAX_WAIT", "10"))
+USER_RATE_PER_MIN = float(os.getenv("USER_RATE_PER_MIN", "10"))
+USER_BURST = int(os.getenv("USER_BURST", "5"))
+USERS_PER_IP = int(os.getenv("USERS_PER_IP", "50"))  # a campus NAT puts many students behind one IP
+
+class Overloaded(Exception):
+    def __init__(self, reason, retry_after):
+        super().__init__(f"{reason} (retry after {retry_after}s)")
+        self.reason = reason
+        self.retry_after = max(1, math.ceil(retry_after))
+
+class TokenBucket:
+    def __init__(self, rate_per_s, burst):
+        self.rate = rate_per_s
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+
+    def take(self):
+        """0 if allowed, else seconds until the next token"""
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0
+        return (1 - self.tokens) / self.rate
+
+    def refund(self):
+        """Give back a token whose request was never served"""
+        self.tokens = min(self.burst, self.tokens + 1)
+
+class AdmissionControl:
+    def __init__(self, max_concurrent=GENERATE_CONCURRENCY, max_queue=GENERATE_QUEUE,
+                 max_wait=GENERATE_MAX_WAIT, user_rate_per_min=USER_RATE_PER_MIN,
+                 user_burst=USER_BURST, users_per_ip=USERS_PER_IP, max_users=10000):
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        self.user_rate = user_rate_per_min / 60
+        self.user_burst = user_burst
+        self.users_per_ip = users_per_ip
+        self.max_users = max_users
+
+        self._slots = asyncio.Semaphore(max_concurrent)
+        self._buckets = OrderedDict()
+        self.running = 0
+        self.waiting = 0
+        self.avg_seconds = 5.0  # moving average of one generation, seeds the wait estimate
+        self.stats = {"admitted": 0, "queued": 0, "rate_limited": 0, "shed_queue_full": 0,
+                      "shed_deadline": 0}
+
+    @staticmethod
+    def user_key(token, client_ip):
+        """(client IP, token hash or None). Never keep raw ID tokens around"""
+        return client_ip, hashlib.sha256(token.encode()).hexdigest()[:16] if token else None
+
+    def _bucket(self, key, share=1):
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = TokenBucket(self.user_rate * share, self.user_burst * share)
+            if len(self._buckets) > self.max_users:
+                self._buckets.popitem(last=False)
+        self._buckets.move_to_end(key)
+        return bucket
+
+    def charge(self, user):
+        """Take one token from the caller's buckets (a user_key()); raises Overloaded when
+        rate limited. Returns what to hand back to refund()."""
+        if user is None:
+            return []
+        client_ip, _ = user
+        buckets = [self._bucket(("ip", client_ip), self.users_per_ip), self._bucket(("user", *user))]
+        taken = []
+        for bucket in buckets:
+            retry_after = bucket.take()
+            if retry_after:
+                self.refund(taken)
+                self.stats["rate_limited"] += 1
+                raise Overloaded("rate limited", retry_after)
+            taken.append(bucket)
+        return taken
+
+    @staticmethod
+    def refund(charged):
+        """Give back what charge() took, for a request that never got a Gemini answer"""
+        for bucket in charged:
+            bucket.refund()
+
+    def in_line(self):
+        """Requests queued behind the ones already generating"""
+        return max(0, self.running + self.waiting - self.max_concurrent)
+
+    def expected_wait(self):
+        return (self.in_line() + 1) / self.max_concurrent * self.avg_seconds
+
+    async def _wait_for_slot(self):
+        if self.running + self.waiting >= self.max_concurrent:
+            if self.in_line() >= self.max_queue:
+                self.stats["shed_queue_full"] += 1
+                raise Overloaded("queue full", self.expected_wait())
+            if self.expected_wait() > self.max_wait:
+                self.stats["shed_deadline"] += 1
+                raise Overloaded("expected wait too long", self.expected_wait())
+            self.stats["queued"] += 1
+
+        self.waiting += 1
+        queued_at = time.perf_counter()
+        try:
+            await asyncio.wait_for(self._slots.acquire(), self.max_wait)
+        except asyncio.TimeoutError:
+            self.stats["shed_deadline"] += 1
+            raise Overloaded("waited too long", self.expected_wait())
+        finally:
+            self.waiting -= 1
+        metrics.observe("queue", time.perf_counter() - queued_at)
+
+    @asynccontextmanager
+    async def admit(self, user=None):
+        """A generation slot. With user, also charges its buckets (refunded if shed);
+        callers that coalesce charge() each user themselves and admit() once."""
+        charged = self.charge(user)
+        try:
+            await self._wait_for_slot()
+        except BaseException:  # shed, or the client left while queued: the token wasn't used
+            self.refund(charged)
+            raise
+
+        self.running += 1
+        self.stats["admitted"] += 1
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self.running -= 1
+            self._slots.release()
+            self.avg_seconds = 0.8 * self.avg_seconds + 0.2 * (time.monotonic() - started)
+
+    def report(self):
+        return {**self.stats, "running": self.running, "waiting": self.in_line(),
+                "avg_generation_s": round(self.avg_seconds, 2)}
@@ -1,18 +1,24 @@
 import os
+import json
+import time
+import startup
+# Every first-time import from here on is timed (see /ready)
+startup.profile_imports()
 from dotenv import load_dotenv
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from pydantic import BaseModel
 import uvicorn
 print("📢 SANITY CHECK: I AM RUNNING THE NEW CODE WITH EMBEDDING-001...")
 
 # --- IMPORTS ---
-from pinecone import Pinecone
-from llama_index.core import VectorStoreIndex, Settings, PromptTemplate
-from llama_index.vector_stores.pinecone import PineconeVectorStore
-from llama_index.embeddings.google_genai import GoogleGenAIEmbedding
-from llama_index.llms.google_genai import GoogleGenAI
-from llama_index.core.vector_stores import MetadataFilters, ExactMatchFilter
+# Only light modules here: llama_index, google-genai, Pinecone and Firebase are
+# imported by the background warmup, after uvicorn has bound the port
+import vector_backend
+from admission import AdmissionControl, Overloaded
+from personas import DATABASE, PERSONA_RULES, FILE_REPLY_TEMPLATES, build_qa_template
+import metrics
 
 # 1. LOAD KEYS
 load_dotenv()
@@ -20,31 +26,10 @@ GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
 PINECONE_API_KEY = os.getenv("PINECONE_API_KEY")
 INDEX_NAME = os.getenv("INDEX_NAME", "bmsit-chatbot")
 
-if not GOOGLE_API_KEY or not PINECONE_API_KEY:
+if not GOOGLE_API_KEY or (not PINECONE_API_KEY and vector_backend.BACKEND != "local"):
     raise ValueError("❌ CRITICAL ERROR: API Keys missing from .env file!")
 
-# ==============================================================================
-# 🗄️ MASTER FOLDER DATABASE (Your Real Links)
-# ==============================================================================
-DATABASE = {
-    "1": "https://drive.google.com/drive/folders/1Yv-tfstUnQytvhvdLP02j6IDiolovIWI?usp=drive_link",
-    "2": "https://drive.google.com/drive/folders/1gGPWHjZSF0Z22fus_yRrX_aq3zKws5Bp?usp=drive_link",
-    "3": "https://drive.google.com/drive/folders/1fIZRxNrGmz5BwzNjbCsLdHfOHRK9MU1e?usp=drive_link",
-    "4": "https://drive.google.com/drive/folders/17Ga5lrRQ-d8aLEOhZ24qZ7vWL8bXUpY1?usp=drive_link"
-}
-
-# 2. CONFIGURE AI
-print("⚙️ Setting up Gemini 2.0...")
-try:
-    # FIXED: Switched to 'embedding-001' to fix 404 error
-    embed_model = GoogleGenAIEmbedding(model="models/embedding-001", api_key=GOOGLE_API_KEY)
-    llm = GoogleGenAI(model="models/gemini-2.0-flash", api_key=GOOGLE_API_KEY)
-    Settings.embed_model = embed_model
-    Settings.llm = llm
-except Exception as e:
-    raise RuntimeError(f"❌ Failed to configure Gemini: {e}")
-
-# 3. INITIALIZE APP
+# 2. INITIALIZE APP
 app = FastAPI()
 
 app.add_middleware(
@@ -55,102 +40,430 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# ==============================================================================
-# ✨ PERSONA RULES (REFINED)
-# ==============================================================================
-PERSONA_RULES = {
-    "Study Buddy": (
-        "You are 'Alex', an energetic, super-supportive BMSIT senior. "
-        "VIBE: Positive, encouraging, high energy! Use emojis like 🚀, ✨, 📚. "
-        "GOAL: Make the student feel capable. "
-        "If asked for a file, say 'I got you covered! Here's the stash:'"
-    ),
-    "The Professor": (
-        "You are Professor Sharma, a distinguished academic. "
-        "VIBE: Helpful, professional, precise, and polite. "
-        "GOAL: Provide high-quality information. "
-        "FORMATTING: Use bullet points or numbered lists if requested. "
-        "Do not use slang. Ensure answers are complete and accurate."
-    ),
-    "The Bro": (
-        "You are 'Sam', the chillest guy on campus. "
-        "VIBE: Casual, uses slang (fam, easy scene, bet, dw). "
-        "GOAL: Give the answer instantly. "
-        "If they want a file, say 'Say less, here's the link:'"
-    ),
-    "ELI5": (
-        "You are a patient Tutor. "
-        "VIBE: Gentle, slow, and clear. "
-        "GOAL: Explain hard concepts simply using analogies. No jargon."
-    )
-}
+# Per-request stage times go back as Server-Timing (SERVER_TIMING=0 to turn off)
+SERVER_TIMING = os.getenv("SERVER_TIMING", "1") == "1"
+
+@app.middleware("http")
+async def record_timings(request, call_next):
+    started = time.perf_counter()
+    timings = metrics.start_request()
+    response = await call_next(request)
+    # The route template, not the raw path: every 404 probe would otherwise be a new series
+    route = request.scope.get("route")
+    path = route.path if route is not None else "unmatched"
+    if path != "/metrics":
+        metrics.REQUEST_SECONDS.observe(time.perf_counter() - started, path=path, status=response.status_code)
+    # Streams send headers before generation, so they only carry the stages done by then
+    if SERVER_TIMING and timings:
+        response.headers["Server-Timing"] = metrics.server_timing(timings)
+    return response
 
 class ChatRequest(BaseModel):
     message: str
     year: str = "1"
     mode: str = "Study Buddy"
     token: str = None
+    chat_id: str = None
+
+# ==============================================================================
+# 🔌 BRAIN CONNECTION (built once by the warmup, shared by every request)
+# uvicorn binds before any of this exists; requests that arrive first wait for
+# it (up to STARTUP_WAIT seconds). See startup.py.
+# ==============================================================================
+# With several uvicorn workers, point them all at one cache file (see shared_cache.py)
+SHARED_CACHE_PATH = os.getenv("SHARED_CACHE_PATH")
+# Answers update_brain.py --faq precomputed (see faq.py); FAQ_MATCH: word overlap a question needs
+FAQ_ANSWERS = os.getenv("FAQ_ANSWERS", "1") == "1"
+FAQ_MATCH = float(os.getenv("FAQ_MATCH", "0.8"))
+
+embed_model = shared_cache = None
+sparse_index = retrieval_stack = answer_cache = retrieval_cache = context_budgeter = None
+chat_pipeline = sessions = intent_router = faq_answers = None
+
+# Caps concurrent Gemini calls + per-user rate (GENERATE_CONCURRENCY, USER_RATE_PER_MIN, ...)
+admission = AdmissionControl()
+metrics.REGISTRY.gauges("bmsit_admission", admission.report)
+
+def configure_models():
+    global embed_model, shared_cache
+    from llama_index.core import Settings
+    from llama_index.embeddings.google_genai import GoogleGenAIEmbedding
+    from llama_index.llms.google_genai import GoogleGenAI
+    from embed_cache import EmbeddingCache, CachedEmbedding
+
+    if SHARED_CACHE_PATH:
+        from shared_cache import SharedCache
+        shared_cache = SharedCache(SHARED_CACHE_PATH)
+
+    print("⚙️ Setting up Gemini 2.0...")
+    # FIXED: Switched to 'embedding-001' to fix 404 error
+    embed_model = CachedEmbedding(
+        GoogleGenAIEmbedding(model="models/embedding-001", api_key=GOOGLE_API_KEY),
+        # With the shared cache, each worker only keeps a small hot set in memory
+        EmbeddingCache(max_entries=int(os.getenv("EMBED_CACHE_SIZE", "512" if shared_cache else "10000")),
+                       shared=shared_cache),
+    )
+    llm = GoogleGenAI(model="models/gemini-2.0-flash", api_key=GOOGLE_API_KEY)
+    Settings.embed_model = embed_model
+    Settings.llm = llm
+
+def build_brain():
+    global sparse_index, retrieval_stack, answer_cache, retrieval_cache, context_budgeter, chat_pipeline, sessions, \
+        intent_router, faq_answers
+    from retrieval import RetrievalStack
+    from sparse_index import SparseIndex
+    from chat_pipeline import ChatPipeline
+    from semantic_cache import SemanticCache
+    from intent_router import IntentRouter
+    from context_budget import ContextBudgeter
+    from sessions import SessionStore
+
+    # BM25 index written by update_brain.py (keyword lookups like "18CS51"); optional
+    sparse_dir = os.getenv("SPARSE_INDEX_DIR", "sparse_index")
+    sparse_index = SparseIndex(sparse_dir) if os.path.isdir(sparse_dir) else None
+
+    # Over-retrieve RERANK_CANDIDATES chunks, then send Gemini only the 1..RERANK_MAX_K that
+    # clear the relevance cutoff (RERANK=0: the fixed top 5 / HYBRID_TOP_K as before)
+    reranker = None
+    top_k, hybrid_top_k = 5, int(os.getenv("HYBRID_TOP_K", "4"))
+    hybrid_candidates = int(os.getenv("HYBRID_CANDIDATES", "10"))
+    if os.getenv("RERANK", "1") == "1":
+        from rerank import Reranker
+        reranker = Reranker(
+            max_k=int(os.getenv("RERANK_MAX_K", "5")),
+            cutoff=float(os.getenv("RERANK_CUTOFF", "0.6")),
+        )
+        top_k = hybrid_top_k = int(os.getenv("RERANK_CANDIDATES", "20"))
+        hybrid_candidates = max(hybrid_candidates, top_k)
+
+    retrieval_stack = RetrievalStack(
+        api_key=PINECONE_API_KEY,
+        index_name=INDEX_NAME,
+        engine_options=lambda year, mode: {"text_qa_template": build_qa_template(year, mode)},
+        similarity_top_k=top_k,
+        pool_threads=int(os.getenv("PINECONE_POOL_THREADS", "8")),
+        health_interval=int(os.getenv("PINECONE_HEALTH_INTERVAL", "60")),
+        sparse_index=sparse_index,
+        hybrid_top_k=hybrid_top_k,
+        hybrid_candidates=hybrid_candidates,
+    )
+    if sparse_index is not None:
+        retrieval_stack.on_brain_update(sparse_index.reload)
+
+    # Repeat questions (same year + persona) are answered from memory
+    cache_options = dict(
+        threshold=float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.95")),
+        ttl=int(os.getenv("SEMANTIC_CACHE_TTL", "3600")),
+        max_entries=int(os.getenv("SEMANTIC_CACHE_SIZE", "512")),
+    )
+    if shared_cache is None:
+        answer_cache = SemanticCache(**cache_options)
+        retrieval_stack.on_brain_update(answer_cache.clear)
+    else:
+        from shared_cache import SharedAnswerCache, SharedRetrievalCache
+        answer_cache = SharedAnswerCache(shared_cache, **cache_options)
+        retrieval_cache = SharedRetrievalCache(shared_cache, ttl=int(os.getenv("RETRIEVAL_CACHE_TTL", "600")))
+        # The brain version is the generation key: every worker noticing one update bumps it once
+        retrieval_stack.on_brain_update(lambda: shared_cache.advance(retrieval_stack.brain_version))
+
+    # Dedupe + trim retrieved chunks so Gemini reads at most CONTEXT_TOKEN_BUDGET tokens
+    context_budgeter = ContextBudgeter(max_tokens=int(os.getenv("CONTEXT_TOKEN_BUDGET", "2000")))
+
+    chat_pipeline = ChatPipeline(retrieval_stack, cache=answer_cache, budgeter=context_budgeter, admission=admission,
+                                 retrieval_cache=retrieval_cache, reranker=reranker)
+
+    # Multi-turn memory per chat_id (Firestore history is plugged in by connect_chat_history)
+    sessions = SessionStore()
+
+    intent_router = IntentRouter(
+        DATABASE,
+        FILE_REPLY_TEMPLATES,
+        sparse_index=sparse_index,
+        # Only consulted when the keyword rules can't decide; repeats come from the embed cache
+        embed_model=embed_model if os.getenv("ROUTER_EMBEDDINGS") == "1" else None,
+        # Off unless set: the log keeps what students typed (rolls over past ROUTER_LOG_MB)
+        log_path=os.getenv("ROUTER_LOG_PATH"),
+        log_max_mb=float(os.getenv("ROUTER_LOG_MB", "10")),
+    )
+
+    if FAQ_ANSWERS:
+        from faq import FaqLookup
+        faq_answers = FaqLookup(min_overlap=FAQ_MATCH)
+        # A brain update may come with regenerated answers
+        retrieval_stack.on_brain_update(load_faq_answers)
+        metrics.REGISTRY.gauges("bmsit_faq", lambda: faq_answers.stats)
+
+    # The same numbers /stats shows, as gauges next to the stage histograms
+    metrics.REGISTRY.gauges("bmsit_retrieval", lambda: retrieval_stack.stats)
+    metrics.REGISTRY.gauges("bmsit_answer_cache", answer_cache.stats)
+    metrics.REGISTRY.gauges("bmsit_embed_cache", embed_model.cache.stats)
+    if shared_cache is not None:
+        metrics.REGISTRY.gauges("bmsit_shared_cache", shared_cache.report)
+        metrics.REGISTRY.gauges("bmsit_retrieval_cache", retrieval_cache.stats)
+    metrics.REGISTRY.gauges("bmsit_router", lambda: intent_router.stats)
+    metrics.REGISTRY.gauges("bmsit_sessions", lambda: {**sessions.stats, "active": len(sessions._sessions)})
+    metrics.REGISTRY.gauges("bmsit_coalescing", chat_pipeline.flights.report)
+
+def connect_chat_history():
+    """History after a restart comes from Firestore; without it memory still works, just cold"""
+    from sessions import connect_firestore, firestore_loader
+    firestore_db = connect_firestore(os.getenv("FIREBASE_KEY_PATH", "firebase_key.json"))
+    if firestore_db is not None:
+        sessions.loader = firestore_loader(firestore_db)
+
+def connect_vector_store():
+    # Raises (and gets retried) if Pinecone is unreachable; start() then adds the health checks
+    retrieval_stack.warmup(years=DATABASE.keys(), modes=PERSONA_RULES.keys())
+    retrieval_stack.start(years=DATABASE.keys(), modes=PERSONA_RULES.keys())
+    # The brain may have been updated while this host was down: don't serve older cached answers
+    if shared_cache is not None and retrieval_stack.brain_version is not None:
+        shared_cache.advance(retrieval_stack.brain_version)
+
+def load_faq_answers():
+    import faq
+    if faq_answers is not None:
+        faq_answers.load(faq.fetch(retrieval_stack.pinecone_index))
+        print(f"💡 {faq_answers.stats['entries']} precomputed FAQ answers loaded")
+
+def warm_query():
+    """One throwaway embed + retrieval, so the Gemini and Pinecone connections are already open"""
+    from llama_index.core import QueryBundle
+    vector = embed_model.get_query_embedding("warmup")
+    engine = retrieval_stack.get_engine("1", "Study Buddy")
+    engine.retrieve(QueryBundle(query_str="warmup", embedding=vector))
+
+warmup = startup.Warmup()
+warmup.step("gemini", configure_models)
+warmup.step("brain", build_brain)
+warmup.step("firestore", connect_chat_history, required=False)
+warmup.step("vector store", connect_vector_store)
+warmup.step("faq answers", load_faq_answers, required=False)
+warmup.step("dummy embed + query", warm_query, required=False)
+metrics.REGISTRY.gauges("bmsit_startup", warmup.report)
+
+@app.on_event("startup")
+async def begin_warmup():
+    warmup.start()
+
+# Early requests wait this long for the warmup before getting a 503
+STARTUP_WAIT = float(os.getenv("STARTUP_WAIT", "20"))
+
+def waking_up():
+    return JSONResponse(
+        status_code=503,
+        content={"response": "I'm just waking up! Give me a few seconds and ask again. ☕"},
+        headers={"Retry-After": "5"},
+    )
+
+def pick_year_and_mode(request):
+    selected_year = str(request.year)
+    if selected_year not in DATABASE: selected_year = "1"
+    mode = request.mode if request.mode in PERSONA_RULES else "Study Buddy"
+    return selected_year, mode
+
+def source_links(source_nodes):
+    """Unique Drive links of the retrieved chunks, best match first"""
+    links = []
+    for node in source_nodes or []:
+        link = node.metadata.get("file_link")
+        if link and link not in links:
+            links.append(link)
+    return links
+
+def user_key(request, http_request):
+    return admission.user_key(request.token, http_request.client.host if http_request.client else "unknown")
+
+def too_busy(error):
+    metrics.STAGE_ERRORS.inc(stage="admission", error=error.reason.replace(" ", "_"))
+    print(f"🚧 Shed request: {error}")
+    return JSONResponse(
+        status_code=429,
+        content={"response": f"Lots of students asking right now! Try again in {error.retry_after}s. ⏳"},
+        headers={"Retry-After": str(error.retry_after)},
+    )
+
+async def open_session(request):
+    if not request.chat_id:
+        return None
+    return await sessions.get(request.chat_id, pending_message=request.message)
+
+def precomputed(message, year, mode, session):
+    """Fresh questions on the FAQ list get the answer update_brain.py generated (a FileAnswer)"""
+    if faq_answers is None or (session is not None and session.transcript()):
+        return None
+    with metrics.timed("faq"):
+        found = faq_answers.match(message, year, mode)
+    metrics.CACHE_LOOKUPS.inc(cache="faq", result="miss" if found is None else "hit")
+    return found
+
+def remember_turn(session, message, reply):
+    """Store the exchange; any summarising happens after the response is sent"""
+    if session is not None and reply:
+        sessions.record_later(session, message, reply)
 
 @app.post("/chat")
-def chat_endpoint(request: ChatRequest):
+async def chat_endpoint(request: ChatRequest, http_request: Request):
+    if not await warmup.wait(STARTUP_WAIT):
+        return waking_up()
     try:
-        # 1. GET THE MASTER LINK
-        selected_year = str(request.year)
-        if selected_year not in DATABASE: selected_year = "1"
-        master_folder_link = DATABASE[selected_year]
-
-        # 2. CONSTRUCT SYSTEM PROMPT
-        persona_instruction = PERSONA_RULES.get(request.mode, PERSONA_RULES["Study Buddy"])
-        
-        base_instruction = (
-            f"{persona_instruction}\n\n"
-            f"You are assisting a Year {selected_year} student.\n"
-            f"OFFICIAL DRIVE LINK: {master_folder_link}\n\n"
-            "🧠 LOGIC PROTOCOL:\n"
-            "1. FILE REQUESTS (e.g., 'timetable', 'syllabus', 'notes', 'pdf'):\n"
-            "   - You ONLY have the Master Folder. Reply: 'Here is the Master Folder: {master_folder_link}'\n"
-            "2. KNOWLEDGE QUESTIONS (e.g., 'when is exams?', 'explain unit 1'):\n"
-            "   - Search the 'Context' below. Answer directly.\n"
-            "   - IF the user asks to format (e.g., 'pointwise'), DO IT.\n"
-        )
+        # 1. PICK THE YEAR + PERSONA
+        selected_year, mode = pick_year_and_mode(request)
 
-        # 3. CONNECT TO BRAIN
-        pc = Pinecone(api_key=PINECONE_API_KEY)
-        pinecone_index = pc.Index(INDEX_NAME)
-        vector_store = PineconeVectorStore(pinecone_index=pinecone_index)
-        index = VectorStoreIndex.from_vector_store(vector_store=vector_store)
-
-        # 4. CREATE PROMPT
-        template_str = (
-            f"{base_instruction}\n\n"
-            "CONTEXT FROM YOUR BRAIN:\n"
-            "---------------------\n"
-            "{context_str}\n"
-            "---------------------\n"
-            "USER SAYS: {query_str}\n"
-            "YOUR REPLY:"
-        )
-        qa_template = PromptTemplate(template_str)
-
-        # 5. QUERY
-        filters = MetadataFilters(filters=[ExactMatchFilter(key="year", value=request.year)])
-        
-        query_engine = index.as_query_engine(
-            similarity_top_k=5, 
-            filters=filters,
-            text_qa_template=qa_template
+        # 2. FILE REQUESTS + FAQ: answered from DATABASE / precomputed answers, no Gemini call
+        session = await open_session(request)
+        with metrics.timed("route"):
+            routed = await intent_router.route(request.message, selected_year, mode)
+        if routed is None:
+            routed = precomputed(request.message, selected_year, mode, session)
+        if routed is not None:
+            remember_turn(session, request.message, str(routed))
+            return {"response": str(routed)}
+
+        # 3. QUERY (embed -> retrieve -> generate, all awaited; only generation is rate limited)
+        response = await chat_pipeline.answer(
+            request.message, selected_year, mode, session, user_key(request, http_request)
         )
-        
-        response = query_engine.query(request.message)
+        remember_turn(session, request.message, str(response))
         return {"response": str(response)}
 
+    except Overloaded as e:
+        return too_busy(e)
     except Exception as e:
+        metrics.STAGE_ERRORS.inc(stage="chat", error=type(e).__name__)
         print(f"❌ CRASH LOG: {e}")
+        retrieval_stack.report_failure()
         return {"response": "My brain is having a hiccup! Please try again in a sec. 🤖"}
 
+# ==============================================================================
+# ⚡ STREAMING CHAT (Server-Sent Events)
+# Events: "sources" (retrieved file links) -> many "token" -> "done" (timings,
+# context budget, reranker scores)
+# ==============================================================================
+def sse(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+@app.post("/chat/stream")
+async def chat_stream_endpoint(request: ChatRequest, http_request: Request):
+    if not await warmup.wait(STARTUP_WAIT):
+        return waking_up()
+    selected_year, mode = pick_year_and_mode(request)
+    started = time.perf_counter()
+    session = routed = events = first = None
+    failed = False
+    try:
+        session = await open_session(request)
+        with metrics.timed("route"):
+            routed = await intent_router.route(request.message, selected_year, mode)
+        if routed is None:
+            routed = precomputed(request.message, selected_year, mode, session)
+        if routed is None:
+            events = chat_pipeline.stream(
+                request.message, selected_year, mode, session, user_key(request, http_request)
+            )
+            # Admission is decided before the first event, so a shed request still gets a real 429
+            first = await anext(events, None)
+    except Overloaded as e:
+        return too_busy(e)
+    except Exception as e:
+        metrics.STAGE_ERRORS.inc(stage="chat_stream", error=type(e).__name__)
+        print(f"❌ STREAM CRASH LOG: {e}")
+        retrieval_stack.report_failure()
+        failed = True
+
+    async def pipeline_events():
+        if first is not None:
+            yield first
+        async for event in events:
+            yield event
+
+    async def event_stream():
+        retrieved_at = first_token_at = None
+        context = ranking = None
+        tokens = 0
+        if failed:
+            yield sse("error", {"response": "My brain is having a hiccup! Please try again in a sec. 🤖"})
+            return
+        try:
+            if routed is not None:
+                remember_turn(session, request.message, routed.text)
+                yield sse("sources", {"sources": routed.links})
+                yield sse("token", {"text": routed.text})
+                elapsed_ms = round((time.perf_counter() - started) * 1000, 1)
+                yield sse("done", {"timings": {
+                    "retrieval_ms": 0, "ttft_ms": elapsed_ms, "total_ms": elapsed_ms, "tokens": 1,
+                }, "route": "faq" if routed.reason.startswith("faq") else "file"})
+                return
+
+            reply = []
+            async for kind, payload in pipeline_events():
+                if kind == "sources":
+                    retrieved_at = time.perf_counter()
+                    yield sse("sources", {"sources": source_links(payload)})
+                    continue
+                if kind == "context":
+                    context = payload
+                    continue
+                if kind == "rerank":
+                    ranking = payload
+                    continue
+                if first_token_at is None:
+                    first_token_at = time.perf_counter()
+                tokens += 1
+                reply.append(payload)
+                yield sse("token", {"text": payload})
+            remember_turn(session, request.message, "".join(reply))
+
+            finished_at = time.perf_counter()
+            yield sse("done", {"timings": {
+                "retrieval_ms": round(((retrieved_at or finished_at) - started) * 1000, 1),
+                "ttft_ms": round(((first_token_at or finished_at) - started) * 1000, 1),
+                "total_ms": round((finished_at - started) * 1000, 1),
+                "tokens": tokens,
+            }, "context": context, "rerank": ranking})
+        except Exception as e:
+            metrics.STAGE_ERRORS.inc(stage="chat_stream", error=type(e).__name__)
+            print(f"❌ STREAM CRASH LOG: {e}")
+            retrieval_stack.report_failure()
+            yield sse("error", {"response": "My brain is having a hiccup! Please try again in a sec. 🤖"})
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
 @app.get("/")
 def home():
     return {"status": "Active", "message": "BMSIT Vibe Check Passed ✅"}
 
+@app.get("/ready")
+def ready():
+    """200 once the warmup is done (point the host's health check here, not at "/")"""
+    return JSONResponse(status_code=200 if warmup.ready else 503, content=warmup.report())
+
+@app.get("/metrics")
+def prometheus_metrics():
+    return PlainTextResponse(metrics.REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
+@app.get("/stats")
+def stats():
+    if not warmup.ready:
+        return {"startup": warmup.report()}
+    return {
+        "startup": warmup.report(),
+        "retrieval": retrieval_stack.stats,
+        "answer_cache": answer_cache.stats(),
+        "embed_cache": embed_model.cache.stats(),
+        "retrieval_cache": retrieval_cache.stats() if retrieval_cache is not None else None,
+        "worker_pid": os.getpid(),
+        "router": intent_router.stats,
+        "faq": faq_answers.stats if faq_answers is not None else None,
+        "sessions": {**sessions.stats, "active": len(sessions._sessions)},
+        "coalescing": chat_pipeline.flights.report(),
+        "admission": admission.report(),
+    }
+
 if __name__ == "__main__":
-    uvicorn.run(app, host="0.0.0.0", port=8000)
+    # Several workers use every core; set SHARED_CACHE_PATH so they share one cache
+    workers = int(os.getenv("WEB_CONCURRENCY", "1"))
+    uvicorn.run("api:app" if workers > 1 else app, host="0.0.0.0", port=8000, workers=workers)
@@ -1,18 +1,15 @@
+import startup
+# Every first-time import from here on is timed (see /ready)
+startup.profile_imports()
 import os
+import asyncio
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
 from pydantic import BaseModel
 import uvicorn
-import firebase_admin
-from firebase_admin import credentials, firestore
-
-# --- LlamaIndex Imports ---
-from pinecone import Pinecone
-from llama_index.core import VectorStoreIndex, Settings
-from llama_index.vector_stores.pinecone import PineconeVectorStore
-from llama_index.core.vector_stores import MetadataFilters, MetadataFilter, ExactMatchFilter
-from llama_index.llms.google_genai import GoogleGenAI
-from llama_index.embeddings.google_genai import GoogleGenAIEmbedding
+# Firebase, Pinecone and the LlamaIndex/Gemini stack are imported by the
+# background warmup below, after uvicorn has bound the port (see startup.py)
 
 # 1. API KEYS (Ideally use .env, but hardcoded for now)
 # NOTE: Make sure these are correct!
@@ -31,45 +28,90 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# 3. CONFIGURE AI (THE FIX IS HERE)
-print("⚙️ Setting up Gemini & Embeddings...")
-
-# --- CRITICAL FIX: Changed from 'text-embedding-004' to 'embedding-001' ---
-embed_model = GoogleGenAIEmbedding(model="models/embedding-001", api_key=GOOGLE_API_KEY)
+# 3. CONFIGURE AI + 4. CONNECT TO FIREBASE & PINECONE
+# All in the background warmup (bottom of this block); early requests wait for it
+index = None
+sessions = None
 
-# Try to get the best model, fallback to flash if pro fails
-try:
-    llm = GoogleGenAI(model="models/gemini-1.5-pro", api_key=GOOGLE_API_KEY)
-except:
-    print("⚠️ Pro model failed, switching to Flash...")
-    llm = GoogleGenAI(model="models/gemini-2.0-flash", api_key=GOOGLE_API_KEY)
+def configure_models():
+    from llama_index.core import Settings
+    from llama_index.llms.google_genai import GoogleGenAI
+    from llama_index.embeddings.google_genai import GoogleGenAIEmbedding
+    print("⚙️ Setting up Gemini & Embeddings...")
 
-Settings.llm = llm
-Settings.embed_model = embed_model
+    # --- CRITICAL FIX: Changed from 'text-embedding-004' to 'embedding-001' ---
+    embed_model = GoogleGenAIEmbedding(model="models/embedding-001", api_key=GOOGLE_API_KEY)
 
-# 4. CONNECT TO FIREBASE & PINECONE
-# Check if firebase is already initialized to avoid "App already exists" error
-if not firebase_admin._apps:
+    # Try to get the best model, fallback to flash if pro fails
     try:
+        llm = GoogleGenAI(model="models/gemini-1.5-pro", api_key=GOOGLE_API_KEY)
+    except:
+        print("⚠️ Pro model failed, switching to Flash...")
+        llm = GoogleGenAI(model="models/gemini-2.0-flash", api_key=GOOGLE_API_KEY)
+
+    Settings.llm = llm
+    Settings.embed_model = embed_model
+
+def create_sessions():
+    global sessions
+    from sessions import SessionStore
+    # Chat history per chat_id; Firestore is plugged in by connect_firebase
+    sessions = SessionStore()
+
+def connect_firebase():
+    import firebase_admin
+    from firebase_admin import credentials, firestore
+    from sessions import firestore_loader
+
+    # Check if firebase is already initialized to avoid "App already exists" error
+    if not firebase_admin._apps:
         cred = credentials.Certificate("firebase_key.json")
         firebase_admin.initialize_app(cred)
         print("🔥 Firebase Connected!")
-    except Exception as e:
-        print(f"⚠️ Firebase Error (Check firebase_key.json): {e}")
 
-db = firestore.client()
+    db = firestore.client()
+    # Chat history per chat_id, loaded from Firestore the first time we see a chat
+    sessions.loader = firestore_loader(db)
+
+def connect_pinecone():
+    global index
+    from pinecone import Pinecone
+    from llama_index.core import VectorStoreIndex
+    from llama_index.vector_stores.pinecone import PineconeVectorStore
+
+    pc = Pinecone(api_key=PINECONE_API_KEY)
+    pinecone_index = pc.Index(INDEX_NAME)
+    vector_store = PineconeVectorStore(pinecone_index=pinecone_index)
+    index = VectorStoreIndex.from_vector_store(vector_store=vector_store)
+
+def warm_query():
+    """One throwaway embed + Pinecone query, so the first student finds the connections open"""
+    index.as_retriever(similarity_top_k=1).retrieve("warmup")
 
-# Pinecone Connection
-pc = Pinecone(api_key=PINECONE_API_KEY)
-pinecone_index = pc.Index(INDEX_NAME)
-vector_store = PineconeVectorStore(pinecone_index=pinecone_index)
-index = VectorStoreIndex.from_vector_store(vector_store=vector_store)
+warmup = startup.Warmup()
+warmup.step("gemini", configure_models)
+warmup.step("sessions", create_sessions)
+warmup.step("firebase", connect_firebase, required=False)
+warmup.step("pinecone", connect_pinecone)
+warmup.step("dummy embed + query", warm_query, required=False)
+
+@app.on_event("startup")
+async def begin_warmup():
+    warmup.start()
+
+# Early requests wait this long for the warmup before getting a 503
+STARTUP_WAIT = float(os.getenv("STARTUP_WAIT", "20"))
+
+# Cap on chats talking to Gemini at once, and how long one may take
+chat_slots = asyncio.Semaphore(int(os.getenv("MAX_IN_FLIGHT", "64")))
+CHAT_TIMEOUT = float(os.getenv("GENERATE_TIMEOUT", "30"))
 
 # 5. DATA MODELS
 class ChatRequest(BaseModel):
     message: str
     year: str = "1"
     mode: str = "Study Buddy (Default)"
+    chat_id: str = None
 
 # 6. MODES (PERSONAS)
 PERSONAS = {
@@ -98,10 +140,23 @@ def health_check():
     """Simple check to see if server is running"""
     return {"status": "Online", "model": "Gemini + Embedding-001 (Stable)"}
 
+@app.get("/ready")
+def ready():
+    """200 once Gemini, Firebase and Pinecone are connected (startup timings included)"""
+    return JSONResponse(status_code=200 if warmup.ready else 503, content=warmup.report())
+
 @app.post("/chat")
-def chat(request: ChatRequest):
+async def chat(request: ChatRequest):
     """The main chat function"""
+    if not await warmup.wait(STARTUP_WAIT):
+        return JSONResponse(
+            status_code=503,
+            content={"response": "I'm just waking up! Give me a few seconds and ask again. ☕"},
+            headers={"Retry-After": "5"},
+        )
     try:
+        from llama_index.core.vector_stores import MetadataFilters, ExactMatchFilter
+
         # Get the system prompt based on mode
         system_prompt = PERSONAS.get(request.mode, PERSONAS["Study Buddy (Default)"])
         
@@ -110,7 +165,7 @@ def chat(request: ChatRequest):
         filters = MetadataFilters(filters=[ExactMatchFilter(key="year", value=str(request.year))])
         
         # Create engine for this specific request
-        # 'context' mode means it retrieves docs + chat history
+        # 'context' mode means it retrieves docs + the chat history we pass in
         chat_engine = index.as_chat_engine(
             chat_mode="context",
             system_prompt=system_prompt,
@@ -118,8 +173,14 @@ def chat(request: ChatRequest):
             similarity_top_k=5 
         )
         
-        # Generate response
-        response = chat_engine.chat(request.message)
+        session = await sessions.get(request.chat_id, pending_message=request.message) if request.chat_id else None
+        history = session.chat_messages() if session is not None else None
+
+        # Generate response (awaited, so other chats keep flowing meanwhile)
+        async with chat_slots:
+            response = await asyncio.wait_for(chat_engine.achat(request.message, chat_history=history), CHAT_TIMEOUT)
+        if session is not None:
+            sessions.record_later(session, request.message, str(response))
         return {"response": str(response)}
         
     except Exception as e:
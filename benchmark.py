@@ -0,0 +1,470 @@
+import argparse
+import asyncio
+import contextlib
+import json
+import multiprocessing
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from types import SimpleNamespace
+from unittest import mock
+
+import numpy as np
+from llama_index.core import Settings
+from llama_index.core.schema import MetadataMode
+
+import metrics
+import vector_backend
+from admission import AdmissionControl, Overloaded
+from chat_pipeline import ChatPipeline
+from chunking import Chunker, Deduper, build_nodes
+from context_budget import ContextBudgeter
+from embed_cache import CachedEmbedding, EmbeddingCache
+from fakes import (SUBJECTS, TOPICS, FakeEmbedding, FakeLLM, FakeParser, FakeVectorStore, Faults,
+                   make_document, make_drive)
+from local_store import LocalVectorStore
+from rerank import Reranker
+from retrieval import RetrievalStack
+from semantic_cache import SemanticCache
+from shared_cache import SharedAnswerCache, SharedCache, SharedRetrievalCache
+from sparse_index import SparseIndex
+
+# ==============================================================================
+# ⏱️ OFFLINE BENCHMARKS (no keys, no network)
+# The real chat pipeline (RetrievalStack + ChatPipeline, wired like api.py) and
+# the real update_brain.update_database(), running against the fakes in
+# fakes.py. Scenarios:
+#   single  one request at a time: latency + time to first token, per stage
+#   load    N concurrent users with distinct questions (BENCH_LOAD_LEVELS)
+#   cache   many users asking a few popular questions (answer cache + coalescing)
+#   workers the cache traffic spread over 1 vs N processes, per-process vs shared caches
+#   ingest  full rebuild, then an incremental run after edits, then a quiet run
+# Results go to stdout (or --out) as one JSON document; everything the code
+# under test prints goes to stderr. Compare two commits with:
+#   python benchmark.py > before.json   ...   python benchmark.py > after.json
+# ==============================================================================
+
+# Fake latencies in milliseconds (FAKE_<NAME>_MS to override)
+PROFILE_MS = {
+    name: float(os.getenv(f"FAKE_{name.upper()}_MS", default))
+    for name, default in {
+        "embed": 60, "retrieve": 40, "first_token": 400, "token": 15,
+        "drive": 80, "download": 120, "parse": 600, "upsert": 50,
+    }.items()
+}
+FAILURE_RATE = float(os.getenv("FAKE_FAILURE_RATE", "0"))
+ANSWER_TOKENS = int(os.getenv("FAKE_ANSWER_TOKENS", "40"))
+
+SINGLE_REQUESTS = int(os.getenv("BENCH_SINGLE_REQUESTS", "10"))
+LOAD_LEVELS = [int(n) for n in os.getenv("BENCH_LOAD_LEVELS", "1,4,16,64").split(",")]
+REQUESTS_PER_USER = int(os.getenv("BENCH_REQUESTS_PER_USER", "5"))
+CACHE_USERS = int(os.getenv("BENCH_CACHE_USERS", "32"))
+CACHE_POPULAR = int(os.getenv("BENCH_CACHE_POPULAR", "6"))
+CACHE_POPULAR_SHARE = float(os.getenv("BENCH_CACHE_POPULAR_SHARE", "0.8"))
+# Over-retrieve + rerank like api.py (BENCH_RERANK=0 for the fixed top-k it replaced)
+RERANK = os.getenv("BENCH_RERANK", "1") == "1"
+RERANK_CANDIDATES = int(os.getenv("RERANK_CANDIDATES", "20"))
+WORKER_COUNT = int(os.getenv("BENCH_WORKERS", "4"))
+WORKER_REQUESTS = int(os.getenv("BENCH_WORKER_REQUESTS", "240"))
+INGEST_FILES_PER_YEAR = int(os.getenv("BENCH_INGEST_FILES_PER_YEAR", "6"))
+
+YEARS = ("1", "2", "3", "4")
+MODES = ("Study Buddy", "The Professor")
+
+def faults(name, seed):
+    return Faults(latency=PROFILE_MS[name] / 1000, failure_rate=FAILURE_RATE, seed=seed)
+
+def quantiles_ms(values):
+    if not values:
+        return {}
+    return {f"p{int(q * 100)}": round(v * 1000, 1)
+            for q, v in zip(metrics.QUANTILES, np.quantile(values, metrics.QUANTILES))}
+
+def stage_quantiles():
+    """Per-stage latency quantiles (ms) recorded by metrics.timed() during the scenario"""
+    return {series["stage"]: {f"p{int(q * 100)}": round(v * 1000, 1)
+                              for q, v in metrics.STAGE_SECONDS.quantiles(**series).items()}
+            for series in metrics.STAGE_SECONDS.series()}
+
+# ==============================================================================
+# 💬 CHAT SCENARIOS
+# ==============================================================================
+class ChatBench:
+    """A synthetic corpus indexed once; every scenario gets fresh fakes, caches and pipeline"""
+
+    def __init__(self, workdir, seed):
+        self.seed = seed
+        self.index_dir = os.path.join(workdir, "chat_index")
+        self.sparse_dir = os.path.join(workdir, "chat_sparse")
+        self._index_corpus()
+
+    def _index_corpus(self):
+        drive, roots = make_drive(YEARS, files_per_year=8, seed=self.seed)
+        chunker, deduper, embedder = Chunker(), Deduper(), FakeEmbedding()  # setup isn't timed
+        store, sparse = LocalVectorStore(self.index_dir), SparseIndex(self.sparse_dir)
+        for year, root in roots.items():
+            for item in drive.files_under(root):
+                pages = list(enumerate(drive.blobs[item["id"]].decode().split("\f"), start=1))
+                metadata = {"file_link": item["webViewLink"], "file_name": item["name"], "path": item["name"]}
+                nodes, _, _ = build_nodes(chunker, deduper, item["id"], year, pages, metadata)
+                texts = [n.get_content(metadata_mode=MetadataMode.EMBED) for n in nodes]
+                for node, vector in zip(nodes, embedder.get_text_embedding_batch(texts)):
+                    node.embedding = vector
+                store.add(nodes)
+                sparse.add(nodes)
+        store.persist()
+        sparse.persist()
+        store.compact()
+        sparse.compact()
+
+    def pipeline(self, shared_path=None):
+        """(ChatPipeline as api.py builds it, {fake name: Faults}). shared_path: use the
+        cross-process caches like api.py does with SHARED_CACHE_PATH"""
+        fakes = {name: faults(name, self.seed + n) for n, name in enumerate(["embed", "retrieve", "first_token"])}
+        shared = SharedCache(shared_path) if shared_path else None
+        Settings.embed_model = CachedEmbedding(FakeEmbedding(fakes["embed"]),
+                                               EmbeddingCache(max_entries=512 if shared else 10000, shared=shared))
+        Settings.llm = FakeLLM(fakes["first_token"], tokens=ANSWER_TOKENS, token_latency=PROFILE_MS["token"] / 1000)
+        store = FakeVectorStore(self.index_dir, faults=fakes["retrieve"])
+
+        top_k = RERANK_CANDIDATES if RERANK else 4
+        stack = RetrievalStack(api_key=None, index_name=None, engine_options=lambda year, mode: {},
+                               sparse_index=SparseIndex(self.sparse_dir), similarity_top_k=top_k,
+                               hybrid_top_k=top_k, hybrid_candidates=max(10, top_k))
+        with mock.patch.object(vector_backend, "connect", lambda *args, **kwargs: (store, store)):
+            stack.warmup(YEARS, MODES)
+        if shared is None:
+            cache, retrieval_cache = SemanticCache(), None
+        else:
+            cache, retrieval_cache = SharedAnswerCache(shared), SharedRetrievalCache(shared)
+        pipeline = ChatPipeline(stack, cache=cache, budgeter=ContextBudgeter(),
+                                admission=AdmissionControl(), retrieval_cache=retrieval_cache,
+                                reranker=Reranker() if RERANK else None)
+        return pipeline, fakes
+
+def student(n):
+    """Rate-limit key of simulated student n (own token, own address)"""
+    return AdmissionControl.user_key(f"user-{n}", f"10.{n // 65536 % 256}.{n // 256 % 256}.{n % 256}")
+
+async def ask(pipeline, message, year, mode, user):
+    """One streamed answer, timed like /chat/stream does it"""
+    started = time.perf_counter()
+    first_token = None
+    outcome = "ok"
+    try:
+        async for kind, _ in pipeline.stream(message, year, mode, user=user):
+            if kind == "token" and first_token is None:
+                first_token = time.perf_counter()
+    except Overloaded:
+        outcome = "shed"
+    except Exception as e:
+        print(f"❌ Benchmark request failed: {e}")
+        outcome = "error"
+    finished = time.perf_counter()
+    return {"outcome": outcome, "total": finished - started, "ttft": (first_token or finished) - started}
+
+def summarize(samples, seconds):
+    ok = [s for s in samples if s["outcome"] == "ok"]
+    return {
+        "requests": len(samples),
+        "ok": len(ok),
+        "shed": sum(s["outcome"] == "shed" for s in samples),
+        "errors": sum(s["outcome"] == "error" for s in samples),
+        "seconds": round(seconds, 3),
+        "throughput_rps": round(len(ok) / seconds, 2) if seconds else 0.0,
+        "total_ms": quantiles_ms([s["total"] for s in ok]),
+        "ttft_ms": quantiles_ms([s["ttft"] for s in ok]),
+    }
+
+def fresh_question(rng, user, n):
+    return f"student {user} question {n}: explain {rng.choice(TOPICS)} in {rng.choice(SUBJECTS)}"
+
+def fake_calls(fakes):
+    return {name: f.report() for name, f in fakes.items()}
+
+def single_request(bench):
+    pipeline, fakes = bench.chat().pipeline()
+    rng = random.Random(bench.seed)
+
+    async def run():
+        samples = []
+        started = time.perf_counter()
+        for n in range(SINGLE_REQUESTS):
+            # No user key: one student asking back to back would hit the per-user rate limit
+            samples.append(await ask(pipeline, fresh_question(rng, 0, n), rng.choice(YEARS), MODES[0], None))
+        return samples, time.perf_counter() - started
+
+    samples, seconds = asyncio.run(run())
+    return {**summarize(samples, seconds), "rerank": RERANK, "stages_ms": stage_quantiles(),
+            "prompt_chunks": metrics.CHUNKS_SENT.quantiles(), "fakes": fake_calls(fakes)}
+
+def concurrent_load(bench):
+    levels = []
+    baseline = None
+    for users in LOAD_LEVELS:
+        metrics.REGISTRY.reset()
+        pipeline, fakes = bench.chat().pipeline()
+        rng = random.Random(bench.seed + users)
+
+        async def user(n):
+            return [await ask(pipeline, fresh_question(rng, n, i), rng.choice(YEARS), rng.choice(MODES), student(n))
+                    for i in range(REQUESTS_PER_USER)]
+
+        async def run():
+            started = time.perf_counter()
+            per_user = await asyncio.gather(*(user(n) for n in range(users)))
+            return [s for samples in per_user for s in samples], time.perf_counter() - started
+
+        samples, seconds = asyncio.run(run())
+        result = summarize(samples, seconds)
+        baseline = baseline or result["throughput_rps"]
+        print(f"👥 {users:4d} users: {result['throughput_rps']:.1f} req/s, {result['shed']} shed")
+        levels.append({
+            "users": users, **result,
+            "speedup": round(result["throughput_rps"] / baseline, 2) if baseline else 0.0,
+            "admission": pipeline.admission.report(),
+            "stages_ms": stage_quantiles(),
+            "fakes": fake_calls(fakes),
+        })
+    return {"requests_per_user": REQUESTS_PER_USER, "levels": levels}
+
+def pick_question(rng, user, n):
+    """A popular question (CACHE_POPULAR_SHARE of the time) or a fresh one, as (question, year)"""
+    if rng.random() < CACHE_POPULAR_SHARE:
+        k = rng.randrange(CACHE_POPULAR)
+        question, year = f"when is the {SUBJECTS[k % len(SUBJECTS)]} exam", YEARS[k % len(YEARS)]
+        # Same words, different casing/punctuation: what students actually type
+        return rng.choice([question, question.capitalize() + "?", question.upper(), question + "??"]), year
+    return fresh_question(rng, user, n), rng.choice(YEARS)
+
+def cache_heavy(bench):
+    pipeline, fakes = bench.chat().pipeline()
+    rng = random.Random(bench.seed)
+
+    async def user(n):
+        samples = []
+        for i in range(REQUESTS_PER_USER):
+            question, year = pick_question(rng, n, i)
+            samples.append(await ask(pipeline, question, year, MODES[0], student(n)))
+            await asyncio.sleep(rng.random() * 0.2)  # students don't all hit send together
+        return samples
+
+    async def run():
+        started = time.perf_counter()
+        per_user = await asyncio.gather(*(user(n) for n in range(CACHE_USERS)))
+        return [s for samples in per_user for s in samples], time.perf_counter() - started
+
+    samples, seconds = asyncio.run(run())
+    return {
+        "users": CACHE_USERS, "popular_questions": CACHE_POPULAR, "popular_share": CACHE_POPULAR_SHARE,
+        **summarize(samples, seconds),
+        "answer_cache": pipeline.cache.stats(),
+        "embed_cache": Settings.embed_model.cache.stats(),
+        "coalescing": pipeline.flights.report(),
+        "admission": pipeline.admission.report(),
+        "stages_ms": stage_quantiles(),
+        "fakes": fake_calls(fakes),
+    }
+
+def rss_mb():
+    try:
+        with open("/proc/self/status") as f:
+            return next(int(line.split()[1]) / 1024 for line in f if line.startswith("VmRSS:"))
+    except (OSError, StopIteration):
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+def _serve_share(bench, requests, shared_path, results):
+    """One "uvicorn worker": its own pipeline, answering the requests the balancer sent it"""
+    pipeline, fakes = bench.chat().pipeline(shared_path)
+
+    async def run():
+        slots = asyncio.Semaphore(8)
+
+        async def one(question, year):
+            async with slots:
+                return await ask(pipeline, question, year, MODES[0], None)
+        return await asyncio.gather(*(one(q, y) for q, y in requests))
+
+    started = time.perf_counter()
+    samples = asyncio.run(run())
+    results.put({
+        "requests": len(samples), "ok": sum(s["outcome"] == "ok" for s in samples),
+        "seconds": time.perf_counter() - started, "rss_mb": rss_mb(),
+        "answer_hits": pipeline.cache.hits, "answer_misses": pipeline.cache.misses,
+        "embed_hits": Settings.embed_model.cache.hits, "embed_misses": Settings.embed_model.cache.misses,
+        "llm_calls": fakes["first_token"].report()["calls"],
+    })
+
+def worker_caches(bench):
+    """The same request stream round-robined over N forked workers, like uvicorn --workers N"""
+    bench.chat()  # index before forking, so every worker opens the same files
+    rng = random.Random(bench.seed)
+    stream = [pick_question(rng, n % CACHE_USERS, n) for n in range(WORKER_REQUESTS)]
+    context = multiprocessing.get_context("fork")
+    runs = []
+    for workers, shared in [(1, False), (WORKER_COUNT, False), (WORKER_COUNT, True)]:
+        shared_path = os.path.join(bench.workdir, f"shared_{workers}.sqlite") if shared else None
+        results = context.Queue()
+        processes = [context.Process(target=_serve_share, args=(bench, stream[i::workers], shared_path, results))
+                     for i in range(workers)]
+        started = time.perf_counter()
+        for process in processes:
+            process.start()
+        per_worker = [results.get() for _ in processes]
+        for process in processes:
+            process.join()
+        seconds = time.perf_counter() - started
+
+        def rate(kind):
+            hits = sum(w[f"{kind}_hits"] for w in per_worker)
+            total = hits + sum(w[f"{kind}_misses"] for w in per_worker)
+            return round(hits / total, 4) if total else 0.0
+        run = {
+            "workers": workers, "cache": "shared" if shared else "per-process",
+            "requests": sum(w["requests"] for w in per_worker), "ok": sum(w["ok"] for w in per_worker),
+            "seconds": round(seconds, 3),
+            "answer_hit_rate": rate("answer"), "embed_hit_rate": rate("embed"),
+            "llm_calls": sum(w["llm_calls"] for w in per_worker),
+            "rss_mb_per_worker": [round(w["rss_mb"], 1) for w in per_worker],
+            "rss_mb_total": round(sum(w["rss_mb"] for w in per_worker), 1),
+        }
+        if shared_path:
+            run["shared_cache_mb"] = round(os.path.getsize(shared_path) / (1024 * 1024), 2)
+        print(f"🧮 {workers} worker(s), {run['cache']} cache: answer hit rate {run['answer_hit_rate']:.0%}, "
+              f"{run['llm_calls']} LLM calls, {run['rss_mb_total']:.0f} MB RSS")
+        runs.append(run)
+    return {"requests": WORKER_REQUESTS, "popular_share": CACHE_POPULAR_SHARE, "runs": runs}
+
+# ==============================================================================
+# 🏭 INGESTION SCENARIO
+# ==============================================================================
+def ingestion(bench):
+    import update_brain  # needs google-api-python-client installed (no keys)
+
+    workdir = os.path.join(bench.workdir, "ingest")
+    fakes = {name: faults(name, bench.seed + n)
+             for n, name in enumerate(["drive", "download", "parse", "embed", "upsert"])}
+    drive, roots = make_drive(YEARS, files_per_year=INGEST_FILES_PER_YEAR, seed=bench.seed,
+                              faults=fakes["drive"], download_faults=fakes["download"])
+    store = FakeVectorStore(os.path.join(workdir, "index"), faults=fakes["upsert"])
+    embed_model = CachedEmbedding(FakeEmbedding(fakes["embed"]),
+                                  EmbeddingCache(path=os.path.join(workdir, "embeddings.sqlite")), dimensions=768)
+
+    def run(label, full=False):
+        metrics.REGISTRY.reset()
+        before = fake_calls(fakes)
+        started = time.perf_counter()
+        summary = update_brain.update_database(full=full)
+        seconds = time.perf_counter() - started
+        calls = {name: {k: v - before[name][k] for k, v in counts.items()}
+                 for name, counts in fake_calls(fakes).items()}
+        print(f"🏭 {label}: {seconds:.1f}s")
+        return {"seconds": round(seconds, 3), **(summary or {"error": "update_database returned nothing"}),
+                "fakes": calls}
+
+    with contextlib.ExitStack() as patches:
+        for name, value in {
+            "embed_model": embed_model,
+            "parser": FakeParser(fakes["parse"]),
+            "build": lambda *args, **kwargs: drive,
+            "Credentials": SimpleNamespace(from_service_account_file=lambda path: None),
+            "folder_map": roots,
+            "MANIFEST_PATH": os.path.join(workdir, "manifest.json"),
+            "DRIVE_CACHE_PATH": os.path.join(workdir, "drive_listing.json"),
+            "SPARSE_INDEX_DIR": os.path.join(workdir, "sparse"),
+            "PARSE_CACHE_PATH": os.path.join(workdir, "parsed_pages.sqlite"),
+            "JOURNAL_PATH": os.path.join(workdir, "journal.sqlite"),
+            "METRICS_PATH": "",
+        }.items():
+            patches.enter_context(mock.patch.object(update_brain, name, value))
+        patches.enter_context(mock.patch.object(vector_backend, "connect", lambda *args, **kwargs: (store, store)))
+        patches.enter_context(mock.patch.object(vector_backend, "BACKEND", "local"))
+
+        results = {"files": len(drive.blobs), "full": run("full rebuild", full=True)}
+
+        # A typical day: a few files re-uploaded, one new, one deleted
+        rng = random.Random(bench.seed)
+        files = sorted(drive.blobs)
+        for file_id in rng.sample(files, max(1, len(files) // 5)):
+            drive.edit(file_id, make_document(rng, rng.choice(SUBJECTS)))
+        drive.remove(files[-1])
+        some_folder = next(i["id"] for i in drive.children[roots[YEARS[0]]] if i["id"] in drive.children)
+        drive.add(some_folder, "new circular.pdf", make_document(rng, SUBJECTS[0], pages=1, notice=True))
+        results["incremental"] = run("incremental")
+        results["unchanged"] = run("nothing changed")
+        # Index wiped, but every file's bytes were parsed before
+        results["rebuild_parse_cached"] = run("full rebuild, parse cache warm", full=True)
+    return results
+
+# ==============================================================================
+# 🏁 RUNNER
+# ==============================================================================
+SCENARIOS = {"single": single_request, "load": concurrent_load, "cache": cache_heavy, "workers": worker_caches,
+             "ingest": ingestion}
+
+class Bench:
+    def __init__(self, workdir, seed):
+        self.workdir = workdir
+        self.seed = seed
+        self._chat = None
+
+    def chat(self):
+        if self._chat is None:
+            self._chat = ChatBench(self.workdir, self.seed)
+        return self._chat
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except Exception:
+        return None
+
+def main():
+    cli = argparse.ArgumentParser(description="Offline latency/throughput benchmarks against fake backends")
+    cli.add_argument("--scenarios", default=",".join(SCENARIOS), help=f"comma list of {', '.join(SCENARIOS)}")
+    cli.add_argument("--out", default="-", help="JSON results path ('-' for stdout)")
+    cli.add_argument("--seed", type=int, default=0)
+    args = cli.parse_args()
+
+    chosen = [name.strip() for name in args.scenarios.split(",") if name.strip()]
+    unknown = [name for name in chosen if name not in SCENARIOS]
+    if unknown:
+        cli.error(f"unknown scenario(s): {', '.join(unknown)}")
+
+    results = {}
+    with tempfile.TemporaryDirectory(prefix="bmsit-bench-") as workdir, contextlib.redirect_stdout(sys.stderr):
+        bench = Bench(workdir, args.seed)
+        for name in chosen:
+            print(f"\n🏁 Scenario: {name}")
+            metrics.REGISTRY.reset()
+            try:
+                results[name] = SCENARIOS[name](bench)
+            except ImportError as e:
+                print(f"⚠️ Skipping {name}: {e}")
+                results[name] = {"skipped": f"missing dependency: {e.name}"}
+
+    document = {
+        "commit": git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "seed": args.seed,
+        "profile_ms": PROFILE_MS,
+        "failure_rate": FAILURE_RATE,
+        "answer_tokens": ANSWER_TOKENS,
+        "scenarios": results,
+    }
+    if args.out == "-":
+        json.dump(document, sys.stdout, indent=2)
+        print()
+    else:
+        os.makedirs(os.path.dirname(args.out) or ".", exist_ok=True)
+        with open(args.out, "w") as f:
+            json.dump(document, f, indent=2)
+        print(f"📝 Results written to {args.out}", file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
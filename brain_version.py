@@ -0,0 +1,34 @@
+import time
+
+# ==============================================================================
+# 🔖 BRAIN VERSION MARKER
+# update_brain.py runs on GitHub Actions, the API runs somewhere else. The only
+# thing both can see is Pinecone, so the "new documents were pushed" signal is a
+# single marker vector in its own namespace (never hit by year-filtered queries).
+# ==============================================================================
+
+META_NAMESPACE = "brain-meta"
+VERSION_ID = "brain-version"
+
+def bump(pinecone_index):
+    """Called by ingestion after pushing documents. Returns the new version."""
+    if hasattr(pinecone_index, "bump_version"):  # local backend keeps a version file
+        return pinecone_index.bump_version()
+    version = str(time.time_ns())
+    dimension = pinecone_index.describe_index_stats().dimension
+    # Pinecone rejects all-zero dense vectors, so the marker points along axis 0
+    values = [1.0] + [0.0] * (dimension - 1)
+    pinecone_index.upsert(
+        vectors=[{"id": VERSION_ID, "values": values, "metadata": {"version": version}}],
+        namespace=META_NAMESPACE,
+    )
+    return version
+
+def read(pinecone_index):
+    if hasattr(pinecone_index, "read_version"):
+        return pinecone_index.read_version()
+    result = pinecone_index.fetch(ids=[VERSION_ID], namespace=META_NAMESPACE)
+    marker = result.vectors.get(VERSION_ID)
+    if marker is None:
+        return None
+    return (marker.metadata or {}).get("version")
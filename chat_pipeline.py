@@ -0,0 +1,264 @@
+import asyncio
+import contextlib
+import os
+import time
+
+from llama_index.core import Settings, QueryBundle
+from llama_index.core.base.response.schema import Response
+
+import metrics
+from context_budget import count_tokens
+from single_flight import SingleFlight, flight_key
+
+# ==============================================================================
+# ⚡ ASYNC CHAT PIPELINE
+# embed -> retrieve -> generate, all awaited on the event loop so one uvicorn
+# worker can juggle many chats. Each stage has its own timeout; when a stage
+# times out, the stages after it never start.
+# ==============================================================================
+
+STAGE_TIMEOUTS = {
+    "embed": float(os.getenv("EMBED_TIMEOUT", "5")),
+    "retrieve": float(os.getenv("RETRIEVE_TIMEOUT", "5")),
+    "generate": float(os.getenv("GENERATE_TIMEOUT", "30")),
+}
+
+class StageTimeout(Exception):
+    def __init__(self, stage, seconds):
+        super().__init__(f"{stage} stage timed out after {seconds}s")
+        self.stage = stage
+
+async def run_stage(stage, coro, timeouts):
+    with metrics.timed(stage):
+        try:
+            return await asyncio.wait_for(coro, timeouts[stage])
+        except asyncio.TimeoutError:
+            raise StageTimeout(stage, timeouts[stage])
+
+async def iter_tokens(response):
+    """Async tokens from either an async or a plain streaming response"""
+    if hasattr(response, "async_response_gen"):
+        async for token in response.async_response_gen():
+            yield token
+        return
+
+    # Older synthesizers hand back a sync generator: pull it off the event loop
+    done = object()
+    tokens = response.response_gen
+    while True:
+        token = await asyncio.to_thread(next, tokens, done)
+        if token is done:
+            return
+        yield token
+
+class ChatPipeline:
+    def __init__(self, stack, max_in_flight=None, timeouts=None, cache=None, budgeter=None, admission=None,
+                 retrieval_cache=None, reranker=None):
+        self.stack = stack
+        self.admission = admission  # optional AdmissionControl, only for answers that need Gemini
+        self.cache = cache  # optional SemanticCache, checked right after embedding
+        self.retrieval_cache = retrieval_cache  # optional shared_cache.SharedRetrievalCache
+        self.reranker = reranker  # optional rerank.Reranker: picks 1..N of the retrieved candidates
+        self.budgeter = budgeter  # optional ContextBudgeter, run between retrieve and generate
+        self.max_in_flight = max_in_flight or int(os.getenv("MAX_IN_FLIGHT", "64"))
+        self.timeouts = {**STAGE_TIMEOUTS, **(timeouts or {})}
+        self._slots = asyncio.Semaphore(self.max_in_flight)
+        self.flights = SingleFlight()
+
+    # --- STAGES ---
+    async def _embed(self, message, session=None):
+        """With a session, the prompt sees the conversation and retrieval also uses the
+        previous question, so "what about unit 2?" still finds the right subject"""
+        transcript = session.transcript() if session is not None else ""
+        if not transcript:
+            retrieval_text, query_str = message, message
+        else:
+            retrieval_text = f"{session.last_question() or ''} {message}".strip()
+            query_str = f"(Conversation so far)\n{transcript}\n\n(Latest message) {message}"
+        embed_model = self.stack.embed_model or Settings.embed_model
+        embedding = await run_stage("embed", embed_model.aget_query_embedding(retrieval_text), self.timeouts)
+        return QueryBundle(query_str=query_str, embedding=embedding, custom_embedding_strs=[retrieval_text])
+
+    async def _retrieve(self, engine, query_bundle, year):
+        text = query_bundle.embedding_strs[0]
+        # The shared caches are SQLite files other workers may be writing: never block the loop on them
+        if self.retrieval_cache is not None:
+            nodes = await asyncio.to_thread(self.retrieval_cache.get, year, text)
+            metrics.CACHE_LOOKUPS.inc(cache="retrieval", result="miss" if nodes is None else "hit")
+            if nodes is not None:
+                return nodes
+        if self.stack.native_async_store:
+            coro = engine.aretrieve(query_bundle)
+        else:
+            # Vector store has no real async client; keep the blocking call off the loop
+            coro = asyncio.to_thread(engine.retrieve, query_bundle)
+        nodes = await run_stage("retrieve", coro, self.timeouts)
+        if self.retrieval_cache is not None:
+            await asyncio.to_thread(self.retrieval_cache.put, year, text, nodes)
+        return nodes
+
+    def _rerank(self, query_bundle, nodes):
+        """(chunks worth sending, scores report or None)"""
+        if self.reranker is None:
+            return nodes, None
+        with metrics.timed("rerank"):
+            kept, report = self.reranker.rerank(query_bundle.embedding_strs[0], nodes)
+        metrics.CHUNKS_SENT.observe(len(kept))
+        return kept, report
+
+    def _fit(self, query_bundle, nodes):
+        """(nodes for the prompt, token report or None)"""
+        if self.budgeter is None:
+            return nodes, None
+        with metrics.timed("prompt"):
+            fitted, report = self.budgeter.fit(query_bundle.embedding_strs[0], nodes)
+        metrics.LLM_TOKENS.inc(report["tokens_after"], kind="context")
+        metrics.LLM_TOKENS.inc(report["tokens_before"] - report["tokens_after"], kind="context_saved")
+        print(f"✂️ Context: {report['tokens_before']} -> {report['tokens_after']} tokens "
+              f"({report['duplicates']} duplicate chunks dropped)")
+        return fitted, report
+
+    def _charge(self, user):
+        return self.admission.charge(user) if self.admission is not None else []
+
+    def _refund(self, charged):
+        if self.admission is not None:
+            self.admission.refund(charged)
+
+    def _admitted(self):
+        if self.admission is None:
+            return contextlib.nullcontext()
+        return self.admission.admit()
+
+    # --- ANSWER CACHE ---
+    async def _cached(self, year, mode, query_bundle):
+        # Follow-ups depend on the conversation, so only fresh questions are shared
+        if self.cache is None or query_bundle.query_str != query_bundle.embedding_strs[0]:
+            return None
+        with metrics.timed("cache"):
+            cached = await asyncio.to_thread(self.cache.lookup, year, mode, query_bundle.embedding)
+        metrics.CACHE_LOOKUPS.inc(cache="answer", result="miss" if cached is None else "hit")
+        return cached
+
+    async def _remember(self, year, mode, query_bundle, text, nodes, started):
+        if self.cache is None or query_bundle.query_str != query_bundle.embedding_strs[0]:
+            return
+        latency_ms = (time.perf_counter() - started) * 1000
+        answer = Response(response=text, source_nodes=nodes)
+        await asyncio.to_thread(self.cache.store, year, mode, query_bundle.embedding, answer, latency_ms)
+
+    # --- ENTRY POINTS ---
+    # Flights are shared by every user asking the same question, so each caller is
+    # charged against its own rate limit before joining one: a rate-limited leader
+    # can't turn others away, and a user out of tokens can't ride someone else's
+    # flight. The token comes back unless the flight produced a Gemini answer.
+    async def answer(self, message, year, mode, session=None, user=None):
+        """user: rate-limit key (AdmissionControl.user_key). Raises Overloaded when shed."""
+        charged = self._charge(user)
+        generated = False
+        try:
+            if session is not None and session.transcript():
+                response, generated = await self._answer(message, year, mode, session)
+            else:
+                # Identical fresh questions in flight share one answer
+                key = flight_key(message, year, mode)
+                response, generated = await self.flights.run(key, lambda: self._answer(message, year, mode))
+            return response
+        finally:
+            if not generated:
+                self._refund(charged)
+
+    async def stream(self, message, year, mode, session=None, user=None):
+        """Yields ("sources", nodes) once, ("rerank", scores) if reranking, ("context", token report) if
+        budgeting, then ("token", text) chunks.
+        Admission happens before "sources", so an Overloaded error surfaces on the first event."""
+        charged = self._charge(user)
+        generated = False
+        try:
+            if session is not None and session.transcript():
+                source = self._stream(message, year, mode, session)
+            else:
+                key = flight_key(message, year, mode)
+                source = self.flights.stream(key, lambda: self._stream(message, year, mode))
+            async for kind, payload in source:
+                if kind == "generated":  # internal marker: Gemini finished this answer
+                    generated = True
+                    continue
+                yield kind, payload
+        finally:
+            if not generated:
+                self._refund(charged)
+
+    async def _answer(self, message, year, mode, session=None):
+        """(response, whether Gemini generated it)"""
+        async with self._slots:
+            started = time.perf_counter()
+            query_bundle = await self._embed(message, session)
+            cached = await self._cached(year, mode, query_bundle)
+            if cached is not None:
+                return cached, False
+
+            async with self._admitted():
+                engine = self.stack.get_engine(year, mode)
+                nodes = await self._retrieve(engine, query_bundle, year)
+                nodes, ranking = self._rerank(query_bundle, nodes)
+                context, report = self._fit(query_bundle, nodes)
+                response = await run_stage("generate", engine.asynthesize(query_bundle, context), self.timeouts)
+            metrics.LLM_TOKENS.inc(count_tokens(str(response)), kind="output")
+            # Callers see what was retrieved, not the trimmed prompt copies
+            response.source_nodes = nodes
+            if report is not None:
+                response.metadata = {**(response.metadata or {}), "context": report}
+            if ranking is not None:
+                response.metadata = {**(response.metadata or {}), "rerank": ranking}
+            await self._remember(year, mode, query_bundle, str(response), nodes, started)
+            return response, True
+
+    async def _stream(self, message, year, mode, session=None):
+        async with self._slots:
+            started = time.perf_counter()
+            query_bundle = await self._embed(message, session)
+            cached = await self._cached(year, mode, query_bundle)
+            if cached is not None:
+                yield "sources", cached.source_nodes
+                yield "token", cached.response
+                return
+
+            async with self._admitted():
+                engine = self.stack.get_engine(year, mode, streaming=True)
+                nodes = await self._retrieve(engine, query_bundle, year)
+                nodes, ranking = self._rerank(query_bundle, nodes)
+                yield "sources", nodes
+                if ranking is not None:
+                    yield "rerank", ranking
+                context, report = self._fit(query_bundle, nodes)
+                if report is not None:
+                    yield "context", report
+
+                loop = asyncio.get_running_loop()
+                generate_started = time.perf_counter()
+                deadline = loop.time() + self.timeouts["generate"]
+                response = await run_stage("generate", engine.asynthesize(query_bundle, context), self.timeouts)
+
+                tokens = iter_tokens(response)
+                text = []
+                try:
+                    while True:
+                        remaining = max(deadline - loop.time(), 0)
+                        try:
+                            token = await asyncio.wait_for(tokens.__anext__(), remaining)
+                        except StopAsyncIteration:
+                            break
+                        except asyncio.TimeoutError:
+                            metrics.STAGE_ERRORS.inc(stage="stream", error="StageTimeout")
+                            raise StageTimeout("generate", self.timeouts["generate"])
+                        if not text:
+                            metrics.observe("first_token", time.perf_counter() - generate_started)
+                        text.append(token)
+                        yield "token", token
+                finally:
+                    await tokens.aclose()
+                metrics.observe("stream", time.perf_counter() - generate_started)
+                metrics.LLM_TOKENS.inc(count_tokens("".join(text)), kind="output")
+                yield "generated", None
+                await self._remember(year, mode, query_bundle, "".join(text), nodes, started)
@@ -0,0 +1,165 @@
+import hashlib
+import os
+import re
+import threading
+
+from llama_index.core.node_parser import SentenceSplitter
+from llama_index.core.schema import NodeRelationship, RelatedNodeInfo, TextNode
+
+from context_budget import count_tokens, hamming, simhash
+
+# ==============================================================================
+# 🧩 CHUNKING + DEDUPLICATION (ingestion side)
+# Parsed pages are cut at headings ("MODULE 2", "Unit-3", "1.4 Scheduling") and
+# then into CHUNK_SIZE-token pieces, so a chunk rarely straddles two topics.
+# Chunk IDs come from file id + page + content hash: re-running ingestion over
+# the same text writes the same IDs (an upsert, never a second copy).
+# Repeated chunks (the same notice pasted into three PDFs) are embedded once
+# per year: retrieval is filtered by year, so each year keeps one copy.
+# ==============================================================================
+
+CHUNK_SIZE = int(os.getenv("CHUNK_SIZE", "512"))
+CHUNK_OVERLAP = int(os.getenv("CHUNK_OVERLAP", "64"))
+# SimHash bits two chunks may differ by and still count as the same chunk
+DEDUPE_DISTANCE = int(os.getenv("DEDUPE_DISTANCE", "3"))
+
+HEADING_RE = re.compile(
+    r"^\s*(#{1,6}\s+\S.*"
+    r"|(module|unit|chapter|part|section|lab|experiment|week)\s*[-–:]?\s*[0-9ivx]+\b[^.!?]{0,80}"
+    r"|\d+\.\d+(\.\d+)*\s+[^.!?]{1,80})\s*$",
+    re.IGNORECASE,
+)
+CAPS_HEADING_RE = re.compile(r"^\s*[A-Z][A-Z0-9 &/:()\-]{3,80}\s*$")
+# Citation fields stay out of the embedded text; file name and section help matching
+NOT_EMBEDDED = ["year", "file_link", "file_id", "path", "page", "chunk"]
+
+def normalize(text):
+    return " ".join(re.findall(r"\w+", text.lower()))
+
+def content_hash(text):
+    return hashlib.sha1(normalize(text).encode()).hexdigest()
+
+def chunk_id(file_id, page, text):
+    return f"{file_id}-p{page}-{content_hash(text)[:12]}"
+
+class Chunker:
+    def __init__(self, chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP):
+        self.chunk_size = chunk_size
+        self.splitter = SentenceSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+
+    def sections(self, text):
+        """[(heading or None, section text)] in page order"""
+        sections, heading, lines = [], None, []
+        for line in text.splitlines():
+            # Headings are short: a long line that happens to match is body text
+            if (HEADING_RE.match(line) or CAPS_HEADING_RE.match(line)) and len(line.split()) <= 12:
+                if any(l.strip() for l in lines):
+                    sections.append((heading, "\n".join(lines).strip()))
+                heading, lines = line.strip().lstrip("#").strip(), [line]
+            else:
+                lines.append(line)
+        if any(l.strip() for l in lines):
+            sections.append((heading, "\n".join(lines).strip()))
+        return sections
+
+    def split(self, text):
+        """[(heading, chunk text)]: small neighbouring sections share a chunk, big ones are split"""
+        chunks, group, group_heading, size = [], [], None, 0
+        for heading, section in self.sections(text):
+            tokens = count_tokens(section)
+            if group and size + tokens > self.chunk_size:
+                chunks += [(group_heading, c) for c in self.splitter.split_text("\n\n".join(group))]
+                group, size = [], 0
+            if not group:
+                group_heading = heading
+            group.append(section)
+            size += tokens
+        if group:
+            chunks += [(group_heading, c) for c in self.splitter.split_text("\n\n".join(group))]
+        return chunks
+
+class Deduper:
+    """Remembers every chunk kept this year (exact hash + SimHash) and which file owns it"""
+
+    def __init__(self, max_distance=DEDUPE_DISTANCE):
+        if not 0 <= max_distance < 64:
+            raise ValueError(f"DEDUPE_DISTANCE must be between 0 and 63 bits, got {max_distance}")
+        self.max_distance = max_distance
+        # Pigeonhole: max_distance differing bits can touch at most max_distance of
+        # max_distance + 1 bands, so a near-duplicate shares at least one band exactly
+        # (3 -> four 16-bit bands). Larger distances mean narrower bands, more candidates.
+        count = max_distance + 1
+        edges = [64 * i // count for i in range(count + 1)]
+        self._bands = [(lo, (1 << (hi - lo)) - 1) for lo, hi in zip(edges, edges[1:])]
+        self.exact = {}   # (year, sha1) -> owner file id
+        self.bands = {}   # (year, band no, band bits) -> [(simhash, owner file id)]
+        self.owned = {}   # owner file id -> [(year, sha1, simhash)]
+        self._lock = threading.Lock()
+
+    def _band_keys(self, year, fingerprint):
+        return [(year, band, (fingerprint >> shift) & mask) for band, (shift, mask) in enumerate(self._bands)]
+
+    def _add(self, year, exact, fingerprint, owner):
+        self.exact[(year, exact)] = owner
+        for key in self._band_keys(year, fingerprint):
+            self.bands.setdefault(key, []).append((fingerprint, owner))
+        self.owned.setdefault(owner, []).append((year, exact, fingerprint))
+
+    def seed(self, year, fingerprints, owner):
+        """Load [(sha1, simhash)] already in the index for one file"""
+        with self._lock:
+            for exact, fingerprint in fingerprints:
+                self._add(year, exact, fingerprint, owner)
+
+    def forget(self, owner):
+        with self._lock:
+            for year, exact, fingerprint in self.owned.pop(owner, []):
+                if self.exact.get((year, exact)) == owner:
+                    del self.exact[(year, exact)]
+                for key in self._band_keys(year, fingerprint):
+                    self.bands[key] = [e for e in self.bands.get(key, []) if e[1] != owner]
+
+    def check(self, year, text, owner):
+        """(sha1, simhash, file id it duplicates or None); new chunks are registered to owner"""
+        exact, fingerprint = content_hash(text), simhash(text)
+        with self._lock:
+            duplicate_of = self.exact.get((year, exact))
+            if duplicate_of is None:
+                for key in self._band_keys(year, fingerprint):
+                    for other, other_owner in self.bands.get(key, []):
+                        if hamming(fingerprint, other) <= self.max_distance:
+                            duplicate_of = other_owner
+                            break
+                    if duplicate_of is not None:
+                        break
+            if duplicate_of is None:
+                self._add(year, exact, fingerprint, owner)
+        return exact, fingerprint, duplicate_of
+
+def build_nodes(chunker, deduper, file_id, year, pages, metadata):
+    """pages: [(page number, text)]. Returns (nodes, [(sha1, simhash)] per node, {files duplicated})"""
+    nodes, fingerprints, duplicate_of = [], [], set()
+    for page, text in pages:
+        for chunk_no, (heading, chunk) in enumerate(chunker.split(text)):
+            exact, fingerprint, owner = deduper.check(year, chunk, file_id)
+            if owner is not None:
+                if owner != file_id:
+                    duplicate_of.add(owner)
+                continue
+            node = TextNode(
+                id_=chunk_id(file_id, page, chunk),
+                text=chunk,
+                metadata={
+                    **metadata,
+                    "year": year,
+                    "file_id": file_id,
+                    "page": page,
+                    "chunk": chunk_no,
+                    **({"section": heading} if heading else {}),
+                },
+                excluded_embed_metadata_keys=NOT_EMBEDDED,
+            )
+            node.relationships[NodeRelationship.SOURCE] = RelatedNodeInfo(node_id=file_id)
+            nodes.append(node)
+            fingerprints.append((exact, fingerprint))
+    return nodes, fingerprints, duplicate_of
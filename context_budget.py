@@ -0,0 +1,132 @@
+import hashlib
+import re
+
+import numpy as np
+from llama_index.core import Settings
+from llama_index.core.schema import MetadataMode, NodeWithScore, TextNode
+
+from sparse_index import tokenize
+
+# ==============================================================================
+# ✂️ CONTEXT BUDGET
+# Runs between retrieval and generation. The top chunks often repeat each other
+# (same notice in two PDFs, overlapping pages) and every one carries its own
+# file_link + "[LINK]: ..." line. Before Gemini sees them we:
+#   1. drop near-duplicate chunks (64-bit SimHash over word shingles)
+#   2. strip the per-chunk links and list every source once at the end
+#   3. if it's still over budget, keep the sentences that overlap the question most
+# ==============================================================================
+
+LINK_LINE = re.compile(r"^\s*\[LINK\]:\s*(\S+)\s*$", re.MULTILINE)
+SENTENCE_END = re.compile(r"(?<=[.!?])\s+|\n+")
+WORD_RE = re.compile(r"\w+")
+
+def count_tokens(text):
+    return len(Settings.tokenizer(text))
+
+def simhash(text, shingle=3):
+    words = WORD_RE.findall(text.lower())
+    grams = [" ".join(words[i:i + shingle]) for i in range(max(1, len(words) - shingle + 1))]
+    digests = np.frombuffer(
+        b"".join(hashlib.blake2b(g.encode(), digest_size=8).digest() for g in grams), dtype=np.uint64
+    )
+    bits = (digests[:, None] >> np.arange(64, dtype=np.uint64)) & np.uint64(1)
+    votes = bits.sum(axis=0, dtype=np.int64) * 2 - len(grams)
+    return int(sum(1 << i for i in range(64) if votes[i] > 0))
+
+def hamming(a, b):
+    return bin(a ^ b).count("1")
+
+def _pages(pages):
+    return ", ".join(str(p) for p in sorted(pages))
+
+class ContextBudgeter:
+    def __init__(self, max_tokens=2000, max_distance=3, shingle=3):
+        """max_distance: SimHash bits two chunks may differ by and still count as duplicates"""
+        self.max_tokens = max_tokens
+        self.max_distance = max_distance
+        self.shingle = shingle
+
+    def _dedupe(self, nodes):
+        kept, fingerprints = [], []
+        for hit in nodes:  # best first, so the higher-scored copy survives
+            fingerprint = simhash(hit.node.get_content(), self.shingle)
+            if any(hamming(fingerprint, f) <= self.max_distance for f in fingerprints):
+                continue
+            kept.append(hit)
+            fingerprints.append(fingerprint)
+        return kept
+
+    def _trim(self, query, texts, budget):
+        """Keep the highest-value sentences (question overlap, then chunk rank) within budget"""
+        query_terms = set(tokenize(query))
+        sentences = []
+        for rank, text in enumerate(texts):
+            for position, sentence in enumerate(s for s in SENTENCE_END.split(text) if s.strip()):
+                overlap = len(query_terms & set(tokenize(sentence)))
+                score = overlap + (0.5 if position == 0 else 0) - 0.1 * rank
+                sentences.append((score, rank, position, sentence, count_tokens(sentence)))
+
+        chosen, seen, used = set(), set(), 0
+        for score, rank, position, sentence, tokens in sorted(sentences, key=lambda s: -s[0]):
+            key = " ".join(WORD_RE.findall(sentence.lower()))
+            if key in seen or used + tokens > budget:
+                continue
+            chosen.add((rank, position))
+            seen.add(key)
+            used += tokens
+
+        trimmed = [[] for _ in texts]
+        for _, rank, position, sentence, _ in sentences:
+            if (rank, position) in chosen:
+                trimmed[rank].append(sentence.strip())
+        return [" ".join(parts) for parts in trimmed]
+
+    def fit(self, query, nodes):
+        """Returns (nodes for the prompt, report with before/after token counts)"""
+        tokens_before = sum(count_tokens(hit.node.get_content(metadata_mode=MetadataMode.LLM)) for hit in nodes)
+        unique = self._dedupe(nodes)
+
+        # Duplicates still count as sources: the same notice can live in two PDFs
+        cited = {}  # link -> (file name, pages)
+        for hit in nodes:
+            metadata = hit.node.metadata
+            for link in LINK_LINE.findall(hit.node.get_content()) + [metadata.get("file_link")]:
+                if not link:
+                    continue
+                name, pages = cited.setdefault(link, (metadata.get("file_name"), []))
+                if metadata.get("page") and metadata["page"] not in pages:
+                    pages.append(metadata["page"])
+        texts = [LINK_LINE.sub("", hit.node.get_content()).strip() for hit in unique]
+        sources = "SOURCES:\n" + "\n".join(
+            f"- {name or 'Document'}{f' (p. {_pages(pages)})' if pages else ''}: {link}"
+            for link, (name, pages) in cited.items()
+        ) if cited else ""
+
+        budget = self.max_tokens - count_tokens(sources)
+        if sum(count_tokens(t) for t in texts) > budget:
+            texts = self._trim(query, texts, budget)
+
+        fitted = []
+        for hit, text in zip(unique, texts):
+            if not text:
+                continue
+            node = TextNode(
+                id_=hit.node.node_id,
+                text=text,
+                metadata=hit.node.metadata,
+                # Links are listed once in the SOURCES block instead
+                excluded_llm_metadata_keys=list(hit.node.metadata),
+            )
+            fitted.append(NodeWithScore(node=node, score=hit.score))
+        if sources:
+            fitted.append(NodeWithScore(node=TextNode(id_="context-sources", text=sources), score=0.0))
+
+        report = {
+            "chunks_in": len(nodes),
+            "chunks_out": len(fitted) - (1 if sources else 0),
+            "duplicates": len(nodes) - len(unique),
+            "tokens_before": tokens_before,
+            "tokens_after": sum(count_tokens(hit.node.get_content(metadata_mode=MetadataMode.LLM)) for hit in fitted),
+        }
+        return fitted, report
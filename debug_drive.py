@@ -1,5 +1,6 @@
 from google.oauth2 import service_account
 from googleapiclient.discovery import build
+from drive_io import DriveCrawler
 
 # 1. Setup
 SCOPES = ['https://www.googleapis.com/auth/drive']
@@ -12,19 +13,18 @@ try:
         SERVICE_ACCOUNT_FILE, scopes=SCOPES)
     service = build('drive', 'v3', credentials=creds)
 
-    # 3. List Files
+    # 3. List Files (every page, every subfolder, no listing cache)
     print(f"👀 Robot is looking inside folder: {FOLDER_ID}...")
-    results = service.files().list(
-        q=f"'{FOLDER_ID}' in parents",
-        fields="files(id, name, mimeType)").execute()
-    items = results.get('files', [])
+    crawler = DriveCrawler(service)
+    items = crawler.crawl({"debug": FOLDER_ID}, use_cache=False)["debug"]
 
     if not items:
         print("❌ Result: The robot sees EMPTY folder (0 files).")
     else:
         print("✅ Result: The robot sees these files:")
         for item in items:
-            print(f"   - {item['name']} ({item['mimeType']})")
+            print(f"   - {item['path']} ({item['mimeType']})")
+    print(f"📡 {crawler.stats}")
 
 except Exception as e:
-    print(f"❌ Error: {e}")
\ No newline at end of file
+    print(f"❌ Error: {e}")
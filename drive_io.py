@@ -0,0 +1,217 @@
+import io
+import json
+import os
+import tempfile
+import threading
+import time
+
+from googleapiclient.http import MediaIoBaseDownload
+
+from ingest_pipeline import is_retryable
+
+# ==============================================================================
+# 📥 DRIVE DOWNLOADS (no temp_downloads/ folder)
+# PDFs stream straight into RAM and go to the parser from there. Anything bigger
+# than the spill threshold goes to a self-deleting temp file instead. A shared
+# memory budget caps how many bytes of PDFs sit in RAM across all workers.
+# ==============================================================================
+
+MB = 1024 * 1024
+
+class MemoryBudget:
+    def __init__(self, limit_bytes):
+        self.limit = limit_bytes
+        self.used = 0
+        self.peak = 0
+        self._cond = threading.Condition()
+
+    def acquire(self, size):
+        with self._cond:
+            # A single file bigger than the whole budget still gets through on its own
+            while self.used and self.used + size > self.limit:
+                self._cond.wait()
+            self.used += size
+            self.peak = max(self.peak, self.used)
+
+    def release(self, size):
+        with self._cond:
+            self.used -= size
+            self._cond.notify_all()
+
+class DownloadedFile:
+    """A downloaded PDF, either in memory or spilled to disk, ready for LlamaParse"""
+
+    def __init__(self, file_name, buffer, spilled, reserved, budget):
+        self.file_name = file_name
+        self.buffer = buffer
+        self.spilled = spilled
+        self._reserved = reserved
+        self._budget = budget
+
+    def parse_with(self, parser):
+        self.buffer.seek(0)
+        if self.spilled:
+            return parser.load_data(self.buffer.name)
+        return parser.load_data(self.buffer, extra_info={"file_name": self.file_name})
+
+    def close(self):
+        self.buffer.close()  # spilled temp files delete themselves here
+        self._budget.release(self._reserved)
+        self._reserved = 0
+
+def download(service, item, budget, chunk_size=16 * MB, spill_threshold=25 * MB):
+    size = int(item.get("size") or 0)
+    spilled = not size or size > spill_threshold
+    reserved = 0 if spilled else size
+    budget.acquire(reserved)
+
+    if spilled:
+        buffer = tempfile.NamedTemporaryFile(prefix="bmsit-", suffix=".pdf")
+    else:
+        buffer = io.BytesIO()
+    try:
+        request = service.files().get_media(fileId=item["id"])
+        downloader = MediaIoBaseDownload(buffer, request, chunksize=chunk_size)
+        done = False
+        while not done:
+            _, done = downloader.next_chunk()
+        buffer.flush()
+    except Exception:
+        buffer.close()
+        budget.release(reserved)
+        raise
+
+    return DownloadedFile(f"{item['id']}.pdf", buffer, spilled, reserved, budget)
+
+# ==============================================================================
+# 🕷️ DRIVE CRAWLER
+# Lists every file under the year folders, subfolders included. All folders at
+# one depth are listed together in batch HTTP requests (one round trip for up
+# to 100 folders), every page is followed, and only the fields we use are asked
+# for. Listings are cached between runs; the Drive changes feed tells us which
+# cached folders are stale, so a quiet night re-lists nothing.
+# ==============================================================================
+
+FOLDER_MIME = "application/vnd.google-apps.folder"
+LIST_FIELDS = "nextPageToken, files(id, name, mimeType, webViewLink, md5Checksum, modifiedTime, size)"
+CHANGE_FIELDS = "nextPageToken, newStartPageToken, changes(fileId, removed, file(parents))"
+
+class DriveCrawler:
+    def __init__(self, service, cache_path=None, batch_size=50, retries=3):
+        self.service = service
+        self.cache_path = cache_path
+        self.batch_size = min(batch_size, 100)  # Drive's batch limit
+        self.retries = retries
+        self.folders = {}        # folder id -> cached child items
+        self.start_token = None  # changes feed position of the cached listings
+        self.stats = {"requests": 0, "batches": 0, "folders_listed": 0, "folders_cached": 0}
+
+        if cache_path and os.path.exists(cache_path):
+            with open(cache_path) as f:
+                cached = json.load(f)
+            self.folders = cached.get("folders", {})
+            self.start_token = cached.get("start_page_token")
+
+    # --- 1. WHICH CACHED FOLDERS ARE STALE? ---
+    def _dirty_folders(self):
+        if not self.start_token:
+            return None  # no usable cache: everything is dirty
+        dirty = set()
+        token = self.start_token
+        while token:
+            response = self.service.changes().list(
+                pageToken=token, fields=CHANGE_FIELDS, pageSize=1000,
+                includeItemsFromAllDrives=True, supportsAllDrives=True,
+            ).execute()
+            self.stats["requests"] += 1
+            for change in response.get("changes", []):
+                # New parents gained a child, old parents lost one
+                dirty.update((change.get("file") or {}).get("parents", []))
+                dirty.update(folder_id for folder_id, children in self.folders.items()
+                             if any(c["id"] == change["fileId"] for c in children))
+            token = response.get("nextPageToken")
+        return dirty
+
+    # --- 2. BATCHED LISTING ---
+    def _list_folders(self, folder_ids):
+        """folder id -> all child items, following nextPageToken for each"""
+        listings = {folder_id: [] for folder_id in folder_ids}
+        pending = [(folder_id, None, 0) for folder_id in folder_ids]
+
+        while pending:
+            round_, pending = pending[:self.batch_size], pending[self.batch_size:]
+            batch = self.service.new_batch_http_request()
+
+            for folder_id, page_token, attempt in round_:
+                def on_response(request_id, response, exception,
+                                folder_id=folder_id, page_token=page_token, attempt=attempt):
+                    if exception is not None:
+                        if attempt >= self.retries or not is_retryable(exception):
+                            raise exception
+                        time.sleep(2 ** attempt)
+                        pending.append((folder_id, page_token, attempt + 1))
+                        return
+                    listings[folder_id].extend(response.get("files", []))
+                    if response.get("nextPageToken"):
+                        pending.append((folder_id, response["nextPageToken"], 0))
+
+                batch.add(self.service.files().list(
+                    q=f"'{folder_id}' in parents and trashed = false",
+                    fields=LIST_FIELDS, pageSize=1000, pageToken=page_token,
+                    includeItemsFromAllDrives=True, supportsAllDrives=True,
+                ), callback=on_response)
+
+            batch.execute()
+            self.stats["batches"] += 1
+            self.stats["requests"] += len(round_)
+
+        self.stats["folders_listed"] += len(folder_ids)
+        return listings
+
+    # --- 3. WALK THE TREES ---
+    def crawl(self, roots, use_cache=True):
+        """roots = {year: folder id}. Returns {year: [file items]}, each with a 'path'."""
+        try:
+            dirty = self._dirty_folders() if use_cache else None
+        except Exception as e:
+            print(f"⚠️ Drive changes feed unavailable, re-listing everything: {e}")
+            dirty = None
+        if dirty is None:
+            self.folders = {}
+        new_token = self.service.changes().getStartPageToken(supportsAllDrives=True).execute()["startPageToken"]
+
+        files = {year: [] for year in roots}
+        level = [(year, folder_id, "") for year, folder_id in roots.items()]
+        seen = set(roots.values())
+
+        while level:
+            stale = [f for _, f, _ in level if f not in self.folders or (dirty and f in dirty)]
+            self.stats["folders_cached"] += len(level) - len(stale)
+            self.folders.update(self._list_folders(stale))
+
+            next_level = []
+            for year, folder_id, path in level:
+                for child in self.folders[folder_id]:
+                    child_path = f"{path}{child['name']}"
+                    if child["mimeType"] == FOLDER_MIME:
+                        if child["id"] not in seen:
+                            seen.add(child["id"])
+                            next_level.append((year, child["id"], f"{child_path}/"))
+                    else:
+                        files[year].append({**child, "path": child_path})
+            level = next_level
+
+        # Forget folders that are no longer part of any tree
+        self.folders = {f: children for f, children in self.folders.items() if f in seen}
+        self.start_token = new_token
+        self.save()
+        return files
+
+    def save(self):
+        if not self.cache_path:
+            return
+        os.makedirs(os.path.dirname(self.cache_path) or ".", exist_ok=True)
+        tmp_path = f"{self.cache_path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"start_page_token": self.start_token, "folders": self.folders}, f)
+        os.replace(tmp_path, self.cache_path)
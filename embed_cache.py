@@ -0,0 +1,184 @@
+import asyncio
+import hashlib
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
+
+import numpy as np
+from llama_index.core.base.embeddings.base import BaseEmbedding
+from llama_index.core.bridge.pydantic import PrivateAttr
+
+# ==============================================================================
+# 🧬 EMBEDDING CACHE
+# Same text + same model + same dimensionality = same vector, so never pay
+# Google twice for it. The key carries the model name and output size, which
+# means a 768-dim gemini-embedding-001 vector can never be served for an
+# embedding-001 lookup (or the other way round). The async paths look up and
+# store through a thread: the disk and shared caches are SQLite files other
+# workers may be writing, and the event loop must never wait on their locks.
+# ==============================================================================
+
+class EmbeddingCache:
+    def __init__(self, max_entries=10000, path=None, shared=None, shared_ttl=7 * 86400):
+        """shared: a shared_cache.SharedCache, so every API worker on the host reuses one copy"""
+        self.max_entries = max_entries
+        self.shared = shared
+        self.shared_ttl = shared_ttl
+        self._lock = threading.Lock()
+        self._memory = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+        # Optional on-disk store (ingestion reuses vectors across runs)
+        self._db = None
+        if path:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vector BLOB)")
+            self._db.commit()
+
+    @staticmethod
+    def make_key(namespace, kind, text):
+        """namespace = model|dims, kind = query or text (Gemini embeds them differently)"""
+        return hashlib.sha256(f"{namespace}\x00{kind}\x00{text}".encode("utf-8")).hexdigest()
+
+    def get(self, key):
+        with self._lock:
+            vector = self._memory.get(key)
+            if vector is not None:
+                self._memory.move_to_end(key)
+                self.hits += 1
+                return vector
+
+            if self._db is not None:
+                row = self._db.execute("SELECT vector FROM embeddings WHERE key = ?", (key,)).fetchone()
+                if row is not None:
+                    vector = np.frombuffer(row[0], dtype=np.float32).tolist()
+                    self._remember(key, vector)
+                    self.hits += 1
+                    return vector
+
+        if self.shared is not None:
+            blob = self.shared.get("embedding", key)
+            if blob is not None:
+                vector = np.frombuffer(blob, dtype=np.float32).tolist()
+                with self._lock:
+                    self._remember(key, vector)
+                    self.hits += 1
+                return vector
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, key, vector):
+        self.put_many([(key, vector)])
+
+    def put_many(self, items):
+        with self._lock:
+            for key, vector in items:
+                self._remember(key, vector)
+            if self._db is not None:
+                rows = [(key, np.asarray(vector, dtype=np.float32).tobytes()) for key, vector in items]
+                self._db.executemany("INSERT OR REPLACE INTO embeddings (key, vector) VALUES (?, ?)", rows)
+                self._db.commit()
+        if self.shared is not None:
+            # Same text + model = same vector whatever the documents say: no generation
+            for key, vector in items:
+                self.shared.set("embedding", key, np.asarray(vector, dtype=np.float32).tobytes(),
+                                ttl=self.shared_ttl, versioned=False)
+
+    def _remember(self, key, vector):
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+            "entries": len(self._memory),
+        }
+
+class CachedEmbedding(BaseEmbedding):
+    """Drop-in wrapper: Settings.embed_model = CachedEmbedding(GoogleGenAIEmbedding(...), cache)"""
+
+    _inner: BaseEmbedding = PrivateAttr()
+    _cache: EmbeddingCache = PrivateAttr()
+    _namespace: str = PrivateAttr()
+    _dimensions: int = PrivateAttr()
+
+    def __init__(self, inner, cache, dimensions=None, **kwargs):
+        super().__init__(model_name=inner.model_name, embed_batch_size=inner.embed_batch_size, **kwargs)
+        self._inner = inner
+        self._cache = cache
+        self._dimensions = dimensions
+        self._namespace = f"{inner.model_name}|{dimensions or 'native'}"
+
+    @classmethod
+    def class_name(cls):
+        return "CachedEmbedding"
+
+    @property
+    def cache(self):
+        return self._cache
+
+    def _check(self, vector):
+        # Refuse to cache a vector of the wrong size instead of mixing it in silently
+        if self._dimensions and len(vector) != self._dimensions:
+            raise ValueError(
+                f"{self.model_name} returned {len(vector)} dims, expected {self._dimensions}"
+            )
+        return vector
+
+    # --- QUERIES ---
+    def _get_query_embedding(self, query):
+        key = EmbeddingCache.make_key(self._namespace, "query", query)
+        vector = self._cache.get(key)
+        if vector is None:
+            vector = self._check(self._inner.get_query_embedding(query))
+            self._cache.put(key, vector)
+        return vector
+
+    async def _aget_query_embedding(self, query):
+        key = EmbeddingCache.make_key(self._namespace, "query", query)
+        vector = await asyncio.to_thread(self._cache.get, key)
+        if vector is None:
+            vector = self._check(await self._inner.aget_query_embedding(query))
+            await asyncio.to_thread(self._cache.put, key, vector)
+        return vector
+
+    # --- DOCUMENTS (only the misses go to the API, in one batch) ---
+    def _get_text_embedding(self, text):
+        return self._get_text_embeddings([text])[0]
+
+    def _split(self, texts):
+        keys = [EmbeddingCache.make_key(self._namespace, "text", t) for t in texts]
+        vectors = [self._cache.get(k) for k in keys]
+        missing = [i for i, v in enumerate(vectors) if v is None]
+        return keys, vectors, missing
+
+    def _fill(self, keys, vectors, missing, fresh):
+        for i, vector in zip(missing, fresh):
+            vectors[i] = self._check(vector)
+        self._cache.put_many([(keys[i], vectors[i]) for i in missing])
+        return vectors
+
+    def _get_text_embeddings(self, texts):
+        keys, vectors, missing = self._split(texts)
+        if missing:
+            fresh = self._inner.get_text_embedding_batch([texts[i] for i in missing])
+            self._fill(keys, vectors, missing, fresh)
+        return vectors
+
+    async def _aget_text_embeddings(self, texts):
+        keys, vectors, missing = await asyncio.to_thread(self._split, texts)
+        if missing:
+            fresh = await self._inner.aget_text_embedding_batch([texts[i] for i in missing])
+            await asyncio.to_thread(self._fill, keys, vectors, missing, fresh)
+        return vectors
@@ -0,0 +1,423 @@
+import asyncio
+import hashlib
+import random
+import re
+import threading
+import time
+import zlib
+
+import numpy as np
+from llama_index.core import Document
+from llama_index.core.base.embeddings.base import BaseEmbedding
+from llama_index.core.base.llms.types import CompletionResponse, LLMMetadata
+from llama_index.core.bridge.pydantic import PrivateAttr
+from llama_index.core.llms import CustomLLM
+from llama_index.core.llms.callbacks import llm_completion_callback
+
+from local_store import LocalVectorStore
+
+# ==============================================================================
+# 🎭 OFFLINE FAKES (used by benchmark.py)
+# In-process stand-ins for Gemini (embeddings + streamed generation), Pinecone,
+# Google Drive and LlamaParse. Each one sleeps like the real API and can fail
+# on purpose: a Faults object holds the latency, jitter and failure rate, and
+# injected failures look like HTTP 503s, so the real retry paths run.
+# Everything is seeded, so two runs of the same commit do the same work.
+# ==============================================================================
+
+class InjectedFailure(Exception):
+    status_code = 503  # retryable for ingest_pipeline.is_retryable
+
+class Faults:
+    def __init__(self, latency=0.0, jitter=0.1, failure_rate=0.0, seed=0):
+        """latency in seconds per call, jitter as a +/- fraction of it"""
+        self.latency = latency
+        self.jitter = jitter
+        self.failure_rate = failure_rate
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.failures = 0
+
+    def delay(self):
+        with self._lock:
+            return max(0.0, self.latency * (1 + self.jitter * (2 * self._random.random() - 1)))
+
+    def roll(self, what):
+        with self._lock:
+            self.calls += 1
+            failed = self._random.random() < self.failure_rate
+            self.failures += failed
+        if failed:
+            raise InjectedFailure(f"injected {what} failure (503)")
+
+    def wait(self, what):
+        time.sleep(self.delay())
+        self.roll(what)
+
+    async def async_wait(self, what):
+        await asyncio.sleep(self.delay())
+        self.roll(what)
+
+    def report(self):
+        return {"calls": self.calls, "failures": self.failures}
+
+# --- 1. EMBEDDINGS (Gemini) ---
+def hashed_vector(text, dimensions):
+    """Bag of words through the hashing trick: shared words -> similar vectors"""
+    vector = np.zeros(dimensions, np.float32)
+    for word in re.findall(r"\w+", text.lower()):
+        h = zlib.crc32(word.encode())
+        vector[h % dimensions] += 1.0 if h & 0x10000 else -1.0
+    norm = np.linalg.norm(vector)
+    return (vector / norm if norm else vector).tolist()
+
+class FakeEmbedding(BaseEmbedding):
+    dimensions: int = 768
+    _faults: Faults = PrivateAttr()
+
+    def __init__(self, faults=None, dimensions=768, **kwargs):
+        super().__init__(model_name="fake-embedding", dimensions=dimensions, **kwargs)
+        self._faults = faults or Faults()
+
+    @classmethod
+    def class_name(cls):
+        return "FakeEmbedding"
+
+    @property
+    def faults(self):
+        return self._faults
+
+    def _get_query_embedding(self, query):
+        self._faults.wait("embed")
+        return hashed_vector(query, self.dimensions)
+
+    async def _aget_query_embedding(self, query):
+        await self._faults.async_wait("embed")
+        return hashed_vector(query, self.dimensions)
+
+    def _get_text_embedding(self, text):
+        return self._get_text_embeddings([text])[0]
+
+    def _get_text_embeddings(self, texts):
+        # One round trip per batch, like the real batch endpoint
+        self._faults.wait("embed")
+        return [hashed_vector(t, self.dimensions) for t in texts]
+
+# --- 2. GENERATION (Gemini, streamed) ---
+class FakeLLM(CustomLLM):
+    """Faults.latency is the time to first token; every further token takes token_latency"""
+
+    tokens: int = 40
+    token_latency: float = 0.0
+    _faults: Faults = PrivateAttr()
+
+    def __init__(self, faults=None, tokens=40, token_latency=0.0, **kwargs):
+        super().__init__(tokens=tokens, token_latency=token_latency, **kwargs)
+        self._faults = faults or Faults()
+
+    @classmethod
+    def class_name(cls):
+        return "FakeLLM"
+
+    @property
+    def faults(self):
+        return self._faults
+
+    @property
+    def metadata(self):
+        return LLMMetadata(context_window=1_000_000, num_output=self.tokens, model_name="fake-llm")
+
+    def _words(self, prompt):
+        # Echo words from the end of the prompt (the question), so answers differ per question
+        words = re.findall(r"\w+", prompt)[-24:] or ["ok"]
+        return [f"{words[i % len(words)]} " for i in range(self.tokens)]
+
+    @llm_completion_callback()
+    def complete(self, prompt, formatted=False, **kwargs):
+        self._faults.wait("generate")
+        words = self._words(prompt)
+        time.sleep(self.token_latency * len(words))
+        return CompletionResponse(text="".join(words))
+
+    @llm_completion_callback()
+    def stream_complete(self, prompt, formatted=False, **kwargs):
+        self._faults.wait("generate")
+        words = self._words(prompt)
+
+        def gen():
+            text = ""
+            for word in words:
+                time.sleep(self.token_latency)
+                text += word
+                yield CompletionResponse(text=text, delta=word)
+        return gen()
+
+    @llm_completion_callback()
+    async def acomplete(self, prompt, formatted=False, **kwargs):
+        await self._faults.async_wait("generate")
+        words = self._words(prompt)
+        await asyncio.sleep(self.token_latency * len(words))
+        return CompletionResponse(text="".join(words))
+
+    @llm_completion_callback()
+    async def astream_complete(self, prompt, formatted=False, **kwargs):
+        await self._faults.async_wait("generate")
+        words = self._words(prompt)
+
+        async def gen():
+            text = ""
+            for word in words:
+                await asyncio.sleep(self.token_latency)
+                text += word
+                yield CompletionResponse(text=text, delta=word)
+        return gen()
+
+# --- 3. VECTOR STORE (Pinecone) ---
+class FakeVectorStore(LocalVectorStore):
+    """The real local store (so results are real), plus a network round trip per call"""
+
+    _faults: Faults = PrivateAttr()
+
+    def __init__(self, path, faults=None, **kwargs):
+        super().__init__(path, **kwargs)
+        self._faults = faults or Faults()
+
+    @classmethod
+    def class_name(cls):
+        return "FakeVectorStore"
+
+    @property
+    def faults(self):
+        return self._faults
+
+    def query(self, query, **kwargs):
+        self._faults.wait("vector query")
+        return super().query(query, **kwargs)
+
+    async def aquery(self, query, **kwargs):
+        await self._faults.async_wait("vector query")
+        return LocalVectorStore.query(self, query, **kwargs)
+
+    def add(self, nodes, **kwargs):
+        self._faults.wait("vector upsert")
+        return super().add(nodes, **kwargs)
+
+# --- 4. GOOGLE DRIVE (googleapiclient-shaped) ---
+class _Call:
+    def __init__(self, faults, what, fn):
+        self._faults, self._what, self._fn = faults, what, fn
+
+    def run(self):
+        self._faults.roll(self._what)
+        return self._fn()
+
+    def execute(self, **kwargs):
+        time.sleep(self._faults.delay())
+        return self.run()
+
+class _Batch:
+    def __init__(self, faults):
+        self._faults = faults
+        self._calls = []
+
+    def add(self, request, callback):
+        self._calls.append((request, callback))
+
+    def execute(self):
+        # One round trip for the whole batch; each part can still fail on its own
+        time.sleep(self._faults.delay())
+        for n, (request, callback) in enumerate(self._calls):
+            try:
+                response, error = request.run(), None
+            except InjectedFailure as e:
+                response, error = None, e
+            callback(str(n), response, error)
+
+class _MediaResponse(dict):
+    def __init__(self, status, headers=None):
+        super().__init__(headers or {})
+        self.status = status
+        self.reason = "OK" if status < 300 else "Service Unavailable"
+
+class _MediaHttp:
+    """What MediaIoBaseDownload talks to: request(uri, method, headers) -> (response, bytes)"""
+
+    def __init__(self, drive, file_id):
+        self._drive, self._file_id = drive, file_id
+
+    def request(self, uri, method="GET", headers=None, **kwargs):
+        faults = self._drive.download_faults
+        time.sleep(faults.delay())
+        try:
+            faults.roll("drive download")
+        except InjectedFailure:
+            return _MediaResponse(503), b""
+        blob = self._drive.blobs[self._file_id]
+        start, end = 0, len(blob) - 1
+        match = re.match(r"bytes=(\d+)-(\d+)", (headers or {}).get("range", ""))
+        if match:
+            start, end = int(match.group(1)), min(int(match.group(2)), len(blob) - 1)
+        return _MediaResponse(206, {"content-range": f"bytes {start}-{end}/{len(blob)}"}), blob[start:end + 1]
+
+class _MediaRequest:
+    def __init__(self, drive, file_id):
+        self.http = _MediaHttp(drive, file_id)
+        self.uri = f"https://fake.drive/files/{file_id}?alt=media"
+        self.headers = {}
+
+class FakeDrive:
+    """In-memory Drive: files().list / get_media, changes(), new_batch_http_request().
+    edit() / add() / remove() change the tree and append to the changes feed."""
+
+    def __init__(self, faults=None, download_faults=None, page_size=100):
+        self.faults = faults or Faults()
+        self.download_faults = download_faults or Faults()
+        self.page_size = page_size
+        self.children = {}  # folder id -> [items]
+        self.blobs = {}     # file id -> bytes
+        self.parents = {}   # item id -> folder id
+        self.changelog = []  # [(file id, [parents], removed)]
+        self._ids = 0
+
+    def _new_id(self, prefix):
+        self._ids += 1
+        return f"{prefix}{self._ids:05d}"
+
+    def folder(self, name, parent=None):
+        folder_id = self._new_id("folder")
+        self.children[folder_id] = []
+        if parent is not None:
+            self.children[parent].append({"id": folder_id, "name": name,
+                                          "mimeType": "application/vnd.google-apps.folder"})
+            self.parents[folder_id] = parent
+        return folder_id
+
+    def add(self, parent, name, blob, mime="application/pdf"):
+        file_id = self._new_id("file")
+        self.children[parent].append({
+            "id": file_id, "name": name, "mimeType": mime,
+            "webViewLink": f"https://drive.google.com/file/d/{file_id}/view",
+        })
+        self.parents[file_id] = parent
+        self.edit(file_id, blob)
+        return file_id
+
+    def edit(self, file_id, blob):
+        self.blobs[file_id] = blob
+        parent = self.parents[file_id]
+        for item in self.children[parent]:
+            if item["id"] == file_id:
+                item.update(md5Checksum=hashlib.md5(blob).hexdigest(), size=str(len(blob)),
+                            modifiedTime=time.strftime("%Y-%m-%dT%H:%M:%S.000Z", time.gmtime()))
+        self.changelog.append((file_id, [parent], False))
+
+    def remove(self, file_id):
+        parent = self.parents.pop(file_id)
+        self.children[parent] = [i for i in self.children[parent] if i["id"] != file_id]
+        self.blobs.pop(file_id, None)
+        self.changelog.append((file_id, [], True))
+
+    def files_under(self, folder_id):
+        """Every non-folder item below folder_id (for building a corpus without crawling)"""
+        for item in self.children.get(folder_id, []):
+            if item["id"] in self.children:
+                yield from self.files_under(item["id"])
+            else:
+                yield item
+
+    # --- googleapiclient surface ---
+    def files(self):
+        return self
+
+    def list(self, q, pageSize=1000, pageToken=None, **kwargs):
+        folder_id = re.match(r"'([^']+)' in parents", q).group(1)
+
+        def page():
+            items = self.children.get(folder_id, [])
+            start = int(pageToken or 0)
+            end = start + min(pageSize, self.page_size)
+            response = {"files": [dict(i) for i in items[start:end]]}
+            if end < len(items):
+                response["nextPageToken"] = str(end)
+            return response
+        return _Call(self.faults, "drive list", page)
+
+    def get_media(self, fileId, **kwargs):
+        return _MediaRequest(self, fileId)
+
+    def changes(self):
+        return self._Changes(self)
+
+    def new_batch_http_request(self, **kwargs):
+        return _Batch(self.faults)
+
+    class _Changes:
+        def __init__(self, drive):
+            self._drive = drive
+
+        def getStartPageToken(self, **kwargs):
+            return _Call(self._drive.faults, "drive changes",
+                         lambda: {"startPageToken": str(len(self._drive.changelog))})
+
+        def list(self, pageToken, **kwargs):
+            def page():
+                changes = [{"fileId": file_id, "removed": removed, **({} if removed else {"file": {"parents": parents}})}
+                           for file_id, parents, removed in self._drive.changelog[int(pageToken):]]
+                return {"changes": changes, "newStartPageToken": str(len(self._drive.changelog))}
+            return _Call(self._drive.faults, "drive changes", page)
+
+# --- 5. PARSER (LlamaParse) ---
+class FakeParser:
+    """"PDFs" here are UTF-8 text with form feeds between pages; one Document per page"""
+
+    def __init__(self, faults=None, page_latency=0.0):
+        self.faults = faults or Faults()
+        self.page_latency = page_latency
+
+    def load_data(self, file, extra_info=None):
+        if isinstance(file, str):
+            with open(file, "rb") as f:
+                blob = f.read()
+        else:
+            blob = file.read()
+        pages = blob.decode("utf-8").split("\f")
+        self.faults.wait("parse")
+        time.sleep(self.page_latency * len(pages))
+        return [Document(text=page, metadata=dict(extra_info or {})) for page in pages]
+
+# --- 6. A SMALL SYNTHETIC CORPUS ---
+SUBJECTS = ["operating systems", "computer networks", "data structures", "database management",
+            "engineering mathematics", "digital electronics", "machine learning", "software engineering"]
+TOPICS = ["scheduling", "deadlocks", "paging", "routing", "sorting", "hashing", "normalization",
+          "transactions", "laplace transforms", "flip flops", "regression", "testing", "trees", "graphs"]
+NOTICE = ("NOTICE\nInternal assessment marks will be uploaded on the portal by Friday. "
+          "Students must carry their ID cards to the examination hall.")
+
+def make_page(rng, subject, module, sentences=12):
+    lines = [f"MODULE {module}"]
+    for _ in range(sentences):
+        topic = rng.choice(TOPICS)
+        lines.append(f"In {subject}, {topic} is covered in module {module} with worked examples "
+                     f"on {rng.choice(TOPICS)} and {rng.randint(2, 9)} practice problems.")
+    return "\n".join(lines)
+
+def make_document(rng, subject, pages=3, notice=False):
+    text = [make_page(rng, subject, m) for m in range(1, pages + 1)]
+    if notice:
+        text.append(NOTICE)  # the same page pasted into several files (exercises dedupe)
+    return "\f".join(text).encode("utf-8")
+
+def make_drive(years=("1", "2", "3", "4"), files_per_year=6, pages=3, seed=0, **drive_kwargs):
+    """(FakeDrive, {year: root folder id}): each year has one subfolder per subject"""
+    rng = random.Random(seed)
+    drive = FakeDrive(**drive_kwargs)
+    roots = {}
+    for year in years:
+        roots[year] = drive.folder(f"Year {year}")
+        for n in range(files_per_year):
+            subject = SUBJECTS[n % len(SUBJECTS)]
+            folder = next((i["id"] for i in drive.children[roots[year]] if i["name"] == subject), None)
+            folder = folder or drive.folder(subject, roots[year])
+            drive.add(folder, f"{subject} notes {n + 1}.pdf", make_document(rng, subject, pages, notice=n % 3 == 0))
+    return drive, roots
@@ -0,0 +1,266 @@
+import hashlib
+import json
+import os
+import time
+
+from intent_router import FileAnswer
+from sparse_index import tokenize
+
+# ==============================================================================
+# 💡 PRECOMPUTED FAQ ANSWERS
+# "when are the exams?" is asked hundreds of times a week per year, and every
+# time it costs an embed, a retrieval and a Gemini call for the same answer.
+# update_brain.py (with --faq) answers a short list of such questions per year
+# in every persona right after the index is refreshed, and publishes them next
+# to the brain version (Pinecone namespace "brain-faq", or faq.json for the
+# local backend). The API loads them at startup and again on every brain
+# update, and a matching fresh question is answered from memory in ~0 ms.
+# Each answer remembers the md5 of the files it was generated from, so a run
+# only regenerates answers whose sources changed or vanished, or whose persona
+# prompt changed; the rest cost nothing. When a year gains or loses files, its
+# questions are retrieved again (no Gemini call) and only the answers whose top
+# sources are now different get regenerated: a new circular about the exams
+# redoes "when are the exams?", not the syllabus answers.
+# ==============================================================================
+
+FAQ_NAMESPACE = "brain-faq"
+INDEX_ID = "faq-index"  # marker vector listing every published answer's ID
+RECHECK = "files added or removed"  # stale() reason: regenerate only if the top sources moved
+FETCH_BATCH = 100
+
+# Overridden by FAQ_QUESTIONS_PATH: {"*": [asked in every year], "4": [Year 4 only], ...}
+DEFAULT_QUESTIONS = [
+    "When are the exams?",
+    "What is the exam timetable?",
+    "What are the units in the syllabus?",
+    "When are the lab internals?",
+]
+
+def load_questions(path, years):
+    """{year: [questions]}: the "*" list plus each year's own"""
+    config = {"*": DEFAULT_QUESTIONS}
+    if path and os.path.exists(path):
+        with open(path) as f:
+            config = json.load(f)
+    return {year: list(dict.fromkeys(config.get("*", []) + config.get(year, []))) for year in years}
+
+def terms(text):
+    """Content words with plurals folded, so "exam date" matches "exam dates" """
+    return {t[:-1] if len(t) > 3 and t.endswith("s") else t for t in tokenize(text)}
+
+def entry_key(year, mode, question):
+    return f"{year}|{mode}|{' '.join(sorted(terms(question)))}"
+
+def fingerprint(manifest_entry):
+    # Google Docs exports have no md5, so fall back to modifiedTime (like the manifest does)
+    return manifest_entry.get("md5") or manifest_entry.get("modified")
+
+def year_files(manifest, year):
+    """Signature of the set of files indexed for a year: moves when one is added or removed"""
+    ids = sorted(manifest.files_in_year(year))
+    return hashlib.sha1("\n".join(ids).encode("utf-8")).hexdigest()[:16]
+
+def prompt_hash(prompt):
+    return hashlib.sha1(prompt.encode("utf-8")).hexdigest()[:16]
+
+# --- 1. THE STORE (update_brain.py side, kept in .cache between runs) ---
+class FaqStore:
+    def __init__(self, path):
+        self.path = path
+        self.entries = {}       # entry_key -> {year, mode, question, answer, links, sources, files, prompt, generated}
+        self.published = True   # False while the store has changes Pinecone hasn't seen
+        if path and os.path.exists(path):
+            with open(path) as f:
+                data = json.load(f)
+            self.entries = data.get("entries", {})
+            self.published = data.get("published", True)
+
+    def stale(self, year, mode, question, prompt, manifest, max_age=None):
+        """Why this answer needs (re)generating, or None if it's current.
+        max_age (seconds): also redo old answers, in case a new file now answers it better"""
+        entry = self.entries.get(entry_key(year, mode, question))
+        if entry is None:
+            return "new"
+        if max_age and time.time() - entry["generated"] > max_age:
+            return "expired"
+        if entry["prompt"] != prompt_hash(prompt):
+            return "prompt changed"
+        for file_id, seen in entry["sources"].items():
+            current = manifest.files.get(file_id)
+            if current is None:
+                return "source removed"
+            if fingerprint(current) != seen:
+                return "source changed"
+        if entry.get("files") != year_files(manifest, year):
+            return RECHECK
+        return None
+
+    def put(self, year, mode, question, answer, links, sources, files, prompt):
+        """files: year_files() when the answer was generated"""
+        self.entries[entry_key(year, mode, question)] = {
+            "year": year, "mode": mode, "question": question, "answer": answer, "links": links,
+            "sources": sources, "files": files, "prompt": prompt_hash(prompt), "generated": time.time(),
+        }
+        self.published = False
+
+    def confirm(self, year, mode, question, files):
+        """A rechecked answer whose sources didn't move: current for this file set"""
+        self.entries[entry_key(year, mode, question)]["files"] = files
+
+    def drop(self, keys):
+        dropped = [key for key in keys if self.entries.pop(key, None) is not None]
+        if dropped:
+            self.published = False
+        return len(dropped)
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"entries": self.entries, "published": self.published}, f)
+        os.replace(tmp_path, self.path)
+
+def refresh(store, questions, modes, manifest, retrieve, generate, prompt_for, max_age=None):
+    """Regenerate the missing and stale answers. retrieve(year, question) -> nodes (retrieved once,
+    shared by every persona); generate(year, mode, question, nodes) -> text; prompt_for(year, mode)
+    -> the QA prompt text. Returns counts for the run summary."""
+    report = {"current": 0, "rechecked": 0, "generated": 0, "failed": 0, "no_context": 0, "removed": 0}
+    wanted = set()
+    for year, year_questions in questions.items():
+        for question in year_questions:
+            todo = {}
+            for mode in modes:
+                wanted.add(entry_key(year, mode, question))
+                reason = store.stale(year, mode, question, prompt_for(year, mode), manifest, max_age)
+                if reason is None:
+                    report["current"] += 1
+                else:
+                    todo[mode] = reason
+            if not todo:
+                continue
+
+            # An answer we can't refresh is dropped rather than served out of date; one that
+            # was only due a recheck stays, and is rechecked on the next run
+            try:
+                nodes = retrieve(year, question)
+            except Exception as e:
+                print(f"   ⚠️ FAQ retrieval failed for Year {year} '{question}': {e}")
+                stale_keys = [entry_key(year, mode, question) for mode, reason in todo.items() if reason != RECHECK]
+                report["failed"] += len(stale_keys)
+                store.drop(stale_keys)
+                continue
+            if not nodes:
+                report["no_context"] += len(todo)
+                store.drop([entry_key(year, mode, question) for mode in todo])
+                continue
+
+            sources, links = {}, []
+            for hit in nodes:
+                entry = manifest.files.get(hit.node.ref_doc_id)
+                if entry is not None:
+                    sources[hit.node.ref_doc_id] = fingerprint(entry)
+                link = hit.node.metadata.get("file_link")
+                if link and link not in links:
+                    links.append(link)
+
+            files = year_files(manifest, year)
+            for mode, reason in list(todo.items()):
+                if reason != RECHECK:
+                    continue
+                if set(store.entries[entry_key(year, mode, question)]["sources"]) == set(sources):
+                    store.confirm(year, mode, question, files)
+                    report["rechecked"] += 1
+                    del todo[mode]
+                else:
+                    todo[mode] = "top sources changed"
+
+            for mode, reason in todo.items():
+                try:
+                    answer = generate(year, mode, question, nodes)
+                except Exception as e:
+                    print(f"   ⚠️ FAQ answer failed for Year {year} {mode} '{question}': {e}")
+                    report["failed"] += 1
+                    store.drop([entry_key(year, mode, question)])
+                    continue
+                store.put(year, mode, question, answer, links, sources, files, prompt_for(year, mode))
+                report["generated"] += 1
+                print(f"   💡 Year {year} | {mode:<13} | {question} ({reason})")
+
+    # Questions taken off the list (or years/personas that no longer exist)
+    report["removed"] = store.drop([key for key in store.entries if key not in wanted])
+    return report
+
+# --- 2. PUBLISHING (next to the brain version, see brain_version.py) ---
+def _vector_id(key):
+    return "faq-" + hashlib.sha1(key.encode("utf-8")).hexdigest()
+
+def publish(pinecone_index, entries):
+    """Replace the published answers with entries. Returns how many were published."""
+    entries = list(entries)
+    if hasattr(pinecone_index, "write_faq"):  # local backend keeps a faq.json
+        pinecone_index.write_faq(entries)
+        return len(entries)
+    dimension = pinecone_index.describe_index_stats().dimension
+    # Pinecone rejects all-zero dense vectors, so the records point along axis 0
+    values = [1.0] + [0.0] * (dimension - 1)
+    vectors = [{"id": _vector_id(entry_key(e["year"], e["mode"], e["question"])), "values": values,
+                "metadata": {"entry": json.dumps(e)}} for e in entries]
+    for i in range(0, len(vectors), FETCH_BATCH):
+        pinecone_index.upsert(vectors=vectors[i:i + FETCH_BATCH], namespace=FAQ_NAMESPACE)
+
+    # The new marker goes last: until then servers keep loading the old set
+    old_ids = set(_published_ids(pinecone_index)) - {v["id"] for v in vectors}
+    pinecone_index.upsert(vectors=[{"id": INDEX_ID, "values": values,
+                                    "metadata": {"ids": [v["id"] for v in vectors]}}],
+                          namespace=FAQ_NAMESPACE)
+    if old_ids:
+        pinecone_index.delete(ids=sorted(old_ids), namespace=FAQ_NAMESPACE)
+    return len(vectors)
+
+def _published_ids(pinecone_index):
+    marker = pinecone_index.fetch(ids=[INDEX_ID], namespace=FAQ_NAMESPACE).vectors.get(INDEX_ID)
+    return [] if marker is None else list((marker.metadata or {}).get("ids", []))
+
+def fetch(pinecone_index):
+    """Every published answer (what the API loads)"""
+    if hasattr(pinecone_index, "read_faq"):
+        return pinecone_index.read_faq()
+    ids = _published_ids(pinecone_index)
+    entries = []
+    for i in range(0, len(ids), FETCH_BATCH):
+        found = pinecone_index.fetch(ids=ids[i:i + FETCH_BATCH], namespace=FAQ_NAMESPACE).vectors
+        entries += [json.loads(v.metadata["entry"]) for v in found.values() if v.metadata]
+    return entries
+
+# --- 3. THE LOOKUP (API side) ---
+class FaqLookup:
+    def __init__(self, min_overlap=0.8):
+        """min_overlap: share of content words a question must have in common with a FAQ
+        (Jaccard), so "exam dates?" matches but "exam dates for the lab" doesn't"""
+        self.min_overlap = min_overlap
+        self._answers = {}  # (year, mode) -> [(terms, entry)]
+        self.stats = {"entries": 0, "hits": 0, "misses": 0, "loads": 0, "loaded_at": None}
+
+    def load(self, entries):
+        answers = {}
+        for entry in entries:
+            answers.setdefault((entry["year"], entry["mode"]), []).append((terms(entry["question"]), entry))
+        self._answers = answers  # swapped in one step: requests never see half a load
+        self.stats.update(entries=sum(len(a) for a in answers.values()), loads=self.stats["loads"] + 1,
+                          loaded_at=time.time())
+
+    def match(self, message, year, mode):
+        """A FileAnswer with the precomputed reply, or None"""
+        words = terms(message)
+        best, best_overlap = None, 0.0
+        for faq_terms, entry in self._answers.get((year, mode), ()):
+            if not words or not faq_terms:
+                continue
+            overlap = len(words & faq_terms) / len(words | faq_terms)
+            if overlap > best_overlap:
+                best, best_overlap = entry, overlap
+        if best is None or best_overlap < self.min_overlap:
+            self.stats["misses"] += 1
+            return None
+        self.stats["hits"] += 1
+        return FileAnswer(best["answer"], best["links"], f"faq: {best['question']}")
@@ -1,5 +1,4 @@
 import { useState, useRef, useEffect } from "react";
-import axios from "axios";
 import { motion, AnimatePresence } from "framer-motion";
 import { Send, Menu, Bot, LogOut, Sparkles, MessageSquare, Plus, Trash2, ArrowRight } from "lucide-react";
 import { onAuthStateChanged, signInWithEmailAndPassword, createUserWithEmailAndPassword, signOut } from "firebase/auth";
@@ -8,9 +7,35 @@ import { auth, db } from "./firebase";
 
 // --- CONFIG ---
 const API_URL = "https://bmsit-backend-9o1e.onrender.com/chat";
+const STREAM_URL = `${API_URL}/stream`;
 const MODES = ["Study Buddy", "The Professor", "The Bro", "ELI5"];
 const YEARS = ["1", "2", "3", "4"];
 
+// --- HELPER: Read Server-Sent Events from a POST response ---
+const readEventStream = async (response, onEvent) => {
+  const reader = response.body.getReader();
+  const decoder = new TextDecoder();
+  let buffer = "";
+
+  while (true) {
+    const { value, done } = await reader.read();
+    if (done) break;
+    buffer += decoder.decode(value, { stream: true });
+
+    const events = buffer.split("\n\n");
+    buffer = events.pop();
+    for (const raw of events) {
+      let event = "message";
+      let data = "";
+      for (const line of raw.split("\n")) {
+        if (line.startsWith("event: ")) event = line.slice(7);
+        else if (line.startsWith("data: ")) data += line.slice(6);
+      }
+      if (data) onEvent(event, JSON.parse(data));
+    }
+  }
+};
+
 // --- HELPER: Detect URLs and make them clickable ---
 const renderMessageWithLinks = (text) => {
   const urlRegex = /(https?:\/\/[^\s]+)/g;
@@ -47,6 +72,7 @@ function App() {
   // UI Inputs
   const [input, setInput] = useState("");
   const [loading, setLoading] = useState(false);
+  const [streamingText, setStreamingText] = useState("");
   const [mode, setMode] = useState("Study Buddy");
   const [sidebarOpen, setSidebarOpen] = useState(true);
   const messagesEndRef = useRef(null);
@@ -165,25 +191,39 @@ function App() {
         createdAt: serverTimestamp()
       });
 
-      // --- MEMORY FIX: ATTACH PREVIOUS CONTEXT ---
-      // We grab the last message (if it exists) and send it hiddenly to the bot
-      // so it knows what "it" or "that" refers to.
-      const lastMsg = messages.length > 0 ? messages[messages.length - 1] : null;
-      let finalPayload = userText;
-      
-      if (lastMsg && lastMsg.role === 'assistant') {
-         finalPayload = `Previous Answer Context: "${lastMsg.content}"\n\nUser Question: ${userText}`;
-      }
-
+      // --- MEMORY: the server keeps this chat's history, keyed by chat_id ---
       const token = await user.getIdToken();
-      const response = await axios.post(API_URL, {
-        message: finalPayload, // 👈 sending context + question
-        year: year, 
-        mode: mode,
-        token: token
+      const response = await fetch(STREAM_URL, {
+        method: "POST",
+        headers: { "Content-Type": "application/json" },
+        body: JSON.stringify({
+          message: userText,
+          chat_id: chatId, // 👈 server remembers earlier messages of this chat
+          year: year,
+          mode: mode,
+          token: token
+        })
       });
 
-      const aiResponse = response.data.response;
+      let aiResponse = "";
+      if (response.status === 429) {
+        // Server is at capacity: show its "try again in a few seconds" reply
+        aiResponse = (await response.json()).response;
+      } else {
+        if (!response.ok) throw new Error(`Chat failed with status ${response.status}`);
+
+        // --- STREAMING: show tokens as they arrive ---
+        await readEventStream(response, (event, data) => {
+          if (event === "token") {
+            aiResponse += data.text;
+            setStreamingText(aiResponse);
+          } else if (event === "error") {
+            aiResponse = data.response;
+          } else if (event === "done") {
+            console.debug("Chat timings:", data.timings);
+          }
+        });
+      }
 
       await addDoc(collection(db, "chats", chatId, "messages"), {
         role: "assistant",
@@ -195,6 +235,7 @@ function App() {
       console.error("Error:", error);
     } finally {
       setLoading(false);
+      setStreamingText("");
     }
   };
 
@@ -340,7 +381,19 @@ function App() {
               </div>
             </motion.div>
           ))}
-          {loading && (
+          {loading && streamingText && (
+            <div className="flex w-full justify-start">
+              <div className="max-w-[75%] rounded-2xl p-4 shadow-sm bg-transparent text-gray-100">
+                <div className="flex items-center gap-2 mb-2 text-blue-400 text-xs font-bold uppercase tracking-wide">
+                  <Bot size={14} /> BMSIT Assistant
+                </div>
+                <div className="leading-relaxed whitespace-pre-wrap">
+                  {renderMessageWithLinks(streamingText)}
+                </div>
+              </div>
+            </div>
+          )}
+          {loading && !streamingText && (
             <div className="flex items-center gap-2 text-gray-500 text-sm ml-4 animate-pulse">
               <Bot size={16} /> Thinking...
             </div>
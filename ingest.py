@@ -1,10 +1,12 @@
 import os
 from dotenv import load_dotenv
-from llama_index.core import VectorStoreIndex, StorageContext
 from llama_index.readers.google import GoogleDriveReader
 from llama_index.vector_stores.pinecone import PineconeVectorStore
 from llama_index.core import Settings
 from pinecone import Pinecone
+from llama_index.core.schema import MetadataMode
+from chunking import Chunker, Deduper, build_nodes
+from journal import IngestJournal, DONE
 
 # --- IMPORTS ---
 from llama_index.llms.google_genai import GoogleGenAI
@@ -38,6 +40,12 @@ folder_map = {
     "4": "17Ga5lrRQ-d8aLEOhZ24qZ7vWL8bXUpY1"
 }
 
+# 4. Files are loaded one at a time and uploaded in batches of INGEST_BATCH chunks,
+# so memory stays flat however big the folders get. The journal records each
+# file's progress, so a run that dies halfway resumes instead of starting over.
+INGEST_BATCH = int(os.getenv("INGEST_BATCH", "100"))
+JOURNAL_PATH = os.getenv("JOURNAL_PATH", ".cache/ingest_journal.sqlite")
+
 def load_and_index():
     print("🚀 Starting Data Ingestion...")
 
@@ -63,7 +71,8 @@ def load_and_index():
         print(f"❌ Error connecting to Pinecone: {e}")
         return
     
-    all_documents = []
+    chunker = Chunker()
+    deduper = Deduper()
 
     # Connect to Drive (THE FIX IS HERE)
     try:
@@ -73,31 +82,88 @@ def load_and_index():
         print(f"❌ Error reading credentials.json: {e}")
         return
 
-    # Loop Folders
+    journal = IngestJournal(JOURNAL_PATH, "ingest")
+    journal.begin()
+    # Files an interrupted run already uploaded are in Pinecone under the same IDs
+    already_done = journal.committed() if journal.interrupted else set()
+
+    batch = []        # chunks waiting to be uploaded
+    batch_files = {}  # file id -> chunks it has in the batch
+
+    def flush():
+        if not batch:
+            return
+        print(f"🧠 Uploading {len(batch)} chunks from {len(batch_files)} files...")
+        try:
+            texts = [node.get_content(metadata_mode=MetadataMode.EMBED) for node in batch]
+            for node, vector in zip(batch, Settings.embed_model.get_text_embedding_batch(texts)):
+                node.embedding = vector
+            journal.mark(list(batch_files), "embedded")
+            vector_store.add(batch)
+            for file_id, chunks in batch_files.items():
+                journal.mark(file_id, DONE, chunks=chunks)
+        except Exception as e:
+            print(f"❌ Upload Error: {e}")
+            journal.fail(list(batch_files), "upload", e)
+        batch.clear()
+        batch_files.clear()
+
+    # Loop Folders, one file at a time
+    found = 0
     for year, folder_id in folder_map.items():
         print(f"📂 Scanning Year {year} folder...")
         try:
-            docs = loader.load_data(folder_id=folder_id)
-            for doc in docs:
-                doc.metadata = {"year": year}
-                all_documents.extend([doc])
-            print(f"   ✅ Found {len(docs)} pages.")
+            file_ids = loader.list_resources(folder_id=folder_id)
         except Exception as e:
             print(f"   ❌ ERROR for Year {year}: {e}")
             print("      (Make sure you shared the folder with the Service Account email!)")
+            continue
+        found += len(file_ids)
+        journal.listed([(file_id, None, year) for file_id in file_ids])
+        journal.mark([f for f in file_ids if f in already_done], DONE)
 
-    if not all_documents:
-        print("❌ No documents found. Stopping.")
-        return
+        pages = 0
+        for file_id in file_ids:
+            if file_id in already_done:
+                continue
+            try:
+                docs = loader.load_resource(file_id)
+            except Exception as e:
+                print(f"   ❌ Could not load {file_id}: {e}")
+                journal.fail(file_id, "download", e)
+                continue
+            nodes = []
+            name = None
+            for doc in docs:
+                # Same IDs + metadata as update_brain.py, so re-runs upsert in place
+                page = doc.metadata.get("page_label") or 1
+                name = doc.metadata.get("file name", "")
+                metadata = {
+                    "file_link": f"https://drive.google.com/file/d/{file_id}/view",
+                    "file_name": name,
+                    "path": doc.metadata.get("file path", ""),
+                }
+                file_nodes, _, _ = build_nodes(chunker, deduper, file_id, year, [(page, doc.text)], metadata)
+                nodes.extend(file_nodes)
+            pages += len(docs)
+            journal.mark(file_id, "parsed", chunks=len(nodes), name=name)
+            if not nodes:
+                journal.mark(file_id, DONE, chunks=0)
+                continue
+            batch.extend(nodes)
+            batch_files[file_id] = len(nodes)
+            if len(batch) >= INGEST_BATCH:
+                flush()
+        print(f"   ✅ Found {len(file_ids)} files, {pages} pages.")
 
-    # Upload
-    print("🧠 Uploading to Pinecone...")
-    try:
-        storage_context = StorageContext.from_defaults(vector_store=vector_store)
-        VectorStoreIndex.from_documents(all_documents, storage_context=storage_context)
-        print("🎉 SUCCESS! The Data is live in the database.")
-    except Exception as e:
-        print(f"❌ Upload Error: {e}")
+    flush()
+    journal.report()
+    journal.finish()
+    journal.close()
+    if not found:
+        print("❌ No documents found.")
+        return
+    print("🎉 SUCCESS! The Data is live in the database.")
 
 if __name__ == "__main__":
     load_and_index()
\ No newline at end of file
@@ -0,0 +1,171 @@
+import queue
+import random
+import threading
+import time
+
+import metrics
+
+# ==============================================================================
+# 🏭 STAGED INGESTION PIPELINE
+# Each stage is a small pool of worker threads reading from a bounded queue, so
+# Drive downloads, LlamaParse jobs, embedding calls and Pinecone upserts all
+# overlap instead of waiting on each other. Bounded queues stop a fast stage
+# from piling up work (and memory) in front of a slow one.
+# ==============================================================================
+
+STOP = object()
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+
+def status_of(error):
+    """HTTP status from googleapiclient / pinecone / httpx style errors, if any"""
+    for source in (error, getattr(error, "resp", None), getattr(error, "response", None)):
+        for attr in ("status", "status_code"):
+            value = getattr(source, attr, None)
+            if isinstance(value, int):
+                return value
+            if isinstance(value, str) and value.isdigit():
+                return int(value)
+    return None
+
+def is_retryable(error):
+    if isinstance(error, (TimeoutError, ConnectionError)):
+        return True
+    return status_of(error) in RETRYABLE_STATUS
+
+def with_retries(fn, *args, retries=5, base_delay=1.0, max_delay=30.0, on_retry=None):
+    """Call fn, backing off exponentially (with jitter) on 429 / 5xx / network errors"""
+    for attempt in range(retries + 1):
+        try:
+            return fn(*args)
+        except Exception as e:
+            if attempt == retries or not is_retryable(e):
+                raise
+            delay = min(max_delay, base_delay * 2 ** attempt) * (0.5 + random.random() / 2)
+            if on_retry:
+                on_retry(e, delay)
+            time.sleep(delay)
+
+class Stage:
+    def __init__(self, name, fn, workers=1, queue_size=16, batch_size=None):
+        """fn(item) -> iterable of outputs for the next stage. With batch_size, fn gets a list."""
+        self.name = name
+        self.fn = fn
+        self.workers = workers
+        self.batch_size = batch_size
+        self.inbox = queue.Queue(maxsize=queue_size)
+        self.downstream = None
+
+        self._lock = threading.Lock()
+        self._threads = []
+        self.processed = 0
+        self.failed = 0
+        self.retries = 0
+        self.busy_seconds = 0.0
+        self.started_at = None
+        self.finished_at = None
+
+    def retry(self, fn, *args):
+        def count(error, delay):
+            with self._lock:
+                self.retries += 1
+            print(f"   🔁 {self.name}: {error} (retrying in {delay:.1f}s)")
+        return with_retries(fn, *args, on_retry=count)
+
+    @property
+    def metric_name(self):
+        return f"ingest_{self.name}"
+
+    def _process(self, work, size):
+        started = time.perf_counter()
+        try:
+            for output in self.fn(work) or ():
+                if self.downstream is not None:
+                    self.downstream.inbox.put(output)
+            ok = True
+        except Exception as e:
+            print(f"   ❌ {self.name} failed: {e}")
+            metrics.STAGE_ERRORS.inc(stage=self.metric_name, error=type(e).__name__)
+            ok = False
+        elapsed = time.perf_counter() - started
+        # Time to hand work downstream includes waiting on a full queue (backpressure)
+        metrics.observe(self.metric_name, elapsed)
+        with self._lock:
+            self.busy_seconds += elapsed
+            if ok:
+                self.processed += size
+            else:
+                self.failed += size
+
+    def _run(self):
+        batch = []
+        while True:
+            item = self.inbox.get()
+            if item is STOP:
+                break
+            if not self.batch_size:
+                self._process(item, 1)
+                continue
+            batch.append(item)
+            if len(batch) >= self.batch_size:
+                self._process(batch, len(batch))
+                batch = []
+        if batch:
+            self._process(batch, len(batch))
+
+    def start(self):
+        self.started_at = time.perf_counter()
+        for n in range(self.workers):
+            thread = threading.Thread(target=self._run, name=f"{self.name}-{n}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def close(self):
+        for _ in self._threads:
+            self.inbox.put(STOP)
+        for thread in self._threads:
+            thread.join()
+        self.finished_at = time.perf_counter()
+
+class Pipeline:
+    def __init__(self, stages):
+        self.stages = stages
+        for upstream, downstream in zip(stages, stages[1:]):
+            upstream.downstream = downstream
+
+    def __enter__(self):
+        for stage in self.stages:
+            stage.start()
+        return self
+
+    def put(self, item):
+        self.stages[0].inbox.put(item)
+
+    def __exit__(self, *exc):
+        # Drain front to back: a stage only stops once everything upstream is done
+        for stage in self.stages:
+            stage.close()
+        return False
+
+    def stats(self):
+        """One dict per stage: counts, items/s over its wall time, busy %, latency quantiles"""
+        rows = []
+        for stage in self.stages:
+            wall = max((stage.finished_at or time.perf_counter()) - (stage.started_at or 0), 1e-9)
+            q = metrics.STAGE_SECONDS.quantiles(stage=stage.metric_name)
+            rows.append({
+                "stage": stage.name, "workers": stage.workers, "done": stage.processed,
+                "failed": stage.failed, "retries": stage.retries,
+                "items_per_s": stage.processed / wall,
+                "busy_pct": 100 * stage.busy_seconds / (wall * stage.workers),
+                "p50_s": q.get(0.5, 0), "p95_s": q.get(0.95, 0), "p99_s": q.get(0.99, 0),
+            })
+        return rows
+
+    def report(self):
+        print("\n📊 STAGE THROUGHPUT")
+        print(f"   {'stage':<10}{'workers':>8}{'done':>8}{'failed':>8}{'retries':>9}{'items/s':>10}{'busy %':>8}"
+              f"{'p50 s':>8}{'p95 s':>8}{'p99 s':>8}")
+        for row in self.stats():
+            print(f"   {row['stage']:<10}{row['workers']:>8}{row['done']:>8}{row['failed']:>8}"
+                  f"{row['retries']:>9}{row['items_per_s']:>10.2f}{row['busy_pct']:>7.0f}%"
+                  f"{row['p50_s']:>8.2f}{row['p95_s']:>8.2f}{row['p99_s']:>8.2f}")
@@ -0,0 +1,240 @@
+import asyncio
+import json
+import os
+import queue
+import re
+import threading
+import time
+
+import numpy as np
+
+from sparse_index import tokenize
+
+# ==============================================================================
+# 🚦 INTENT ROUTER
+# "send the timetable" doesn't need retrieval or Gemini: the answer is always the
+# year's master folder (plus the exact file when we can spot it). A keyword
+# classifier catches those requests before the pipeline runs and answers them
+# from DATABASE + the file_link metadata in the local BM25 index, so they cost
+# zero external calls. Everything else goes through the normal RAG path.
+# Words like link, file, drive and materials are also CS subjects ("data link
+# layer", "file handling", "drive scheduling"), so cues that ask about the
+# contents (explain, doubt, help) win, and a file answer needs a request verb
+# (send, share, where is) or a message that is nothing but a document name.
+# For tuning, decisions can be logged to ROUTER_LOG_PATH (JSON lines). It's off
+# by default since it stores what students typed; a background thread does the
+# writing, and the file rolls over to .1 past ROUTER_LOG_MB.
+# ==============================================================================
+
+FILE_WORDS = re.compile(
+    r"\b(time ?tables?|syllabus|syllabi|notes|pdfs?|question ?papers?|qps?|pyqs?|model ?papers?|"
+    r"lab ?manuals?|manuals?|slides|ppts?|materials?|text ?books?|scheme|files?|docs?|documents?|"
+    r"links?|drive|folder)\b"
+)
+# Nouns that name a document; the rest of FILE_WORDS (link, file, drive, ...) are
+# also everyday CS vocabulary
+DOC_WORDS = re.compile(
+    r"\b(time ?tables?|syllabus|syllabi|notes|pdfs?|question ?papers?|qps?|pyqs?|model ?papers?|"
+    r"lab ?manuals?|manuals?|slides|ppts?|text ?books?|scheme)\b"
+)
+# Asking *for* something: enough on its own next to a file word
+REQUEST_WORDS = re.compile(
+    r"\b(send|share|give|download|drop|upload|forward|where (is|are|can|do|to)|links? (to|for|of))\b"
+)
+# Softer asks: only next to a document noun ("need dbms notes", not "need help with file handling")
+ASK_WORDS = re.compile(r"\b(need|want|get|have|got|pls|please|any)\b")
+# Anything that wants the *contents* explained is a knowledge question, whatever nouns it uses
+EXPLAIN_WORDS = re.compile(
+    r"\b(explain|teach|understand|understanding|learn|doubts?|help|meaning|define|definition|describe|"
+    r"difference|between|summari[sz]e|summary|solve|compare|derive|pointwise)\b"
+)
+# Could go either way: "what's in the syllabus" vs "which pdf has unit 2"
+QUESTION_WORDS = re.compile(
+    r"\b(what|how|why|when|which|who|list|tell me about|topics?|chapters?|marks?|weightage)\b"
+)
+# Words that only describe the request, not the subject being asked for
+REQUEST_TERMS = set(tokenize(" ".join([
+    "time table timetable timetables syllabus syllabi notes pdf pdfs question paper papers qp qps pyq pyqs",
+    "model lab manual manuals slides ppt ppts material materials text book books textbook scheme file files",
+    "doc docs document documents links drive folder send share need want get download drop have got any",
+    "year sem semester bro fam hey hi hello yo bhai plz all the of for",
+])))
+
+EXAMPLES = {
+    "file": [
+        "send me the timetable", "give me the syllabus pdf", "notes for unit 3",
+        "where can I download last year's question papers", "link to the lab manual",
+    ],
+    "question": [
+        "when are the exams", "explain unit 1 of the syllabus", "what topics are in module 2",
+        "summarise the notes on normalization", "how many marks is the lab internal",
+    ],
+}
+
+class FileAnswer:
+    """A routed reply: plain text plus the links it points at (the /chat/stream 'sources')"""
+
+    def __init__(self, text, links, reason):
+        self.text = text
+        self.links = links
+        self.reason = reason
+
+    def __str__(self):
+        return self.text
+
+class IntentRouter:
+    def __init__(self, database, templates, sparse_index=None, embed_model=None,
+                 log_path=None, log_max_mb=10, max_files=3, margin=0.05):
+        """templates[mode] uses {year}, {folder_link} and {files}. embed_model (optional,
+        ideally a CachedEmbedding) breaks ties when the keyword rules can't decide.
+        log_path: decision log (None: no log)"""
+        self.database = database
+        self.templates = templates
+        self.sparse_index = sparse_index
+        self.embed_model = embed_model
+        self.log_path = log_path
+        self.log_max_bytes = int(log_max_mb * 1024 * 1024)
+        self.max_files = max_files
+        self.margin = margin
+
+        self._prototypes = None
+        self._lock = threading.Lock()
+        self.stats = {"routed": 0, "passed": 0, "ambiguous": 0, "embedding_checks": 0, "log_dropped": 0}
+
+        self._log_queue = None
+        if log_path:
+            self._log_queue = queue.Queue(maxsize=10000)
+            threading.Thread(target=self._write_log, name="router-log", daemon=True).start()
+
+    # --- 1. CLASSIFY ---
+    def classify(self, message):
+        """("file" | "question" | "ambiguous", reason)"""
+        text = message.lower()
+        file_word = FILE_WORDS.search(text)
+        if not file_word:
+            return "question", "no file keyword"
+        explain = EXPLAIN_WORDS.search(text)
+        if explain:
+            return "question", f"'{explain.group(0)}' asks about the contents"
+        request = REQUEST_WORDS.search(text)
+        if request:
+            return "file", f"'{request.group(0)}' + '{file_word.group(0)}'"
+        if QUESTION_WORDS.search(text):
+            return "ambiguous", f"'{file_word.group(0)}' + question word"
+        doc_word = DOC_WORDS.search(text)
+        if doc_word and (ASK_WORDS.search(text) or len(text.split()) <= 4):
+            return "file", f"asked for '{doc_word.group(0)}'"
+        if not [t for t in tokenize(text) if t not in REQUEST_TERMS]:
+            return "file", "nothing but request words"  # "drive link", "year 2 folder"
+        return "question", f"'{file_word.group(0)}' without a request verb"
+
+    async def _embedding_vote(self, message):
+        """Nearest labelled example by cosine similarity; None if too close to call"""
+        if self._prototypes is None:
+            labels, texts = zip(*[(label, t) for label, examples in EXAMPLES.items() for t in examples])
+            vectors = await asyncio.gather(*[self.embed_model.aget_query_embedding(t) for t in texts])
+            self._prototypes = (list(labels), self._normalize(vectors))
+        labels, prototypes = self._prototypes
+        query = self._normalize([await self.embed_model.aget_query_embedding(message)])[0]
+        scores = prototypes @ query
+        best = {label: max(s for l, s in zip(labels, scores) if l == label) for label in EXAMPLES}
+        if abs(best["file"] - best["question"]) < self.margin:
+            return None
+        return "file" if best["file"] > best["question"] else "question"
+
+    @staticmethod
+    def _normalize(vectors):
+        matrix = np.asarray(vectors, dtype=np.float32)
+        norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+        norms[norms == 0] = 1
+        return matrix / norms
+
+    # --- 2. ANSWER ---
+    def find_files(self, message, year):
+        """Drive links of files whose text contains every subject word (e.g. '18CS51', 'dbms')"""
+        subject = [t for t in tokenize(message) if t not in REQUEST_TERMS]
+        partition = self.sparse_index.partition(year) if self.sparse_index is not None else None
+        if not subject or partition is None:
+            return []
+        links = []
+        for record, _ in partition.search(" ".join(subject), self.max_files * 10, match_all=True):
+            link = record["node"].get("file_link")
+            if link and link not in links:
+                links.append(link)
+            if len(links) == self.max_files:
+                break
+        return links
+
+    def file_answer(self, message, year, mode, reason):
+        folder_link = self.database[year]
+        links = self.find_files(message, year)
+        files = "".join(f"\n📄 {link}" for link in links)
+        template = self.templates.get(mode) or next(iter(self.templates.values()))
+        text = template.format(year=year, folder_link=folder_link, files=files)
+        return FileAnswer(text, links + [folder_link], reason)
+
+    # --- 3. ROUTE ---
+    async def route(self, message, year, mode):
+        """FileAnswer for file requests, None when the question should go to the LLM"""
+        started = time.perf_counter()
+        intent, reason = self.classify(message)
+        if intent == "ambiguous":
+            with self._lock:
+                self.stats["ambiguous"] += 1
+            intent = "question"
+            if self.embed_model is not None:
+                with self._lock:
+                    self.stats["embedding_checks"] += 1
+                try:
+                    vote = await self._embedding_vote(message)
+                except Exception as e:
+                    print(f"⚠️ Router embedding check failed: {e}")
+                    vote = None
+                if vote is not None:
+                    intent, reason = vote, f"{reason}; embeddings say {vote}"
+
+        answer = self.file_answer(message, year, mode, reason) if intent == "file" else None
+        with self._lock:
+            self.stats["routed" if answer else "passed"] += 1
+        self._log({
+            "ts": time.time(), "year": year, "mode": mode, "message": message,
+            "route": intent, "reason": reason,
+            "files": len(answer.links) - 1 if answer else 0,
+            "ms": round((time.perf_counter() - started) * 1000, 2),
+        })
+        return answer
+
+    # --- 4. DECISION LOG (written off the request path) ---
+    def _log(self, decision):
+        if self._log_queue is None:
+            return
+        try:
+            self._log_queue.put_nowait(decision)
+        except queue.Full:  # the disk can't keep up: drop lines rather than slow requests
+            with self._lock:
+                self.stats["log_dropped"] += 1
+
+    def _write_log(self):
+        while True:
+            batch = [self._log_queue.get()]
+            while True:
+                try:
+                    batch.append(self._log_queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                os.makedirs(os.path.dirname(self.log_path) or ".", exist_ok=True)
+                if os.path.exists(self.log_path) and os.path.getsize(self.log_path) > self.log_max_bytes:
+                    os.replace(self.log_path, self.log_path + ".1")
+                with open(self.log_path, "a") as f:
+                    f.writelines(json.dumps(decision) + "\n" for decision in batch)
+            except OSError as e:
+                print(f"⚠️ Could not log router decisions: {e}")
+            finally:
+                for _ in batch:
+                    self._log_queue.task_done()
+
+    def flush(self):
+        """Wait until every queued decision is written (tests, shutdown)"""
+        if self._log_queue is not None:
+            self._log_queue.join()
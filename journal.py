@@ -0,0 +1,129 @@
+import os
+import sqlite3
+import threading
+import time
+
+# ==============================================================================
+# 🧾 INGESTION JOURNAL (checkpoint + resume)
+# A run can die halfway: a Pinecone 5xx on Year 3, a CI timeout, a closed laptop.
+# Every file a run works on gets a row that moves listed -> downloaded -> parsed
+# -> embedded -> upserted, or "failed" with the error. "upserted" is only written
+# once the file is committed (manifest saved), so after a crash the journal says
+# exactly which files still need work and the next run resumes there instead of
+# starting from zero. The rows double as the per-file summary a run ends with.
+# ==============================================================================
+
+STAGES = ("listed", "downloaded", "parsed", "embedded", "upserted")
+DONE = "upserted"
+FAILED = "failed"
+KEEP_RUNS = 20  # per job; older runs are pruned
+
+class IngestJournal:
+    def __init__(self, path, job):
+        self.job = job
+        self.run = None
+        self.interrupted = False  # the previous run of this job never finished
+        self.previous = {}        # file_id -> status at the end of the previous run
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("CREATE TABLE IF NOT EXISTS runs "
+                         "(id INTEGER PRIMARY KEY AUTOINCREMENT, job TEXT, started REAL, finished REAL, full INTEGER)")
+        self._db.execute("CREATE TABLE IF NOT EXISTS files "
+                         "(run INTEGER, file_id TEXT, name TEXT, year TEXT, status TEXT, chunks INTEGER, "
+                         "error TEXT, updated REAL, PRIMARY KEY (run, file_id))")
+        self._db.commit()
+
+    def begin(self, full=False):
+        """Open a new run. .previous holds the file statuses of the last run, .interrupted
+        whether it died before finishing."""
+        with self._lock:
+            last = self._db.execute("SELECT id, finished FROM runs WHERE job = ? ORDER BY id DESC LIMIT 1",
+                                    (self.job,)).fetchone()
+            if last is not None:
+                self.interrupted = last[1] is None
+                self.previous = dict(self._db.execute("SELECT file_id, status FROM files WHERE run = ?",
+                                                      (last[0],)).fetchall())
+            self.run = self._db.execute("INSERT INTO runs (job, started, full) VALUES (?, ?, ?)",
+                                        (self.job, time.time(), int(full))).lastrowid
+            old = [(r[0],) for r in self._db.execute("SELECT id FROM runs WHERE job = ? ORDER BY id DESC "
+                                                     "LIMIT -1 OFFSET ?", (self.job, KEEP_RUNS))]
+            self._db.executemany("DELETE FROM files WHERE run = ?", old)
+            self._db.executemany("DELETE FROM runs WHERE id = ?", old)
+            self._db.commit()
+        unfinished = len(self.unfinished())
+        if self.interrupted:
+            print(f"⏯️  Last run was interrupted: {len(self.previous) - unfinished} files committed, "
+                  f"{unfinished} to resume")
+        elif unfinished:
+            print(f"⏯️  {unfinished} files failed last run, retrying them")
+
+    def unfinished(self):
+        """Files the last run listed but never committed (failed, or cut off)"""
+        return {file_id for file_id, status in self.previous.items() if status != DONE}
+
+    def committed(self):
+        """Files the last run committed"""
+        return {file_id for file_id, status in self.previous.items() if status == DONE}
+
+    def listed(self, files):
+        """files: [(file_id, name, year)]"""
+        now = time.time()
+        with self._lock:
+            self._db.executemany("INSERT OR REPLACE INTO files (run, file_id, name, year, status, updated) "
+                                 "VALUES (?, ?, ?, ?, 'listed', ?)",
+                                 [(self.run, file_id, name, year, now) for file_id, name, year in files])
+            self._db.commit()
+
+    def mark(self, file_ids, status, chunks=None, error=None, name=None):
+        """name: for files that were listed by ID only"""
+        if isinstance(file_ids, str):
+            file_ids = [file_ids]
+        now = time.time()
+        with self._lock:
+            self._db.executemany("UPDATE files SET status = ?, chunks = COALESCE(?, chunks), error = ?, "
+                                 "name = COALESCE(?, name), updated = ? WHERE run = ? AND file_id = ?",
+                                 [(status, chunks, error, name, now, self.run, file_id) for file_id in file_ids])
+            self._db.commit()
+
+    def fail(self, file_ids, stage, error):
+        self.mark(file_ids, FAILED, error=f"{stage}: {type(error).__name__}: {error}")
+
+    def finish(self):
+        with self._lock:
+            self._db.execute("UPDATE runs SET finished = ? WHERE id = ?", (time.time(), self.run))
+            self._db.commit()
+
+    def files(self):
+        with self._lock:
+            rows = self._db.execute("SELECT file_id, name, year, status, chunks, error FROM files "
+                                    "WHERE run = ? ORDER BY year, name", (self.run,)).fetchall()
+        return [dict(zip(("file_id", "name", "year", "status", "chunks", "error"), row)) for row in rows]
+
+    def summary(self):
+        counts = {}
+        for row in self.files():
+            counts[row["status"]] = counts.get(row["status"], 0) + 1
+        return counts
+
+    def report(self, show_all=30):
+        """Per-file status table: every file for small runs, else only the ones that didn't finish"""
+        rows = self.files()
+        if not rows:
+            return
+        shown = rows if len(rows) <= show_all else [r for r in rows if r["status"] != DONE]
+        print(f"\n🧾 FILE STATUS (run {self.run}): " + ", ".join(f"{n} {s}" for s, n in sorted(self.summary().items())))
+        for row in shown:
+            icon = "✅" if row["status"] == DONE else "❌" if row["status"] == FAILED else "⏸️"
+            chunks = f"{row['chunks']} chunks" if row["chunks"] is not None else ""
+            print(f"   {icon} Year {row['year']} | {row['name'] or row['file_id']:<50.50} {row['status']:<10} {chunks}")
+            if row["error"]:
+                print(f"        {row['error'][:200]}")
+        if len(shown) < len(rows):
+            print(f"   ... and {len(rows) - len(shown)} files upserted")
+
+    def close(self):
+        with self._lock:
+            self._db.close()
@@ -0,0 +1,354 @@
+import json
+import os
+import threading
+import time
+from types import SimpleNamespace
+
+import numpy as np
+from llama_index.core.bridge.pydantic import PrivateAttr
+from llama_index.core.vector_stores.types import (
+    BasePydanticVectorStore,
+    FilterCondition,
+    FilterOperator,
+    VectorStoreQueryResult,
+)
+from llama_index.core.vector_stores.utils import metadata_dict_to_node, node_to_metadata_dict
+
+from segments import SegmentLog, merge
+
+# ==============================================================================
+# 💽 LOCAL VECTOR STORE (VECTOR_BACKEND=local)
+# The whole corpus fits on one box, so skip the Pinecone round trip: one
+# float32 matrix per year, memory-mapped from disk, searched with a single
+# matrix multiply (or an IVF probe once a year gets big). Speaks the same
+# MetadataFilters / ExactMatchFilter language as api.py, and update_brain.py
+# can write to it like any other LlamaIndex vector store.
+#
+# Layout:  LOCAL_INDEX_DIR/year=<y>/vectors.npy   unit-length rows
+#                                  /nodes.json    node dicts, same order
+#                                  /ivf.npz       centroids + row offsets (big years only)
+#          LOCAL_INDEX_DIR/version.txt            bumped on every push
+#          LOCAL_INDEX_DIR/faq.json               precomputed FAQ answers (faq.py)
+#          LOCAL_INDEX_DIR/segments/              checkpoint deltas until compact() (segments.py)
+# ==============================================================================
+
+IVF_MIN_ROWS = int(os.getenv("LOCAL_IVF_MIN_ROWS", "20000"))
+IVF_NPROBE = int(os.getenv("LOCAL_IVF_NPROBE", "8"))
+NO_YEAR = "_none"
+
+def _normalize(matrix):
+    matrix = np.asarray(matrix, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    norms[norms == 0] = 1
+    return matrix / norms
+
+def _matches(metadata, filters):
+    """Evaluate LlamaIndex MetadataFilters against one node's metadata"""
+    if filters is None or not filters.filters:
+        return True
+    results = []
+    for f in filters.filters:
+        if hasattr(f, "filters"):  # nested MetadataFilters
+            results.append(_matches(metadata, f))
+            continue
+        value = metadata.get(f.key)
+        op = getattr(f, "operator", FilterOperator.EQ)
+        if op == FilterOperator.EQ:
+            results.append(value == f.value)
+        elif op == FilterOperator.NE:
+            results.append(value != f.value)
+        elif op == FilterOperator.IN:
+            results.append(value in f.value)
+        elif op == FilterOperator.NIN:
+            results.append(value not in f.value)
+        elif op == FilterOperator.GT:
+            results.append(value is not None and value > f.value)
+        elif op == FilterOperator.GTE:
+            results.append(value is not None and value >= f.value)
+        elif op == FilterOperator.LT:
+            results.append(value is not None and value < f.value)
+        elif op == FilterOperator.LTE:
+            results.append(value is not None and value <= f.value)
+        else:
+            raise ValueError(f"Local store doesn't support filter operator {op}")
+    if filters.condition == FilterCondition.OR:
+        return any(results)
+    return all(results)
+
+def _build_ivf(vectors, iterations=10, seed=0):
+    """Tiny k-means: returns (row order grouped by cluster, centroids, offsets)"""
+    rng = np.random.default_rng(seed)
+    nlist = max(1, int(np.sqrt(len(vectors))))
+    sample = vectors[rng.choice(len(vectors), min(len(vectors), nlist * 64), replace=False)]
+    centroids = sample[rng.choice(len(sample), nlist, replace=False)].copy()
+    for _ in range(iterations):
+        assign = np.argmax(sample @ centroids.T, axis=1)
+        for c in range(nlist):
+            members = sample[assign == c]
+            if len(members):
+                centroids[c] = members.mean(axis=0)
+        centroids = _normalize(centroids)
+
+    assign = np.concatenate([np.argmax(vectors[i:i + 8192] @ centroids.T, axis=1)
+                             for i in range(0, len(vectors), 8192)])
+    order = np.argsort(assign, kind="stable")
+    offsets = np.searchsorted(assign[order], np.arange(nlist + 1))
+    return order, centroids, offsets
+
+class Partition:
+    """All vectors for one year"""
+
+    def __init__(self, vectors, nodes, centroids=None, offsets=None):
+        self.vectors = vectors
+        self.nodes = nodes
+        self.centroids = centroids
+        self.offsets = offsets
+
+    @classmethod
+    def load(cls, path):
+        vectors = np.load(os.path.join(path, "vectors.npy"), mmap_mode="r")
+        with open(os.path.join(path, "nodes.json")) as f:
+            nodes = json.load(f)
+        centroids = offsets = None
+        ivf_path = os.path.join(path, "ivf.npz")
+        if os.path.exists(ivf_path):
+            ivf = np.load(ivf_path)
+            centroids, offsets = ivf["centroids"], ivf["offsets"]
+        return cls(vectors, nodes, centroids, offsets)
+
+    def search(self, queries, k, nprobe=IVF_NPROBE):
+        """queries: (q, dim) unit vectors -> list of (row ids, scores) per query, best first"""
+        results = []
+        for query in queries:
+            if not len(self.nodes):
+                results.append((np.arange(0), np.zeros(0, np.float32)))
+                continue
+            if self.centroids is not None:
+                probe = np.argsort(self.centroids @ query)[-nprobe:]
+                rows = np.concatenate([np.arange(self.offsets[c], self.offsets[c + 1]) for c in probe])
+                scores = np.concatenate([self.vectors[self.offsets[c]:self.offsets[c + 1]] @ query
+                                         for c in probe])
+            else:
+                rows = None
+                scores = self.vectors @ query
+
+            top = np.argpartition(-scores, k - 1)[:k] if len(scores) > k else np.arange(len(scores))
+            top = top[np.argsort(-scores[top])]
+            results.append((rows[top] if rows is not None else top, scores[top]))
+        return results
+
+def _rows(partition):
+    """[(node id, (partition, row))]: rows by reference, vectors stay memory-mapped"""
+    return [(d["id"], (partition, i)) for i, d in enumerate(partition.nodes)]
+
+def _write_year(folder, vectors, node_dicts):
+    os.makedirs(folder, exist_ok=True)
+    ivf_path = os.path.join(folder, "ivf.npz")
+    if len(vectors) >= IVF_MIN_ROWS:
+        order, centroids, offsets = _build_ivf(vectors)
+        vectors = vectors[order]
+        node_dicts = [node_dicts[i] for i in order]
+        np.savez(f"{ivf_path}.tmp.npz", centroids=centroids, offsets=offsets)
+        os.replace(f"{ivf_path}.tmp.npz", ivf_path)
+    elif os.path.exists(ivf_path):
+        os.remove(ivf_path)
+
+    np.save(os.path.join(folder, "vectors.tmp.npy"), vectors)
+    with open(os.path.join(folder, "nodes.tmp.json"), "w") as f:
+        json.dump(node_dicts, f)
+    os.replace(os.path.join(folder, "vectors.tmp.npy"), os.path.join(folder, "vectors.npy"))
+    os.replace(os.path.join(folder, "nodes.tmp.json"), os.path.join(folder, "nodes.json"))
+
+class LocalVectorStore(BasePydanticVectorStore):
+    stores_text: bool = True
+    flat_metadata: bool = False
+
+    _path: str = PrivateAttr()
+    _partitions: dict = PrivateAttr()
+    _segments: object = PrivateAttr()
+    _added: dict = PrivateAttr()
+    _deleted: set = PrivateAttr()
+    _cleared: bool = PrivateAttr()
+    _lock: object = PrivateAttr()
+
+    def __init__(self, path, **kwargs):
+        super().__init__(**kwargs)
+        self._path = path
+        self._partitions = {}
+        self._segments = SegmentLog(path)
+        # Changes since the last persist() (see segments.py)
+        self._added = {}        # year -> {node id: (vector, node dict)}
+        self._deleted = set()   # node ids
+        self._cleared = False
+        self._lock = threading.Lock()
+        if os.path.isdir(path):
+            for name in sorted(os.listdir(path)):
+                if name.startswith("year=") and os.path.exists(os.path.join(path, name, "vectors.npy")):
+                    self._partitions[name[5:]] = Partition.load(os.path.join(path, name))
+
+    @classmethod
+    def class_name(cls):
+        return "LocalVectorStore"
+
+    @property
+    def client(self):
+        return self
+
+    # --- READ ---
+    def _plan(self, filters):
+        """(partitions to scan, filters still to check per row)"""
+        if filters is None or not filters.filters:
+            return list(self._partitions.values()), None
+        if filters.condition != FilterCondition.OR:
+            for f in filters.filters:
+                if getattr(f, "key", None) == "year" and getattr(f, "operator", FilterOperator.EQ) == FilterOperator.EQ:
+                    # Year is the partition key, so the year filter costs nothing
+                    partition = self._partitions.get(str(f.value))
+                    rest = [other for other in filters.filters if other is not f]
+                    remaining = filters.model_copy(update={"filters": rest}) if rest else None
+                    return ([partition] if partition is not None else []), remaining
+        return list(self._partitions.values()), filters
+
+    def query(self, query, **kwargs):
+        k = query.similarity_top_k
+        q = _normalize(query.query_embedding)[None, :]
+        partitions, post_filters = self._plan(query.filters)
+        # Oversample when we still have to post-filter on other metadata
+        fetch = k * 10 if post_filters is not None else k
+
+        hits = []
+        for partition in partitions:
+            rows, scores = partition.search(q, fetch)[0]
+            for row, score in zip(rows, scores):
+                node_dict = partition.nodes[row]
+                if post_filters is not None and not _matches(node_dict["metadata"], post_filters):
+                    continue
+                hits.append((float(score), node_dict))
+
+        hits.sort(key=lambda h: -h[0])
+        hits = hits[:k]
+        nodes = [metadata_dict_to_node(h[1]["node"]) for h in hits]
+        return VectorStoreQueryResult(
+            nodes=nodes,
+            similarities=[h[0] for h in hits],
+            ids=[h[1]["id"] for h in hits],
+        )
+
+    async def aquery(self, query, **kwargs):
+        # Sub-millisecond and CPU-only: no point hopping to a thread
+        return self.query(query, **kwargs)
+
+    # --- WRITE (update_brain.py): persist() per checkpoint, compact() once per run ---
+    def add(self, nodes, **kwargs):
+        with self._lock:
+            for node in nodes:
+                year = str(node.metadata.get("year", NO_YEAR))
+                node_dict = {
+                    "id": node.node_id,
+                    "ref_doc_id": node.ref_doc_id,
+                    "metadata": node.metadata,
+                    "node": node_to_metadata_dict(node, remove_text=False, flat_metadata=False),
+                }
+                self._added.setdefault(year, {})[node.node_id] = (_normalize(node.get_embedding()), node_dict)
+        return [node.node_id for node in nodes]
+
+    def delete(self, ref_doc_id=None, ids=None, delete_all=False, **kwargs):
+        """LlamaIndex delete(ref_doc_id), plus Pinecone-style delete(ids=...) / delete(delete_all=True)"""
+        with self._lock:
+            if delete_all:
+                self._added, self._deleted, self._cleared = {}, set(), True
+                return
+            ids = set(ids or [])
+            if ref_doc_id:
+                for partition in self._partitions.values():
+                    ids.update(d["id"] for d in partition.nodes if d["ref_doc_id"] == ref_doc_id)
+                for rows in self._added.values():
+                    ids.update(n for n, (_, d) in rows.items() if d["ref_doc_id"] == ref_doc_id)
+            for rows in self._added.values():
+                for node_id in ids & rows.keys():
+                    del rows[node_id]
+            self._deleted |= ids
+
+    def delete_nodes(self, node_ids=None, filters=None, **kwargs):
+        self.delete(ids=node_ids)
+
+    def clear(self):
+        self.delete(delete_all=True)
+
+    def persist(self, persist_path=None, fs=None):
+        """Append the changes since the last call as one segment (see segments.py)"""
+        with self._lock:
+            if not (any(self._added.values()) or self._deleted or self._cleared):
+                return
+            added = self._added
+
+            def write_rows(folder):
+                for year, rows in added.items():
+                    if rows:
+                        _write_year(os.path.join(folder, f"year={year}"),
+                                    np.stack([v for v, _ in rows.values()]), [d for _, d in rows.values()])
+
+            self._segments.write(self._deleted, self._cleared, write_rows)
+            self._added, self._deleted, self._cleared = {}, set(), False
+
+    def compact(self):
+        """Fold every persisted segment into the year partitions (one year in memory at a time)
+        and re-open them memory-mapped. Queries only see compacted data."""
+        with self._lock:
+            paths = self._segments.paths()
+            if not paths:
+                return
+            metas = [SegmentLog.meta(path) for path in paths]
+            touched = set().union(*(SegmentLog.years(path) for path in paths))
+            cleared = any(meta["clear"] for meta in metas)
+            deleted = set().union(*(meta["deleted"] for meta in metas))
+            for year in sorted(set(self._partitions) | touched):
+                base = self._partitions.get(year)
+                if year not in touched and not cleared and not deleted & {d["id"] for d in base.nodes}:
+                    continue  # nothing changed in this year
+                segments = []
+                for path, meta in zip(paths, metas):
+                    folder = os.path.join(path, f"year={year}")
+                    segments.append((meta, _rows(Partition.load(folder)) if os.path.isdir(folder) else []))
+                rows = merge(_rows(base) if base is not None else [], segments)
+                vectors = np.stack([p.vectors[i] for p, i in rows]) if rows else np.zeros((0, 1), np.float32)
+                folder = os.path.join(self._path, f"year={year}")
+                _write_year(folder, vectors, [p.nodes[i] for p, i in rows])
+                self._partitions[year] = Partition.load(folder)
+            self._segments.remove()
+
+    # --- PINECONE-STYLE ADMIN (health check + brain version) ---
+    def describe_index_stats(self):
+        first = next(iter(self._partitions.values()), None)
+        return SimpleNamespace(
+            total_vector_count=sum(len(p.nodes) for p in self._partitions.values()),
+            dimension=first.vectors.shape[1] if first is not None else 0,
+        )
+
+    def bump_version(self):
+        version = str(time.time_ns())
+        os.makedirs(self._path, exist_ok=True)
+        with open(os.path.join(self._path, "version.txt"), "w") as f:
+            f.write(version)
+        return version
+
+    def read_version(self):
+        version_path = os.path.join(self._path, "version.txt")
+        if not os.path.exists(version_path):
+            return None
+        with open(version_path) as f:
+            return f.read().strip()
+
+    def write_faq(self, entries):
+        """Precomputed answers (faq.py), the local twin of the brain-faq namespace"""
+        os.makedirs(self._path, exist_ok=True)
+        with open(os.path.join(self._path, "faq.tmp.json"), "w") as f:
+            json.dump(entries, f)
+        os.replace(os.path.join(self._path, "faq.tmp.json"), os.path.join(self._path, "faq.json"))
+
+    def read_faq(self):
+        faq_path = os.path.join(self._path, "faq.json")
+        if not os.path.exists(faq_path):
+            return []
+        with open(faq_path) as f:
+            return json.load(f)
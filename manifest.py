@@ -0,0 +1,68 @@
+import json
+import os
+
+# ==============================================================================
+# 📒 SYNC MANIFEST
+# What update_brain.py has already pushed: one entry per Drive file with the
+# md5/modifiedTime we parsed and the vector IDs we wrote for it. Lets a run skip
+# unchanged files and delete the vectors of files that vanished from Drive.
+# Chunk fingerprints let the next run spot duplicates without re-reading files.
+# ==============================================================================
+
+class SyncManifest:
+    def __init__(self, path):
+        self.path = path
+        self.files = {}
+        if path and os.path.exists(path):
+            with open(path) as f:
+                self.files = json.load(f).get("files", {})
+
+    def is_current(self, item, year):
+        entry = self.files.get(item["id"])
+        if entry is None or entry["year"] != year:
+            return False
+        # Google Docs exports have no md5, so fall back to modifiedTime
+        if item.get("md5Checksum"):
+            return entry.get("md5") == item["md5Checksum"]
+        return entry.get("modified") == item.get("modifiedTime")
+
+    def node_ids(self, file_id):
+        return self.files.get(file_id, {}).get("node_ids", [])
+
+    def fingerprints(self, file_id):
+        """[(sha1, simhash)] of the chunks we kept for a file (see chunking.Deduper)"""
+        return [tuple(f) for f in self.files.get(file_id, {}).get("fingerprints", [])]
+
+    def dependents(self, file_ids):
+        """Files that dropped chunks as duplicates of any of file_ids"""
+        file_ids = set(file_ids)
+        return [fid for fid, e in self.files.items() if file_ids & set(e.get("duplicate_of", []))]
+
+    def record(self, item, year, node_ids, fingerprints=(), duplicate_of=()):
+        self.files[item["id"]] = {
+            "year": year,
+            "name": item["name"],
+            "md5": item.get("md5Checksum"),
+            "modified": item.get("modifiedTime"),
+            "node_ids": node_ids,
+            "fingerprints": [list(f) for f in fingerprints],
+            "duplicate_of": sorted(duplicate_of),
+        }
+
+    def forget(self, file_id):
+        self.files.pop(file_id, None)
+
+    def files_in_year(self, year):
+        return {fid: e for fid, e in self.files.items() if e["year"] == year}
+
+    def clear(self):
+        self.files = {}
+
+    def save(self):
+        if not self.path:
+            return
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"files": self.files}, f, indent=1)
+        os.replace(tmp_path, self.path)
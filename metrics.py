@@ -0,0 +1,195 @@
+import contextvars
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+import numpy as np
+
+# ==============================================================================
+# 📈 METRICS (Prometheus text format, no extra dependency)
+# Every stage of a chat (embed, cache, retrieve, prompt, generate, first token)
+# and of ingestion (download, parse, embed, upsert) is timed into a histogram.
+# Recording is a lock + a few additions, cheap enough to leave on. Quantiles
+# (p50/p95/p99) come from the last WINDOW observations and are only computed
+# when /metrics is scraped. The per-request stage times also go out as a
+# Server-Timing header so the browser devtools show where the time went.
+# ==============================================================================
+
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+QUANTILES = (0.5, 0.95, 0.99)
+WINDOW = int(os.getenv("METRICS_WINDOW", "1024"))
+
+def _label_str(names, values, extra=()):
+    pairs = [f'{n}="{v}"' for n, v in zip(names, values)] + [f'{n}="{v}"' for n, v in extra]
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+class Counter:
+    def __init__(self, name, help, labels=()):
+        self.name, self.help, self.labels = name, help, tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(str(labels.get(n, "")) for n in self.labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def reset(self):
+        with self._lock:
+            self._values = {}
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_label_str(self.labels, key)} {value}")
+        return lines
+
+class Histogram:
+    def __init__(self, name, help, labels=(), buckets=BUCKETS, window=WINDOW):
+        self.name, self.help, self.labels = name, help, tuple(labels)
+        self.buckets = buckets
+        self.window = window
+        self._series = {}  # label values -> [bucket counts, sum, count, recent values]
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(str(labels.get(n, "")) for n in self.labels)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * len(self.buckets), 0.0, 0, deque(maxlen=self.window)]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[0][i] += 1
+                    break
+            series[1] += value
+            series[2] += 1
+            series[3].append(value)
+
+    def quantiles(self, **labels):
+        """{0.5: s, 0.95: s, 0.99: s} over the recent window (empty if never observed)"""
+        key = tuple(str(labels.get(n, "")) for n in self.labels)
+        with self._lock:
+            recent = list(self._series[key][3]) if key in self._series else []
+        if not recent:
+            return {}
+        return dict(zip(QUANTILES, np.quantile(recent, QUANTILES).tolist()))
+
+    def reset(self):
+        with self._lock:
+            self._series = {}
+
+    def series(self):
+        with self._lock:
+            return [dict(zip(self.labels, key)) for key in sorted(self._series)]
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            snapshot = {k: (list(s[0]), s[1], s[2]) for k, s in self._series.items()}
+        for key, (counts, total, count) in sorted(snapshot.items()):
+            cumulative = 0
+            for bound, n in zip(self.buckets, counts):
+                cumulative += n
+                lines.append(f"{self.name}_bucket{_label_str(self.labels, key, [('le', bound)])} {cumulative}")
+            lines.append(f"{self.name}_bucket{_label_str(self.labels, key, [('le', '+Inf')])} {count}")
+            lines.append(f"{self.name}_sum{_label_str(self.labels, key)} {total}")
+            lines.append(f"{self.name}_count{_label_str(self.labels, key)} {count}")
+
+        recent = f"{self.name}_recent"
+        lines += [f"# HELP {recent} {self.help} (quantiles over the last {self.window} observations)",
+                  f"# TYPE {recent} gauge"]
+        for key in sorted(snapshot):
+            for q, value in self.quantiles(**dict(zip(self.labels, key))).items():
+                lines.append(f"{recent}{_label_str(self.labels, key, [('quantile', q)])} {value}")
+        return lines
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+        self.collectors = {}  # prefix -> fn returning a flat dict of numbers
+
+    def counter(self, name, help, labels=()):
+        metric = Counter(name, help, labels)
+        self.metrics.append(metric)
+        return metric
+
+    def histogram(self, name, help, labels=(), buckets=BUCKETS):
+        metric = Histogram(name, help, labels, buckets)
+        self.metrics.append(metric)
+        return metric
+
+    def gauges(self, prefix, fn):
+        """Export an existing stats() dict: every numeric value becomes <prefix>_<key>.
+        Registering a prefix again replaces it (the API rebuilds its objects on reload)."""
+        self.collectors[prefix] = fn
+
+    def reset(self):
+        """Forget every observation (benchmark.py, between scenarios)"""
+        for metric in self.metrics:
+            metric.reset()
+
+    def render(self):
+        lines = []
+        for metric in self.metrics:
+            lines += metric.render()
+        for prefix, fn in self.collectors.items():
+            try:
+                values = fn()
+            except Exception as e:
+                print(f"⚠️ Metrics collector {prefix} failed: {e}")
+                continue
+            for key, value in sorted(values.items()):
+                if isinstance(value, (int, float)) and not isinstance(value, bool):
+                    lines += [f"# TYPE {prefix}_{key} gauge", f"{prefix}_{key} {value}"]
+        return "\n".join(lines) + "\n"
+
+    def write_textfile(self, path):
+        """For batch jobs (update_brain.py): node_exporter textfile collector / CI artifact"""
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(f"{path}.tmp", "w") as f:
+            f.write(self.render())
+        os.replace(f"{path}.tmp", path)
+
+REGISTRY = Registry()
+
+STAGE_SECONDS = REGISTRY.histogram("bmsit_stage_seconds", "Time spent in one pipeline stage", ["stage"])
+STAGE_ERRORS = REGISTRY.counter("bmsit_stage_errors_total", "Failures by pipeline stage", ["stage", "error"])
+CACHE_LOOKUPS = REGISTRY.counter("bmsit_cache_lookups_total", "Cache lookups by cache and result", ["cache", "result"])
+LLM_TOKENS = REGISTRY.counter("bmsit_llm_tokens_total", "Gemini tokens (tokenizer estimate)", ["kind"])
+REQUEST_SECONDS = REGISTRY.histogram("bmsit_request_seconds", "HTTP request time to response headers",
+                                     ["path", "status"])
+CHUNKS_SENT = REGISTRY.histogram("bmsit_prompt_chunks", "Chunks the reranker let into the prompt",
+                                 buckets=(1, 2, 3, 4, 5, 6, 8, 10))
+
+# --- PER-REQUEST STAGE TIMES (for Server-Timing) ---
+_request_timings = contextvars.ContextVar("request_timings", default=None)
+
+def start_request():
+    """Call at the top of a request; stages timed in this context land in the returned dict"""
+    timings = {}
+    _request_timings.set(timings)
+    return timings
+
+def observe(stage, seconds):
+    STAGE_SECONDS.observe(seconds, stage=stage)
+    timings = _request_timings.get()
+    if timings is not None:
+        timings[stage] = timings.get(stage, 0.0) + seconds
+
+@contextmanager
+def timed(stage):
+    started = time.perf_counter()
+    try:
+        yield
+    except BaseException as e:
+        STAGE_ERRORS.inc(stage=stage, error=type(e).__name__)
+        raise
+    finally:
+        observe(stage, time.perf_counter() - started)
+
+def server_timing(timings):
+    return ", ".join(f"{stage};dur={seconds * 1000:.1f}" for stage, seconds in timings.items())
@@ -0,0 +1,98 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+import zlib
+
+# ==============================================================================
+# 📄 PARSE CACHE (content-addressed LlamaParse output)
+# Premium LlamaParse is the slowest and most expensive step of ingestion, and
+# most PDFs haven't changed in months. Parsed pages are stored compressed under
+# the file's md5 + the parser settings, so the same bytes are parsed once: a
+# renamed file, or one moved to another year's folder, is still a hit. Changing
+# result_type or premium mode changes the key, so old parses are never reused
+# for new settings. Least recently used files are pruned past the size cap.
+# ==============================================================================
+
+PARSE_CACHE_MB = int(os.getenv("PARSE_CACHE_MB", "512"))
+
+def parser_settings(parser):
+    """The settings that change LlamaParse output, as a stable string"""
+    fields = {name: getattr(parser, name, None) for name in ("result_type", "premium_mode", "language")}
+    return f"{type(parser).__name__}|" + "|".join(f"{k}={v}" for k, v in sorted(fields.items()))
+
+class ParseCache:
+    def __init__(self, path, settings, max_bytes=PARSE_CACHE_MB * 1024 * 1024):
+        self.settings = settings
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "stored": 0, "evicted": 0, "pages_reused": 0}
+
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("CREATE TABLE IF NOT EXISTS files "
+                         "(key TEXT PRIMARY KEY, pages INTEGER, bytes INTEGER, last_used REAL)")
+        self._db.execute("CREATE TABLE IF NOT EXISTS pages "
+                         "(key TEXT, page INTEGER, text BLOB, PRIMARY KEY (key, page))")
+        self._db.commit()
+
+    def key(self, md5):
+        return hashlib.sha256(f"{md5}\x00{self.settings}".encode()).hexdigest()
+
+    def get(self, md5):
+        """[page texts] parsed earlier from the same bytes with the same settings, or None"""
+        if not md5:
+            return None  # Google Docs exports have no md5: always parse
+        key = self.key(md5)
+        with self._lock:
+            rows = self._db.execute("SELECT text FROM pages WHERE key = ? ORDER BY page", (key,)).fetchall()
+            if not rows:
+                self.stats["misses"] += 1
+                return None
+            self._db.execute("UPDATE files SET last_used = ? WHERE key = ?", (time.time(), key))
+            self._db.commit()
+            self.stats["hits"] += 1
+            self.stats["pages_reused"] += len(rows)
+        return [zlib.decompress(row[0]).decode("utf-8") for row in rows]
+
+    def put(self, md5, pages):
+        if not md5:
+            return
+        key = self.key(md5)
+        blobs = [zlib.compress(text.encode("utf-8"), 6) for text in pages]
+        with self._lock:
+            self._db.execute("DELETE FROM pages WHERE key = ?", (key,))
+            self._db.executemany("INSERT INTO pages (key, page, text) VALUES (?, ?, ?)",
+                                 [(key, n, blob) for n, blob in enumerate(blobs)])
+            self._db.execute("INSERT OR REPLACE INTO files (key, pages, bytes, last_used) VALUES (?, ?, ?, ?)",
+                             (key, len(blobs), sum(len(b) for b in blobs), time.time()))
+            self._db.commit()
+            self.stats["stored"] += 1
+            self._prune()
+
+    def _prune(self):
+        total = self._db.execute("SELECT COALESCE(SUM(bytes), 0) FROM files").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        evict = []
+        for key, size in self._db.execute("SELECT key, bytes FROM files ORDER BY last_used"):
+            if total <= self.max_bytes:
+                break
+            evict.append((key,))
+            total -= size
+        self._db.executemany("DELETE FROM pages WHERE key = ?", evict)
+        self._db.executemany("DELETE FROM files WHERE key = ?", evict)
+        self._db.commit()
+        self.stats["evicted"] += len(evict)
+
+    def report(self):
+        with self._lock:
+            files, size = self._db.execute("SELECT COUNT(*), COALESCE(SUM(bytes), 0) FROM files").fetchone()
+        return {**self.stats, "parse_calls_avoided": self.stats["hits"], "files": files,
+                "mb": round(size / (1024 * 1024), 2)}
+
+    def close(self):
+        with self._lock:
+            self._db.close()
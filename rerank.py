@@ -0,0 +1,80 @@
+import time
+
+import numpy as np
+
+from sparse_index import tokenize
+
+# ==============================================================================
+# 🥇 RERANKER (over-retrieve, then keep only what clears the bar)
+# Retrieval fetches RERANK_CANDIDATES chunks instead of a fixed handful, and
+# this picks the ones Gemini actually reads. A candidate's relevance mixes its
+# retrieval score (scaled 0..1 across the candidates) with lexical overlap: the
+# share of the question's words it contains, weighted so that words every
+# candidate has count for little. Chunks are then taken greedily, minus a
+# penalty for each chunk already taken from the same file, so one long PDF
+# can't crowd out the others. Picking stops when the next chunk falls below
+# cutoff x the best relevance: a question with one clear match sends 1 chunk,
+# a vague one up to max_k. Plain Python + NumPy over ~20 chunks: 1-3 ms.
+# ==============================================================================
+
+class Reranker:
+    def __init__(self, max_k=5, min_k=1, cutoff=0.6, vector_weight=0.6, lexical_weight=0.4,
+                 diversity_penalty=0.15):
+        self.max_k = max_k
+        self.min_k = min_k
+        self.cutoff = cutoff
+        self.vector_weight = vector_weight
+        self.lexical_weight = lexical_weight
+        self.diversity_penalty = diversity_penalty
+
+    @staticmethod
+    def lexical(query, texts):
+        """Per text: idf-weighted share of the query's terms it contains (0..1)"""
+        terms = sorted(set(tokenize(query)))
+        if not terms or not texts:
+            return np.zeros(len(texts), dtype=np.float32)
+        present = np.array([[term in words for term in terms] for words in map(set, map(tokenize, texts))],
+                           dtype=np.float32)
+        idf = np.log1p(len(texts) / (1.0 + present.sum(axis=0)))
+        return present @ (idf / idf.sum())
+
+    def rerank(self, query, nodes):
+        """(chunks for the prompt, best first; report with every candidate's scores)"""
+        started = time.perf_counter()
+        if not nodes:
+            return nodes, {"candidates": 0, "kept": 0, "ms": 0.0, "scores": []}
+
+        retrieval = np.array([hit.score or 0.0 for hit in nodes], dtype=np.float32)
+        spread = retrieval.max() - retrieval.min()
+        vector = (retrieval - retrieval.min()) / spread if spread > 0 else np.ones_like(retrieval)
+        lexical = self.lexical(query, [hit.node.get_content() for hit in nodes])
+        relevance = self.vector_weight * vector + self.lexical_weight * lexical
+        sources = [hit.node.ref_doc_id or hit.node.metadata.get("file_link") for hit in nodes]
+
+        bar = self.cutoff * float(relevance.max())
+        chosen, per_source, remaining = [], {}, list(range(len(nodes)))
+        while remaining and len(chosen) < self.max_k:
+            adjusted = {i: relevance[i] - self.diversity_penalty * per_source.get(sources[i], 0) for i in remaining}
+            best = max(adjusted, key=adjusted.get)
+            if len(chosen) >= self.min_k and adjusted[best] < bar:
+                break
+            chosen.append(best)
+            per_source[sources[best]] = per_source.get(sources[best], 0) + 1
+            remaining.remove(best)
+
+        kept = set(chosen)
+        report = {
+            "candidates": len(nodes),
+            "kept": len(chosen),
+            "cutoff": round(bar, 4),
+            "ms": round((time.perf_counter() - started) * 1000, 2),
+            "scores": [{
+                "file_name": hit.node.metadata.get("file_name"),
+                "page": hit.node.metadata.get("page"),
+                "retrieval": round(float(retrieval[i]), 4),
+                "lexical": round(float(lexical[i]), 4),
+                "relevance": round(float(relevance[i]), 4),
+                "rank": chosen.index(i) + 1 if i in kept else None,
+            } for i, hit in enumerate(nodes)],
+        }
+        return [nodes[i] for i in chosen], report
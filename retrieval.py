@@ -0,0 +1,183 @@
+import threading
+
+import brain_version
+import vector_backend
+from llama_index.core import VectorStoreIndex
+from llama_index.core.query_engine import RetrieverQueryEngine
+from llama_index.core.vector_stores import MetadataFilters, ExactMatchFilter
+from llama_index.core.vector_stores.types import BasePydanticVectorStore
+from sparse_index import HybridRetriever
+
+# ==============================================================================
+# 🧠 SHARED RETRIEVAL STACK
+# Built once per process. Every /chat request reuses the same Pinecone client,
+# connection pool and query engines instead of rebuilding them per message.
+# ==============================================================================
+
+class RetrievalStack:
+    def __init__(self, api_key, index_name, engine_options, embed_model=None,
+                 similarity_top_k=5, pool_threads=8, health_interval=60,
+                 sparse_index=None, hybrid_top_k=4, hybrid_candidates=10):
+        """engine_options(year, mode) returns the extra as_query_engine kwargs (prompt etc.)
+        With a sparse_index, each year's vector search is fused with BM25 (see sparse_index.py)"""
+        self.api_key = api_key
+        self.index_name = index_name
+        self.engine_options = engine_options
+        self.embed_model = embed_model
+        self.similarity_top_k = similarity_top_k
+        self.pool_threads = pool_threads
+        self.health_interval = health_interval
+        self.sparse_index = sparse_index
+        self.hybrid_top_k = hybrid_top_k
+        self.hybrid_candidates = hybrid_candidates
+
+        self._lock = threading.RLock()
+        self._engines = {}
+        self._index = None
+        self._pinecone_index = None
+        self._healthy = False
+        self.native_async_store = False
+        self._health_thread = None
+        self._wake = threading.Event()
+        self.brain_version = None
+        self._version_seen = False
+        self._update_listeners = []
+        self.stats = {"clients_built": 0, "engines_built": 0, "rebuilds": 0, "health_failures": 0}
+
+    # --- 1. CONNECTION ---
+    def _connect(self):
+        vector_store, pinecone_index = vector_backend.connect(self.api_key, self.index_name, self.pool_threads)
+        index = VectorStoreIndex.from_vector_store(vector_store=vector_store, embed_model=self.embed_model)
+        self.stats["clients_built"] += 1
+        # Only await the store directly if it really has its own async query path
+        self.native_async_store = type(vector_store).aquery is not BasePydanticVectorStore.aquery
+        self._pinecone_index = pinecone_index
+        self._index = index
+        self._engines = {}
+        self._healthy = True
+
+    @property
+    def index(self):
+        with self._lock:
+            if self._index is None:
+                self._connect()
+            return self._index
+
+    @property
+    def pinecone_index(self):
+        """The raw index client, for the markers next to the documents (brain version, FAQ answers)"""
+        with self._lock:
+            if self._pinecone_index is None:
+                self._connect()
+            return self._pinecone_index
+
+    # --- 2. QUERY ENGINES (one per year + persona, plus a streaming twin) ---
+    def get_engine(self, year, mode, streaming=False):
+        key = (year, mode, streaming)
+        engine = self._engines.get(key)
+        if engine is not None:
+            return engine
+
+        with self._lock:
+            engine = self._engines.get(key)
+            if engine is None:
+                filters = MetadataFilters(filters=[ExactMatchFilter(key="year", value=year)])
+                options = self.engine_options(year, mode)
+                retriever = self._build_retriever(year, filters, options)
+                engine = RetrieverQueryEngine.from_args(retriever, streaming=streaming, **options)
+                self._engines[key] = engine
+                self.stats["engines_built"] += 1
+            return engine
+
+    def _build_retriever(self, year, filters, options):
+        if self.sparse_index is None or self.sparse_index.partition(year) is None:
+            return self.index.as_retriever(similarity_top_k=self.similarity_top_k, filters=filters, **options)
+        vector_retriever = self.index.as_retriever(similarity_top_k=self.hybrid_candidates, filters=filters, **options)
+        return HybridRetriever(
+            vector_retriever, self.sparse_index, year,
+            top_k=self.hybrid_top_k, candidates=self.hybrid_candidates,
+        )
+
+    def warmup(self, years, modes):
+        """Pre-build every engine so the first student doesn't pay for it"""
+        for year in years:
+            for mode in modes:
+                self.get_engine(year, mode)
+                self.get_engine(year, mode, streaming=True)
+
+    # --- 3. HEALTH CHECK + REBUILD ---
+    def check_health(self):
+        try:
+            with self._lock:
+                if self._pinecone_index is None:
+                    self._connect()
+                pinecone_index = self._pinecone_index
+            pinecone_index.describe_index_stats()
+            self._healthy = True
+        except Exception as e:
+            print(f"⚠️ Pinecone health check failed, rebuilding: {e}")
+            self.stats["health_failures"] += 1
+            self.rebuild()
+            return self._healthy
+
+        self._check_brain_version(pinecone_index)
+        return self._healthy
+
+    # --- 4. NEW DOCUMENTS PUSHED? (see brain_version.py) ---
+    def on_brain_update(self, callback):
+        self._update_listeners.append(callback)
+
+    def _check_brain_version(self, pinecone_index):
+        try:
+            version = brain_version.read(pinecone_index)
+        except Exception as e:
+            print(f"⚠️ Could not read brain version: {e}")
+            return
+        if self._version_seen and version == self.brain_version:
+            return
+        previous, self.brain_version = self.brain_version, version  # listeners may read the new one
+        if self._version_seen:
+            print(f"🔄 Brain updated ({previous} -> {version}), dropping caches")
+            if vector_backend.BACKEND == "local":
+                self.rebuild()  # re-open the freshly written partitions
+            for callback in self._update_listeners:
+                callback()
+        self._version_seen = True
+
+    def rebuild(self):
+        with self._lock:
+            self._healthy = False
+            self._index = None
+            self._pinecone_index = None
+            self._engines = {}
+            self.stats["rebuilds"] += 1
+            try:
+                self._connect()
+            except Exception as e:
+                print(f"❌ Rebuild failed (will retry next check): {e}")
+
+    def report_failure(self):
+        """Called by the endpoint when a query blows up, so the next check happens now"""
+        self._healthy = False
+        if self._health_thread is None:
+            self.check_health()
+        else:
+            self._wake.set()
+
+    def _health_loop(self):
+        while True:
+            self._wake.wait(self.health_interval)
+            self._wake.clear()
+            self.check_health()
+
+    def start(self, years=(), modes=()):
+        try:
+            self.warmup(years, modes)
+            self._check_brain_version(self._pinecone_index)
+            print(f"✅ Retrieval stack ready ({len(self._engines)} engines)")
+        except Exception as e:
+            print(f"⚠️ Retrieval warmup failed (will retry on health check): {e}")
+            self._healthy = False
+        if self._health_thread is None:
+            self._health_thread = threading.Thread(target=self._health_loop, daemon=True)
+            self._health_thread.start()
@@ -0,0 +1,73 @@
+import json
+import os
+import shutil
+
+# ==============================================================================
+# 🧱 DELTA SEGMENTS (checkpoint writes for the local indexes)
+# Rewriting a whole year at every ingestion checkpoint costs O(corpus) each
+# time, so a run paid O(files² / CHECKPOINT_FILES) and held full years in RAM.
+# Instead, each checkpoint appends one numbered segment with only what changed
+# since the last one: the rows added (per year, in the store's own format)
+# plus the IDs deleted. A segment directory is written under a .tmp name and
+# renamed, so it either exists whole or not at all. compact() in the stores
+# folds all segments into the main partitions once, at the end of a run; a
+# run that dies first leaves them for the next run to fold in.
+#
+# Layout:  <index dir>/segments/000001/year=<y>/...   rows added, like a partition
+#                                     /deleted.json   {"deleted": [ids], "clear": bool}
+# ==============================================================================
+
+class SegmentLog:
+    def __init__(self, root):
+        self.dir = os.path.join(root, "segments")
+
+    def paths(self):
+        """Committed segments, oldest first"""
+        if not os.path.isdir(self.dir):
+            return []
+        return [os.path.join(self.dir, name) for name in sorted(os.listdir(self.dir)) if name.isdigit()]
+
+    def write(self, deleted, clear, write_rows):
+        """write_rows(segment dir) writes the added rows; returns the committed segment dir"""
+        existing = self.paths()
+        number = int(os.path.basename(existing[-1])) + 1 if existing else 1
+        final = os.path.join(self.dir, f"{number:06d}")
+        tmp = final + ".tmp"
+        shutil.rmtree(tmp, ignore_errors=True)  # left by a run that died mid-write
+        os.makedirs(tmp)
+        write_rows(tmp)
+        with open(os.path.join(tmp, "deleted.json"), "w") as f:
+            json.dump({"deleted": sorted(deleted), "clear": clear}, f)
+        os.replace(tmp, final)
+        return final
+
+    @staticmethod
+    def meta(path):
+        with open(os.path.join(path, "deleted.json")) as f:
+            return json.load(f)
+
+    @staticmethod
+    def years(path):
+        return {name[5:] for name in os.listdir(path) if name.startswith("year=")}
+
+    def remove(self):
+        shutil.rmtree(self.dir, ignore_errors=True)
+
+def merge(base, segments):
+    """The rows that survive, oldest first. base: [(id, row)] from the main partition;
+    segments: [(meta, [(id, row)])] oldest first. A later add replaces a row with the same
+    ID, a delete removes it, and a clear drops everything before that segment's own rows."""
+    seen, kept = set(), []
+    for meta, rows in reversed(segments):
+        for node_id, row in reversed(rows):
+            if node_id not in seen:
+                seen.add(node_id)
+                kept.append(row)
+        if meta.get("clear"):
+            return kept[::-1]
+        seen.update(meta.get("deleted", []))
+    for node_id, row in reversed(base):
+        if node_id not in seen:
+            seen.add(node_id)
+            kept.append(row)
+    return kept[::-1]
@@ -0,0 +1,87 @@
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+# ==============================================================================
+# 🧊 SEMANTIC ANSWER CACHE
+# "when are exams?" and "exam dates??" from two Year 2 students in the same
+# persona should cost one Gemini call, not two. Answers are kept per
+# (year, persona) and matched by cosine similarity of the query embedding.
+# ==============================================================================
+
+class SemanticCache:
+    def __init__(self, threshold=0.95, ttl=3600, max_entries=512):
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_entries = max_entries  # per (year, persona) bucket
+
+        self._lock = threading.Lock()
+        self._buckets = {}
+        self._next_id = 0
+        self.hits = 0
+        self.misses = 0
+        self.saved_ms = 0.0
+        self.invalidations = 0
+
+    @staticmethod
+    def _normalize(embedding):
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def lookup(self, year, mode, embedding):
+        """Returns the cached answer for a near-identical question, or None"""
+        query = self._normalize(embedding)
+        now = time.monotonic()
+
+        with self._lock:
+            bucket = self._buckets.get((year, mode))
+            if bucket:
+                # Drop expired entries (oldest are at the front)
+                for key in [k for k, e in bucket.items() if now - e["stored_at"] > self.ttl]:
+                    del bucket[key]
+
+            if bucket:
+                keys = list(bucket.keys())
+                scores = np.stack([bucket[k]["vector"] for k in keys]) @ query
+                best = int(np.argmax(scores))
+                if scores[best] >= self.threshold:
+                    entry = bucket[keys[best]]
+                    bucket.move_to_end(keys[best])
+                    self.hits += 1
+                    self.saved_ms += entry["latency_ms"]
+                    return entry["answer"]
+
+            self.misses += 1
+            return None
+
+    def store(self, year, mode, embedding, answer, latency_ms):
+        with self._lock:
+            bucket = self._buckets.setdefault((year, mode), OrderedDict())
+            bucket[self._next_id] = {
+                "vector": self._normalize(embedding),
+                "answer": answer,
+                "latency_ms": latency_ms,
+                "stored_at": time.monotonic(),
+            }
+            self._next_id += 1
+            while len(bucket) > self.max_entries:
+                bucket.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._buckets = {}
+            self.invalidations += 1
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+            "saved_ms": round(self.saved_ms, 1),
+            "entries": sum(len(b) for b in self._buckets.values()),
+            "invalidations": self.invalidations,
+        }
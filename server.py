@@ -5,12 +5,13 @@ from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
 import uvicorn
 
-from pinecone import Pinecone
-from llama_index.core import VectorStoreIndex, Settings
-from llama_index.vector_stores.pinecone import PineconeVectorStore
+from llama_index.core import Settings
 from llama_index.embeddings.google_genai import GoogleGenAIEmbedding
 from llama_index.llms.google_genai import GoogleGenAI
-from llama_index.core.vector_stores import MetadataFilters, ExactMatchFilter
+from retrieval import RetrievalStack
+from embed_cache import EmbeddingCache, CachedEmbedding
+from chat_pipeline import ChatPipeline
+from sessions import SessionStore
 
 load_dotenv()
 GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
@@ -20,10 +21,14 @@ INDEX_NAME = os.getenv("INDEX_NAME", "bmsit-chatbot")
 # 1. CONFIGURE AI (STABLE 2026 VERSION)
 try:
     # Must match the update_brain dimensionality
-    embed_model = GoogleGenAIEmbedding(
-        model_name="models/gemini-embedding-001", 
-        api_key=GOOGLE_API_KEY,
-        output_dimensionality=768
+    embed_model = CachedEmbedding(
+        GoogleGenAIEmbedding(
+            model_name="models/gemini-embedding-001", 
+            api_key=GOOGLE_API_KEY,
+            output_dimensionality=768
+        ),
+        EmbeddingCache(max_entries=int(os.getenv("EMBED_CACHE_SIZE", "10000"))),
+        dimensions=768,
     )
     llm = GoogleGenAI(model="models/gemini-2.0-flash", api_key=GOOGLE_API_KEY)
     Settings.embed_model = embed_model
@@ -41,29 +46,39 @@ class ChatRequest(BaseModel):
     message: str
     year: str = "1"
     mode: str = "Study Buddy"
+    chat_id: str = None
+
+# Built once at startup, reused by every request
+retrieval_stack = RetrievalStack(
+    api_key=PINECONE_API_KEY,
+    index_name=INDEX_NAME,
+    embed_model=embed_model,
+    engine_options=lambda year, mode: {
+        "system_prompt": f"{PERSONAS[mode]}\nDrive: {DATABASE.get(year)}",
+        "embed_model": embed_model,
+    },
+)
+
+@app.on_event("startup")
+def connect_brain():
+    retrieval_stack.start(years=DATABASE.keys(), modes=PERSONAS.keys())
+
+chat_pipeline = ChatPipeline(retrieval_stack)
+sessions = SessionStore()
 
 @app.post("/chat")
-def chat_endpoint(request: ChatRequest):
+async def chat_endpoint(request: ChatRequest):
     try:
         year = str(request.year) if str(request.year) in DATABASE else "1"
-        persona = PERSONAS.get(request.mode, "Study Buddy")
-        
-        pc = Pinecone(api_key=PINECONE_API_KEY)
-        pinecone_index = pc.Index(INDEX_NAME)
-        vector_store = PineconeVectorStore(pinecone_index=pinecone_index)
-        
-        index = VectorStoreIndex.from_vector_store(vector_store=vector_store, embed_model=embed_model)
-        query_engine = index.as_query_engine(
-            similarity_top_k=5, 
-            filters=MetadataFilters(filters=[ExactMatchFilter(key="year", value=year)]),
-            system_prompt=f"{persona}\nDrive: {DATABASE.get(year)}",
-            embed_model=embed_model
-        )
-        
-        response = query_engine.query(request.message)
+        mode = request.mode if request.mode in PERSONAS else "Study Buddy"
+
+        session = await sessions.get(request.chat_id) if request.chat_id else None
+        response = await chat_pipeline.answer(request.message, year, mode, session)
+        if session is not None:
+            sessions.record_later(session, request.message, str(response))
         return {"response": str(response)}
     except Exception as e:
-        print(f"❌ ERROR: {e}"); return {"response": "Brain glitch! Try again. 🤖"}
+        print(f"❌ ERROR: {e}"); retrieval_stack.report_failure(); return {"response": "Brain glitch! Try again. 🤖"}
 
 if __name__ == "__main__":
     uvicorn.run(app, host="0.0.0.0", port=10000)
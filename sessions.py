@@ -0,0 +1,178 @@
+import asyncio
+import os
+import time
+from collections import OrderedDict
+
+from llama_index.core import Settings
+from llama_index.core.llms import ChatMessage, MessageRole
+
+from context_budget import count_tokens
+
+# ==============================================================================
+# 💬 CONVERSATION MEMORY
+# One Session per chat_id, kept in process (LRU + idle timeout). On a miss the
+# history is read once from Firestore chats/{id}/messages, where the frontend
+# already saves every message. When a transcript outgrows the token budget,
+# the older turns are folded into a running summary by Gemini (in the
+# background, after the reply), so follow-ups like "and unit 2?" keep working
+# without sending the whole conversation every time.
+# ==============================================================================
+
+SESSION_MAX = int(os.getenv("SESSION_MAX", "2000"))
+SESSION_IDLE_TTL = int(os.getenv("SESSION_IDLE_TTL", "1800"))
+HISTORY_TOKEN_BUDGET = int(os.getenv("HISTORY_TOKEN_BUDGET", "1200"))
+HISTORY_KEEP_TURNS = int(os.getenv("HISTORY_KEEP_TURNS", "4"))
+
+SUMMARY_PROMPT = (
+    "Summarise this conversation between a BMSIT student and their study assistant in at most "
+    "120 words. Keep subjects, units, dates, file names and anything the student asked to "
+    "remember.\n\n{transcript}\n\nSUMMARY:"
+)
+
+class Session:
+    def __init__(self, chat_id, turns=None):
+        self.chat_id = chat_id
+        self.turns = turns or []  # [{"role": "user" | "assistant", "content": str}]
+        self.summary = ""
+        self.last_used = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    def last_question(self):
+        for turn in reversed(self.turns):
+            if turn["role"] == "user":
+                return turn["content"]
+        return None
+
+    def transcript(self):
+        """Summary + recent turns as plain text for the prompt ("" for a fresh chat)"""
+        lines = [f"Earlier in this chat: {self.summary}"] if self.summary else []
+        names = {"user": "Student", "assistant": "You"}
+        lines += [f"{names.get(t['role'], t['role'])}: {t['content']}" for t in self.turns]
+        return "\n".join(lines)
+
+    def chat_messages(self):
+        """The same history as LlamaIndex ChatMessages (for chat engines)"""
+        messages = [ChatMessage(role=MessageRole.SYSTEM, content=f"Earlier in this chat: {self.summary}")] \
+            if self.summary else []
+        messages += [ChatMessage(role=MessageRole.USER if t["role"] == "user" else MessageRole.ASSISTANT,
+                                 content=t["content"]) for t in self.turns]
+        return messages
+
+    def tokens(self):
+        return count_tokens(self.transcript()) if self.turns or self.summary else 0
+
+class SessionStore:
+    def __init__(self, loader=None, summarizer=None, max_sessions=SESSION_MAX, idle_ttl=SESSION_IDLE_TTL,
+                 token_budget=HISTORY_TOKEN_BUDGET, keep_turns=HISTORY_KEEP_TURNS):
+        """loader(chat_id) -> [turns] (blocking, e.g. Firestore). summarizer(text) -> awaitable str."""
+        self.loader = loader
+        self.summarizer = summarizer or summarize_with_llm
+        self.max_sessions = max_sessions
+        self.idle_ttl = idle_ttl
+        self.token_budget = token_budget
+        self.keep_turns = keep_turns
+        self._sessions = OrderedDict()
+        self._loading = {}
+        self._background = set()
+        self.stats = {"hits": 0, "loads": 0, "load_failures": 0, "evictions": 0, "summaries": 0}
+
+    def _evict(self):
+        now = time.monotonic()
+        while self._sessions:
+            chat_id, session = next(iter(self._sessions.items()))
+            if len(self._sessions) <= self.max_sessions and now - session.last_used <= self.idle_ttl:
+                break
+            del self._sessions[chat_id]
+            self.stats["evictions"] += 1
+
+    async def get(self, chat_id, pending_message=None):
+        """Session for chat_id, loading history on a miss. pending_message: the message
+        being answered, which the frontend may already have saved to Firestore."""
+        session = self._sessions.get(chat_id)
+        if session is not None:
+            self._sessions.move_to_end(chat_id)
+            session.last_used = time.monotonic()
+            self.stats["hits"] += 1
+            return session
+
+        # Two requests for the same cold chat share one Firestore read
+        if chat_id not in self._loading:
+            self._loading[chat_id] = asyncio.ensure_future(self._load(chat_id, pending_message))
+        try:
+            session = await self._loading[chat_id]
+        finally:
+            self._loading.pop(chat_id, None)
+        self._sessions.setdefault(chat_id, session)
+        self._evict()
+        return self._sessions.get(chat_id, session)
+
+    async def _load(self, chat_id, pending_message):
+        turns = []
+        if self.loader is not None:
+            try:
+                turns = await asyncio.to_thread(self.loader, chat_id)
+                self.stats["loads"] += 1
+            except Exception as e:
+                print(f"⚠️ Could not load chat history for {chat_id}: {e}")
+                self.stats["load_failures"] += 1
+        if turns and turns[-1]["role"] == "user" and turns[-1]["content"] == pending_message:
+            turns = turns[:-1]
+        session = Session(chat_id, turns)
+        await self.compact(session)
+        return session
+
+    async def record(self, session, message, reply):
+        """Add one exchange, then fold old turns into the summary if over budget"""
+        session.turns += [{"role": "user", "content": message}, {"role": "assistant", "content": reply}]
+        session.last_used = time.monotonic()
+        await self.compact(session)
+
+    def record_later(self, session, message, reply):
+        """record() after the response has gone out (summaries can take a second)"""
+        task = asyncio.ensure_future(self.record(session, message, reply))
+        # The loop only keeps weak references to tasks
+        self._background.add(task)
+        task.add_done_callback(self._background.discard)
+
+    async def compact(self, session):
+        async with session.lock:
+            if session.tokens() <= self.token_budget or len(session.turns) <= self.keep_turns:
+                return
+            old = session.turns[:-self.keep_turns]
+            folded = Session(session.chat_id, old)
+            folded.summary = session.summary
+            try:
+                session.summary = (await self.summarizer(folded.transcript())).strip()
+                self.stats["summaries"] += 1
+            except Exception as e:
+                # No summary this time: just forget the oldest turns
+                print(f"⚠️ History summary failed, dropping old turns: {e}")
+            # Turns recorded while we were summarising stay
+            session.turns = session.turns[len(old):]
+
+async def summarize_with_llm(transcript):
+    response = await Settings.llm.acomplete(SUMMARY_PROMPT.format(transcript=transcript))
+    return response.text
+
+def firestore_loader(db, limit=50):
+    """loader for SessionStore: the last `limit` messages of chats/{chat_id}/messages"""
+    def load(chat_id):
+        messages = (db.collection("chats").document(chat_id).collection("messages")
+                    .order_by("createdAt", direction="DESCENDING").limit(limit).stream())
+        turns = [m.to_dict() for m in messages]
+        return [{"role": t.get("role", "user"), "content": t.get("content", "")} for t in reversed(turns)]
+    return load
+
+def connect_firestore(key_path):
+    """Firestore client from a service account key, or None (memory still works, just cold)"""
+    if not key_path or not os.path.exists(key_path):
+        return None
+    try:
+        import firebase_admin
+        from firebase_admin import credentials, firestore
+        if not firebase_admin._apps:
+            firebase_admin.initialize_app(credentials.Certificate(key_path))
+        return firestore.client()
+    except Exception as e:
+        print(f"⚠️ Firestore unavailable, chat history starts empty after restarts: {e}")
+        return None
@@ -0,0 +1,275 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+import numpy as np
+from llama_index.core.base.response.schema import Response
+from llama_index.core.schema import NodeWithScore
+from llama_index.core.vector_stores.utils import metadata_dict_to_node, node_to_metadata_dict
+
+# ==============================================================================
+# 🗄️ SHARED CACHE (one store for every uvicorn worker on the host)
+# With --workers N, every process kept its own answers, query embeddings and
+# retrieval results: N copies in RAM, and each worker only saw 1/N of the
+# repeats. This is one SQLite file in WAL mode that all workers open: readers
+# never block each other, every get/set is a single transaction, entries expire
+# after their TTL, and the least recently used ones go once the file passes
+# SHARED_CACHE_MB. A generation counter invalidates everything that depends on
+# the documents in one step: it moves when update_brain.py pushes, or when a
+# worker first sees a new brain version, and older entries just stop matching.
+# Query embeddings only depend on the model, so they ignore the generation.
+# Values are JSON, never pickles: any process that can write the file could
+# otherwise run code in every worker that reads it.
+# ==============================================================================
+
+SHARED_CACHE_MB = int(os.getenv("SHARED_CACHE_MB", "256"))
+EVICT_EVERY = 200        # writes (per process) between size checks
+TOUCH_INTERVAL = 60      # seconds; hits refresh last_used at most this often (a write)
+MB = 1024 * 1024
+
+CURRENT = "(generation IS NULL OR generation = (SELECT CAST(value AS INTEGER) FROM meta WHERE name = 'generation'))"
+
+class SharedCache:
+    def __init__(self, path, max_mb=SHARED_CACHE_MB, ttl=3600):
+        self.path = path
+        self.max_bytes = max_mb * MB
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._writes = 0
+        self._limits = {}  # ns -> max entries, enforced with the size checks
+        self.stats = {"hits": 0, "misses": 0, "sets": 0, "evicted": 0, "generation_bumps": 0}  # this process
+
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        # timeout: wait for another worker's write instead of failing with "database is locked"
+        self._db = sqlite3.connect(path, timeout=10, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")  # a cache may lose its last writes on power loss
+        self._db.execute("CREATE TABLE IF NOT EXISTS entries "
+                         "(ns TEXT, key TEXT, value BLOB, vector BLOB, generation INTEGER, expires REAL, "
+                         "size INTEGER, last_used REAL, PRIMARY KEY (ns, key))")
+        self._db.execute("CREATE INDEX IF NOT EXISTS entries_last_used ON entries (last_used)")
+        self._db.execute("CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value TEXT)")
+        self._db.execute("INSERT OR IGNORE INTO meta VALUES ('generation', '0'), ('brain_version', '')")
+        self._db.commit()
+
+    # --- 1. GET / SET ---
+    def get(self, ns, key):
+        """The stored bytes, or None if missing, expired or from an older generation"""
+        now = time.time()
+        with self._lock:
+            row = self._db.execute(f"SELECT value, last_used FROM entries WHERE ns = ? AND key = ? "
+                                   f"AND expires > ? AND {CURRENT}", (ns, key, now)).fetchone()
+            if row is None:
+                self.stats["misses"] += 1
+                return None
+            self.stats["hits"] += 1
+            if now - row[1] > TOUCH_INTERVAL:
+                self._db.execute("UPDATE entries SET last_used = ? WHERE ns = ? AND key = ?", (now, ns, key))
+                self._db.commit()
+            return row[0]
+
+    def set(self, ns, key, value, ttl=None, versioned=True, vector=None, max_entries=None):
+        """versioned=False: the entry survives generation bumps (it doesn't depend on the documents).
+        vector: normalized float32 embedding, for nearest(). max_entries: cap on the namespace,
+        applied every EVICT_EVERY writes (so it can run over by that much in between)"""
+        now = time.time()
+        vector = None if vector is None else np.asarray(vector, dtype=np.float16).tobytes()
+        size = len(value) + len(vector or b"")
+        with self._lock:
+            if max_entries:
+                self._limits[ns] = max_entries
+            generation = self._generation() if versioned else None
+            self._db.execute("INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                             (ns, key, value, vector, generation, now + (ttl or self.ttl), size, now))
+            self._db.commit()
+            self.stats["sets"] += 1
+            self._writes += 1
+            if self._writes % EVICT_EVERY == 0:
+                self._evict()
+
+    def nearest(self, ns, vector, threshold):
+        """(key, value, score) of the most similar stored vector in ns at or above threshold, or None"""
+        query = np.asarray(vector, dtype=np.float32)
+        with self._lock:
+            rows = self._db.execute(f"SELECT key, vector FROM entries WHERE ns = ? AND vector IS NOT NULL "
+                                    f"AND expires > ? AND {CURRENT}", (ns, time.time())).fetchall()
+        if rows:
+            matrix = np.frombuffer(b"".join(r[1] for r in rows), dtype=np.float16).reshape(len(rows), -1)
+            scores = matrix.astype(np.float32) @ query
+            best = int(np.argmax(scores))
+            if scores[best] >= threshold:
+                value = self.get(ns, rows[best][0])
+                if value is not None:
+                    return rows[best][0], value, float(scores[best])
+                return None
+        with self._lock:
+            self.stats["misses"] += 1
+        return None
+
+    # --- 2. EVICTION ---
+    def _trim(self, ns, max_entries):
+        """Keep only the max_entries most recently used entries of one namespace"""
+        return self._db.execute("DELETE FROM entries WHERE ns = ? AND rowid NOT IN "
+                                "(SELECT rowid FROM entries WHERE ns = ? ORDER BY last_used DESC LIMIT ?)",
+                                (ns, ns, max_entries)).rowcount
+
+    def _evict(self):
+        now = time.time()
+        cur = self._db.execute(f"DELETE FROM entries WHERE expires <= ? OR NOT {CURRENT}", (now,))
+        evicted = cur.rowcount
+        for ns, max_entries in self._limits.items():
+            evicted += self._trim(ns, max_entries)
+        total, count = self._db.execute("SELECT COALESCE(SUM(size), 0), COUNT(*) FROM entries").fetchone()
+        while total > self.max_bytes and count:
+            # Oldest 10% at a time until we're under the cap
+            batch = max(1, count // 10)
+            freed = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM (SELECT size FROM entries "
+                                     "ORDER BY last_used LIMIT ?)", (batch,)).fetchone()[0]
+            self._db.execute("DELETE FROM entries WHERE rowid IN "
+                             "(SELECT rowid FROM entries ORDER BY last_used LIMIT ?)", (batch,))
+            total, count, evicted = total - freed, count - batch, evicted + batch
+        self._db.commit()
+        self.stats["evicted"] += evicted
+
+    # --- 3. GENERATIONS ---
+    def _generation(self):
+        return int(self._db.execute("SELECT value FROM meta WHERE name = 'generation'").fetchone()[0])
+
+    def generation(self):
+        with self._lock:
+            return self._generation()
+
+    def advance(self, brain_version=None):
+        """Invalidate every versioned entry. With a brain_version, only if it's new to this
+        file, so N workers (and update_brain.py) seeing the same update bump once."""
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                known = self._db.execute("SELECT value FROM meta WHERE name = 'brain_version'").fetchone()[0]
+                if brain_version is not None and str(brain_version) == known:
+                    self._db.execute("COMMIT")
+                    return False
+                self._db.execute("UPDATE meta SET value = CAST(value AS INTEGER) + 1 WHERE name = 'generation'")
+                if brain_version is not None:
+                    self._db.execute("UPDATE meta SET value = ? WHERE name = 'brain_version'", (str(brain_version),))
+                self._db.execute("COMMIT")
+            except Exception:
+                self._db.execute("ROLLBACK")
+                raise
+            self.stats["generation_bumps"] += 1
+            return True
+
+    def report(self):
+        with self._lock:
+            count, size = self._db.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries").fetchone()
+            generation = self._generation()
+        total = self.stats["hits"] + self.stats["misses"]
+        return {**self.stats, "hit_rate": round(self.stats["hits"] / total, 4) if total else 0.0,
+                "entries": count, "mb": round(size / MB, 2), "generation": generation}
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+def bump_generation(path, brain_version=None):
+    """For update_brain.py: invalidate the API workers' cached answers on this host (if any)"""
+    if not path or not os.path.exists(path):
+        return None
+    cache = SharedCache(path)
+    try:
+        cache.advance(brain_version)
+        return cache.generation()
+    finally:
+        cache.close()
+
+def _key(*parts):
+    return hashlib.sha256("\x00".join(str(p) for p in parts).encode("utf-8")).hexdigest()
+
+def _dump_nodes(nodes):
+    """Retrieved nodes as JSON-ready dicts, without their embeddings (which would triple the size)"""
+    return [{"node": node_to_metadata_dict(n.node.model_copy(update={"embedding": None}), remove_text=False,
+                                           flat_metadata=False), "score": n.score} for n in nodes]
+
+def _load_nodes(dicts):
+    return [NodeWithScore(node=metadata_dict_to_node(d["node"]), score=d["score"]) for d in dicts]
+
+# --- 4. THE THREE CACHES ON TOP ---
+class SharedAnswerCache:
+    """SemanticCache's interface (lookup / store / clear / stats), backed by a SharedCache"""
+
+    def __init__(self, shared, threshold=0.95, ttl=3600, max_entries=512):
+        self.shared = shared
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_entries = max_entries  # per (year, persona), bounds the similarity scan
+        self.hits = 0
+        self.misses = 0
+        self.saved_ms = 0.0
+        self.invalidations = 0
+
+    @staticmethod
+    def _normalize(embedding):
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def lookup(self, year, mode, embedding):
+        found = self.shared.nearest(f"answer:{year}|{mode}", self._normalize(embedding), self.threshold)
+        if found is None:
+            self.misses += 1
+            return None
+        entry = json.loads(found[1])
+        self.hits += 1
+        self.saved_ms += entry["latency_ms"]
+        return Response(response=entry["response"], source_nodes=_load_nodes(entry["nodes"]),
+                        metadata=entry["metadata"])
+
+    def store(self, year, mode, embedding, answer, latency_ms):
+        ns = f"answer:{year}|{mode}"
+        vector = self._normalize(embedding)
+        value = json.dumps({"response": answer.response, "nodes": _dump_nodes(answer.source_nodes),
+                            "metadata": answer.metadata, "latency_ms": latency_ms})
+        self.shared.set(ns, _key(vector.tobytes()), value.encode("utf-8"), ttl=self.ttl, vector=vector,
+                        max_entries=self.max_entries)
+
+    def clear(self):
+        self.shared.advance()
+        self.invalidations += 1
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+            "saved_ms": round(self.saved_ms, 1),
+            "invalidations": self.invalidations,
+            "shared": self.shared.report(),
+        }
+
+class SharedRetrievalCache:
+    """Retrieved nodes per (year, retrieval text): follow-ups and answer-cache misses reuse them"""
+
+    def __init__(self, shared, ttl=600):
+        self.shared = shared
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, year, text):
+        value = self.shared.get("retrieval", _key(year, text))
+        if value is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return _load_nodes(json.loads(value))
+
+    def put(self, year, text, nodes):
+        self.shared.set("retrieval", _key(year, text), json.dumps(_dump_nodes(nodes)).encode("utf-8"), ttl=self.ttl)
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {"hits": self.hits, "misses": self.misses, "hit_rate": round(self.hits / total, 4) if total else 0.0}
@@ -0,0 +1,99 @@
+import asyncio
+import re
+
+# ==============================================================================
+# 🛬 SINGLE-FLIGHT COALESCING
+# Right after a circular drops, fifty students ask "is tomorrow a holiday?" in
+# the same few seconds. Identical questions (same year + persona) that arrive
+# while one is already being answered wait for that answer instead of paying
+# for their own embed + retrieve + Gemini call. Streams fan out: every SSE
+# subscriber replays the tokens so far, then follows the live ones.
+# The upstream work runs in its own task, so a subscriber hanging up never
+# cancels it for the others.
+# ==============================================================================
+
+def flight_key(message, year, mode):
+    return (" ".join(re.findall(r"\w+", message.lower())), year, mode)
+
+class _Broadcast:
+    """Events of one upstream stream, replayable by any number of subscribers"""
+
+    def __init__(self):
+        self.events = []
+        self.done = False
+        self.error = None
+        self.changed = asyncio.Condition()
+        self.task = None
+
+    async def publish(self, event=None, error=None, done=False):
+        async with self.changed:
+            if event is not None:
+                self.events.append(event)
+            self.error = error
+            self.done = done
+            self.changed.notify_all()
+
+    async def subscribe(self):
+        seen = 0
+        while True:
+            async with self.changed:
+                await self.changed.wait_for(lambda: len(self.events) > seen or self.done)
+                fresh, seen = self.events[seen:], len(self.events)
+                finished, error = self.done, self.error
+            for event in fresh:
+                yield event
+            if finished and seen == len(self.events):
+                if error is not None:
+                    raise error
+                return
+
+class SingleFlight:
+    def __init__(self):
+        self._answers = {}  # key -> Task
+        self._streams = {}  # key -> _Broadcast
+        self.stats = {"leaders": 0, "coalesced": 0, "stream_leaders": 0, "stream_coalesced": 0}
+
+    async def run(self, key, compute):
+        """await compute() once per key at a time; concurrent callers share the result"""
+        task = self._answers.get(key)
+        if task is None:
+            task = asyncio.ensure_future(compute())
+            self._answers[key] = task
+            task.add_done_callback(lambda _: self._answers.pop(key, None))
+            self.stats["leaders"] += 1
+        else:
+            self.stats["coalesced"] += 1
+        return await asyncio.shield(task)
+
+    async def stream(self, key, open_stream):
+        """Iterate open_stream() once per key at a time; concurrent callers get every event"""
+        broadcast = self._streams.get(key)
+        if broadcast is None:
+            broadcast = _Broadcast()
+            self._streams[key] = broadcast
+            self.stats["stream_leaders"] += 1
+            # Held on the broadcast so the event loop can't garbage-collect the task
+            broadcast.task = asyncio.ensure_future(self._pump(key, broadcast, open_stream))
+        else:
+            self.stats["stream_coalesced"] += 1
+        async for event in broadcast.subscribe():
+            yield event
+
+    async def _pump(self, key, broadcast, open_stream):
+        try:
+            async for event in open_stream():
+                await broadcast.publish(event)
+            await broadcast.publish(done=True)
+        except Exception as e:
+            await broadcast.publish(error=e, done=True)
+        finally:
+            # New askers after this point start a fresh flight (or hit the answer cache)
+            if self._streams.get(key) is broadcast:
+                del self._streams[key]
+
+    def report(self):
+        return {
+            **self.stats,
+            "upstream_calls_saved": self.stats["coalesced"] + self.stats["stream_coalesced"],
+            "in_flight": len(self._answers) + len(self._streams),
+        }
@@ -0,0 +1,266 @@
+import asyncio
+import json
+import os
+import re
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from llama_index.core.retrievers import BaseRetriever
+from llama_index.core.schema import NodeWithScore
+from llama_index.core.vector_stores.utils import metadata_dict_to_node, node_to_metadata_dict
+
+from segments import SegmentLog, merge
+
+# ==============================================================================
+# 🔎 SPARSE (BM25) INDEX + HYBRID RETRIEVAL
+# Dense vectors are bad at exact tokens like "18CS51" or "lab 4". update_brain.py
+# also builds a BM25 inverted index per year, and the API searches it alongside
+# the vector store and merges both lists with reciprocal rank fusion.
+#
+# Layout:  SPARSE_INDEX_DIR/year=<y>/terms.json    sorted vocabulary
+#                                   /offsets.npy   int64, postings slice per term
+#                                   /docs.npy      int32 doc numbers (sorted per term)
+#                                   /tfs.npy       uint16 term frequencies
+#                                   /lengths.npy   int32 tokens per doc
+#                                   /nodes.json    node dicts, by doc number
+#          SPARSE_INDEX_DIR/segments/     checkpoint deltas until compact() (segments.py)
+# ==============================================================================
+
+TOKEN_RE = re.compile(r"[a-z0-9]+")
+STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "for", "from", "in", "is", "it",
+    "of", "on", "or", "the", "this", "to", "was", "what", "when", "where", "which",
+    "who", "will", "with", "me", "my", "i", "you", "can", "pls", "please", "give", "link",
+}
+
+def tokenize(text):
+    return [t for t in TOKEN_RE.findall(text.lower()) if t not in STOPWORDS and len(t) > 1]
+
+def node_record(node):
+    return {
+        "id": node.node_id,
+        "ref_doc_id": node.ref_doc_id,
+        "node": node_to_metadata_dict(node, remove_text=False, flat_metadata=False),
+    }
+
+class SparsePartition:
+    """BM25 over one year's chunks"""
+
+    def __init__(self, terms, offsets, docs, tfs, lengths, nodes, k1=1.2, b=0.75):
+        self.vocab = {term: i for i, term in enumerate(terms)}
+        self.offsets = offsets
+        self.docs = docs
+        self.tfs = tfs
+        self.lengths = lengths
+        self.nodes = nodes
+        self.k1 = k1
+        self.b = b
+        self.avg_length = float(lengths.mean()) if len(lengths) else 1.0
+
+    @classmethod
+    def load(cls, path):
+        with open(os.path.join(path, "terms.json")) as f:
+            terms = json.load(f)
+        with open(os.path.join(path, "nodes.json")) as f:
+            nodes = json.load(f)
+        arrays = [np.load(os.path.join(path, f"{name}.npy"), mmap_mode="r")
+                  for name in ("offsets", "docs", "tfs", "lengths")]
+        return cls(terms, *arrays, nodes)
+
+    def search(self, query, k, match_all=False):
+        """Returns [(node record, bm25 score)], best first. match_all: every query term must appear"""
+        n_docs = len(self.nodes)
+        terms = set(tokenize(query))
+        if not n_docs or not terms:
+            return []
+        scores = np.zeros(n_docs, dtype=np.float32)
+        matched = np.zeros(n_docs, dtype=np.int32)
+        for term in terms:
+            t = self.vocab.get(term)
+            if t is None:
+                if match_all:
+                    return []
+                continue
+            start, end = self.offsets[t], self.offsets[t + 1]
+            docs = self.docs[start:end]
+            tfs = self.tfs[start:end].astype(np.float32)
+            idf = np.log(1 + (n_docs - len(docs) + 0.5) / (len(docs) + 0.5))
+            norm = self.k1 * (1 - self.b + self.b * self.lengths[docs] / self.avg_length)
+            scores[docs] += idf * tfs * (self.k1 + 1) / (tfs + norm)
+            matched[docs] += 1
+
+        if match_all:
+            scores[matched < len(terms)] = 0
+        hits = np.flatnonzero(scores)
+        if len(hits) > k:
+            hits = hits[np.argpartition(-scores[hits], k - 1)[:k]]
+        hits = hits[np.argsort(-scores[hits])]
+        return [(self.nodes[i], float(scores[i])) for i in hits]
+
+def _rows(partition):
+    """[(node id, (term Counter, node record))] of a partition, rebuilt from its postings"""
+    counts = [Counter() for _ in partition.nodes]
+    for term, t in partition.vocab.items():
+        start, end = partition.offsets[t], partition.offsets[t + 1]
+        for doc, tf in zip(partition.docs[start:end], partition.tfs[start:end]):
+            counts[doc][term] = int(tf)
+    return [(record["id"], (count, record)) for record, count in zip(partition.nodes, counts)]
+
+def _write_partition(folder, rows):
+    """rows: [(term Counter, node record)]"""
+    os.makedirs(folder, exist_ok=True)
+    records = [record for _, record in rows]
+    counts = [count for count, _ in rows]
+
+    postings = {}
+    for doc, count in enumerate(counts):
+        for term, tf in count.items():
+            postings.setdefault(term, []).append((doc, min(tf, 65535)))
+    terms = sorted(postings)
+    offsets = np.zeros(len(terms) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum([len(postings[t]) for t in terms])
+    flat = [p for t in terms for p in postings[t]]
+    arrays = {
+        "offsets": offsets,
+        "docs": np.array([d for d, _ in flat], dtype=np.int32),
+        "tfs": np.array([tf for _, tf in flat], dtype=np.uint16),
+        "lengths": np.array([sum(c.values()) for c in counts], dtype=np.int32),
+    }
+
+    for name, array in arrays.items():
+        np.save(os.path.join(folder, f"{name}.tmp.npy"), array)
+        os.replace(os.path.join(folder, f"{name}.tmp.npy"), os.path.join(folder, f"{name}.npy"))
+    for name, data in (("terms", terms), ("nodes", records)):
+        with open(os.path.join(folder, f"{name}.tmp.json"), "w") as f:
+            json.dump(data, f)
+        os.replace(os.path.join(folder, f"{name}.tmp.json"), os.path.join(folder, f"{name}.json"))
+
+class SparseIndex:
+    def __init__(self, path):
+        self.path = path
+        self.partitions = {}
+        self.segments = SegmentLog(path)
+        # Changes since the last persist() (see segments.py)
+        self._added = {}        # year -> {node id: (Counter, record)}
+        self._deleted = set()   # node ids
+        self._cleared = False
+        self._lock = threading.Lock()
+        self.reload()
+
+    def reload(self):
+        partitions = {}
+        if os.path.isdir(self.path):
+            for name in sorted(os.listdir(self.path)):
+                if name.startswith("year=") and os.path.exists(os.path.join(self.path, name, "nodes.json")):
+                    partitions[name[5:]] = SparsePartition.load(os.path.join(self.path, name))
+        self.partitions = partitions
+
+    def partition(self, year):
+        return self.partitions.get(year)
+
+    # --- WRITE (update_brain.py): persist() per checkpoint, compact() once per run ---
+    def add(self, nodes):
+        with self._lock:
+            for node in nodes:
+                year = str(node.metadata.get("year"))
+                self._added.setdefault(year, {})[node.node_id] = (Counter(tokenize(node.get_content())),
+                                                                  node_record(node))
+
+    def delete(self, ids):
+        ids = set(ids)
+        with self._lock:
+            for rows in self._added.values():
+                for node_id in ids & rows.keys():
+                    del rows[node_id]
+            self._deleted |= ids
+
+    def clear(self):
+        with self._lock:
+            self._added, self._deleted, self._cleared = {}, set(), True
+
+    def persist(self):
+        """Append the changes since the last call as one segment: costs the delta, not the corpus"""
+        with self._lock:
+            if not (any(self._added.values()) or self._deleted or self._cleared):
+                return
+            added = self._added
+
+            def write_rows(folder):
+                for year, rows in added.items():
+                    if rows:
+                        _write_partition(os.path.join(folder, f"year={year}"), list(rows.values()))
+
+            self.segments.write(self._deleted, self._cleared, write_rows)
+            self._added, self._deleted, self._cleared = {}, set(), False
+
+    def compact(self):
+        """Fold every persisted segment into the year partitions (one year in memory at a time)
+        and re-open them. Searches only see compacted data."""
+        with self._lock:
+            paths = self.segments.paths()
+            if not paths:
+                return
+            metas = [SegmentLog.meta(path) for path in paths]
+            touched = set().union(*(SegmentLog.years(path) for path in paths))
+            cleared = any(meta["clear"] for meta in metas)
+            deleted = set().union(*(meta["deleted"] for meta in metas))
+            for year in sorted(set(self.partitions) | touched):
+                base = self.partitions.get(year)
+                if year not in touched and not cleared and not deleted & {r["id"] for r in base.nodes}:
+                    continue  # nothing changed in this year
+                segments = []
+                for path, meta in zip(paths, metas):
+                    folder = os.path.join(path, f"year={year}")
+                    rows = _rows(SparsePartition.load(folder)) if os.path.isdir(folder) else []
+                    segments.append((meta, rows))
+                rows = merge(_rows(base) if base is not None else [], segments)
+                _write_partition(os.path.join(self.path, f"year={year}"), rows)
+            self.reload()
+            self.segments.remove()
+
+# ==============================================================================
+# 🤝 HYBRID RETRIEVER (dense + BM25, reciprocal rank fusion)
+# ==============================================================================
+
+_sparse_pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix="bm25")
+
+def reciprocal_rank_fusion(result_lists, top_k, k=60):
+    fused = {}
+    for results in result_lists:
+        for rank, hit in enumerate(results):
+            node_id = hit.node.node_id
+            entry = fused.setdefault(node_id, [0.0, hit])
+            entry[0] += 1.0 / (k + rank + 1)
+    ranked = sorted(fused.values(), key=lambda e: -e[0])[:top_k]
+    return [NodeWithScore(node=hit.node, score=score) for score, hit in ranked]
+
+class HybridRetriever(BaseRetriever):
+    def __init__(self, vector_retriever, sparse_index, year, top_k=4, candidates=10, **kwargs):
+        super().__init__(**kwargs)
+        self._vector = vector_retriever
+        self._sparse = sparse_index
+        self._year = year
+        self._top_k = top_k
+        self._candidates = candidates
+
+    def _sparse_search(self, query_bundle):
+        partition = self._sparse.partition(self._year)
+        if partition is None:
+            return []
+        return [NodeWithScore(node=metadata_dict_to_node(record["node"]), score=score)
+                for record, score in partition.search(" ".join(query_bundle.embedding_strs), self._candidates)]
+
+    def _retrieve(self, query_bundle):
+        # BM25 runs on a side thread while the dense query is in flight
+        sparse = _sparse_pool.submit(self._sparse_search, query_bundle)
+        dense = self._vector.retrieve(query_bundle)
+        return reciprocal_rank_fusion([dense, sparse.result()], self._top_k)
+
+    async def _aretrieve(self, query_bundle):
+        dense, sparse = await asyncio.gather(
+            self._vector.aretrieve(query_bundle),
+            asyncio.to_thread(self._sparse_search, query_bundle),
+        )
+        return reciprocal_rank_fusion([dense, sparse], self._top_k)
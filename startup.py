@@ -0,0 +1,139 @@
+import asyncio
+import builtins
+import sys
+import threading
+import time
+
+# ==============================================================================
+# 🌅 FAST COLD START
+# On the free-tier host the process is often asleep, and every second before
+# uvicorn binds is a second the student stares at a spinner. So the server
+# binds with only FastAPI loaded; the heavy stacks (llama_index, google-genai,
+# Pinecone, Firebase) are imported and connected by a background Warmup that
+# also runs one dummy embed + query, so the first real request doesn't pay for
+# opening connections. "/" answers as soon as we're bound, "/ready" once the
+# warmup is done. Every first-time import until then is timed, so we can see
+# what a cold start actually spends its time on; the hook comes off once the
+# warmup finishes, so lazy imports on the request path don't pay for it.
+# ==============================================================================
+
+BOOT = time.perf_counter()
+
+# --- 1. IMPORT COSTS ---
+_imports = []  # (module, seconds including what it imports, nesting depth)
+_local = threading.local()
+_original_import = builtins.__import__
+
+def _timed_import(name, globals=None, locals=None, fromlist=(), level=0):
+    if level or name in sys.modules:
+        return _original_import(name, globals, locals, fromlist, level)
+    depth = getattr(_local, "depth", 0)
+    _local.depth = depth + 1
+    started = time.perf_counter()
+    try:
+        return _original_import(name, globals, locals, fromlist, level)
+    finally:
+        _local.depth = depth
+        _imports.append((name, time.perf_counter() - started, depth))
+
+def profile_imports():
+    """Time every first-time import from here on (call before the heavy imports)"""
+    builtins.__import__ = _timed_import
+
+def stop_profiling():
+    """Put the original __import__ back (unless someone else has hooked it since)"""
+    if builtins.__import__ is _timed_import:
+        builtins.__import__ = _original_import
+
+def import_report(top=10):
+    """Slowest first-time imports as [(module, seconds, depth)], like python -X importtime"""
+    return sorted(_imports, key=lambda i: -i[1])[:top]
+
+# --- 2. BACKGROUND WARMUP ---
+class Warmup:
+    def __init__(self, retry_delay=5.0, max_delay=60.0):
+        self.retry_delay = retry_delay
+        self.max_delay = max_delay
+        self.steps = []    # (name, fn, required)
+        self.results = {}  # name -> {"ok", "seconds", "attempts", "error"}
+        self.state = "starting"
+        self.bound_at = None
+        self.ready_at = None
+        self._done = threading.Event()
+        self._thread = None
+        self._loop = None
+        self._ready_event = None  # asyncio twin of _done, so waiting requests don't hold threads
+
+    def step(self, name, fn, required=True):
+        """Steps run in order. A required step is retried until it works; an optional one
+        (a dummy embed, Firestore) gets one try and the server is ready without it."""
+        self.steps.append((name, fn, required))
+
+    def start(self):
+        """Call from the (async) startup hook: uvicorn binds the port as soon as it returns"""
+        self.bound_at = time.perf_counter()
+        try:
+            self._loop = asyncio.get_running_loop()
+            self._ready_event = asyncio.Event()
+        except RuntimeError:
+            pass
+        print(f"🔌 Binding after {self.bound_at - BOOT:.2f}s of imports + setup, warming up in the background...")
+        self._thread = threading.Thread(target=self._run, name="warmup", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        self.state = "warming"
+        for name, fn, required in self.steps:
+            attempts = 0
+            while True:
+                attempts += 1
+                started = time.perf_counter()
+                try:
+                    fn()
+                    self.results[name] = {"ok": True, "seconds": round(time.perf_counter() - started, 3),
+                                          "attempts": attempts}
+                    print(f"   🔥 {name}: {self.results[name]['seconds']:.2f}s")
+                    break
+                except Exception as e:
+                    self.results[name] = {"ok": False, "seconds": round(time.perf_counter() - started, 3),
+                                          "attempts": attempts, "error": str(e)}
+                    if not required:
+                        print(f"   ⚠️ {name} failed, continuing without it: {e}")
+                        break
+                    delay = min(self.max_delay, self.retry_delay * 2 ** (attempts - 1))
+                    print(f"   ❌ {name} failed (retrying in {delay:.0f}s): {e}")
+                    time.sleep(delay)
+
+        stop_profiling()
+        self.ready_at = time.perf_counter()
+        self.state = "ready"
+        self._done.set()
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._ready_event.set)
+        print(f"🟢 Ready: boot -> bind {self.bound_at - BOOT:.2f}s, bind -> ready {self.ready_at - self.bound_at:.2f}s")
+        print("🐢 Slowest imports: " + ", ".join(f"{m} {s:.2f}s" for m, s, _ in import_report(5)))
+
+    @property
+    def ready(self):
+        return self._done.is_set()
+
+    async def wait(self, timeout):
+        """True once warm; requests that arrive early wait here instead of failing"""
+        if self.ready:
+            return True
+        if self._ready_event is None:
+            return await asyncio.to_thread(self._done.wait, timeout)
+        try:
+            await asyncio.wait_for(self._ready_event.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        return self.ready
+
+    def report(self):
+        return {
+            "state": self.state,
+            "boot_to_bind_s": round(self.bound_at - BOOT, 3) if self.bound_at else None,
+            "bind_to_ready_s": round(self.ready_at - self.bound_at, 3) if self.ready_at else None,
+            "steps": self.results,
+            "slowest_imports": [{"module": m, "seconds": round(s, 3), "depth": d} for m, s, d in import_report()],
+        }
@@ -0,0 +1,36 @@
+import os
+import sys
+
+import pytest
+from llama_index.core.schema import MetadataMode
+
+# The modules live flat at the repo root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from chunking import Chunker, Deduper, build_nodes  # noqa: E402
+from fakes import FakeEmbedding, make_drive  # noqa: E402
+from local_store import LocalVectorStore  # noqa: E402
+from sparse_index import SparseIndex  # noqa: E402
+
+@pytest.fixture
+def corpus(tmp_path):
+    """A small synthetic corpus, indexed like update_brain.py does: (vector dir, BM25 dir)"""
+    index_dir, sparse_dir = str(tmp_path / "index"), str(tmp_path / "sparse")
+    drive, roots = make_drive(("1", "2"), files_per_year=3, seed=0)
+    chunker, deduper, embedder = Chunker(), Deduper(), FakeEmbedding()
+    store, sparse = LocalVectorStore(index_dir), SparseIndex(sparse_dir)
+    for year, root in roots.items():
+        for item in drive.files_under(root):
+            pages = list(enumerate(drive.blobs[item["id"]].decode().split("\f"), start=1))
+            metadata = {"file_link": item["webViewLink"], "file_name": item["name"], "path": item["name"]}
+            nodes, _, _ = build_nodes(chunker, deduper, item["id"], year, pages, metadata)
+            texts = [n.get_content(metadata_mode=MetadataMode.EMBED) for n in nodes]
+            for node, vector in zip(nodes, embedder.get_text_embedding_batch(texts)):
+                node.embedding = vector
+            store.add(nodes)
+            sparse.add(nodes)
+    store.persist()
+    sparse.persist()
+    store.compact()
+    sparse.compact()
+    return index_dir, sparse_dir
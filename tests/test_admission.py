@@ -0,0 +1,53 @@
+import asyncio
+
+import pytest
+
+from admission import AdmissionControl, Overloaded
+
+BUSY = AdmissionControl.user_key("busy-token", "10.0.0.1")
+STUDENT = AdmissionControl.user_key("student-token", "10.0.0.2")
+
+def test_shed_requests_keep_their_token():
+    async def scenario():
+        control = AdmissionControl(max_concurrent=1, max_queue=0, max_wait=1.0,
+                                   user_rate_per_min=0.001, user_burst=2)
+        async with control.admit(BUSY):
+            for _ in range(5):  # every one shed: queue full
+                with pytest.raises(Overloaded, match="queue full"):
+                    async with control.admit(STUDENT):
+                        pass
+        # The slot is free again and the student still has their whole burst
+        for _ in range(2):
+            async with control.admit(STUDENT):
+                pass
+        with pytest.raises(Overloaded, match="rate limited"):
+            async with control.admit(STUDENT):
+                pass
+        return control.stats
+
+    stats = asyncio.run(scenario())
+    assert stats["shed_queue_full"] == 5
+    assert stats["rate_limited"] == 1
+    assert stats["admitted"] == 3
+
+def test_timed_out_wait_refunds_the_token():
+    async def scenario():
+        control = AdmissionControl(max_concurrent=1, max_queue=4, max_wait=0.05,
+                                   user_rate_per_min=0.001, user_burst=1)
+        control.avg_seconds = 0.01  # so the wait estimate doesn't shed it up front
+        async with control.admit(BUSY):
+            with pytest.raises(Overloaded, match="waited too long"):
+                async with control.admit(STUDENT):
+                    pass
+        async with control.admit(STUDENT):
+            pass
+
+    asyncio.run(scenario())
+
+def test_rotating_tokens_does_not_buy_fresh_buckets():
+    control = AdmissionControl(user_rate_per_min=0.001, user_burst=1, users_per_ip=3)
+    for i in range(3):
+        control.charge(control.user_key(f"random-{i}", "10.0.0.9"))
+    with pytest.raises(Overloaded, match="rate limited"):
+        control.charge(control.user_key("random-3", "10.0.0.9"))
+    control.charge(control.user_key("random-0", "10.0.0.10"))  # another address is unaffected
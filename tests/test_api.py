@@ -0,0 +1,65 @@
+import os
+
+import pytest
+
+os.environ.setdefault("GOOGLE_API_KEY", "test-key")
+os.environ.setdefault("PINECONE_API_KEY", "test-key")
+
+from fastapi.testclient import TestClient  # noqa: E402
+from llama_index.core import Settings  # noqa: E402
+
+import api  # noqa: E402
+import vector_backend  # noqa: E402
+from embed_cache import CachedEmbedding, EmbeddingCache  # noqa: E402
+from fakes import FakeEmbedding, FakeLLM, FakeVectorStore  # noqa: E402
+
+@pytest.fixture
+def client(corpus, tmp_path, monkeypatch):
+    """The real app, with Gemini and Pinecone swapped for the offline fakes"""
+    index_dir, sparse_dir = corpus
+    connects = []
+
+    def connect(*args, **kwargs):
+        connects.append(args)
+        store = FakeVectorStore(index_dir)
+        return store, store
+
+    def fake_models():
+        api.embed_model = CachedEmbedding(FakeEmbedding(), EmbeddingCache())
+        Settings.embed_model = api.embed_model
+        Settings.llm = FakeLLM(tokens=5)
+
+    monkeypatch.setenv("SPARSE_INDEX_DIR", sparse_dir)
+    monkeypatch.setenv("ROUTER_LOG_PATH", str(tmp_path / "router.jsonl"))
+    monkeypatch.setattr(vector_backend, "connect", connect)
+    monkeypatch.setattr(api.warmup, "steps", [(name, fake_models if name == "gemini" else fn, required)
+                                              for name, fn, required in api.warmup.steps])
+    with TestClient(api.app) as test_client:
+        test_client.connects = connects
+        yield test_client
+
+def test_chat_reuses_one_retrieval_stack(client):
+    questions = ["explain deadlocks", "how does paging work", "explain deadlocks", "what is normalization"]
+    for n, question in enumerate(questions):
+        reply = client.post("/chat", json={"message": question, "year": str(n % 2 + 1), "mode": "The Professor"})
+        assert reply.status_code == 200
+        assert "hiccup" not in reply.json()["response"]
+
+    # One client + index for the process, whatever the number of requests, years or personas
+    assert api.retrieval_stack.stats["clients_built"] == 1
+    assert len(client.connects) == 1
+
+def test_request_metrics_use_route_templates(client):
+    for path in ["/", "/wp-admin.php", "/.env", "/admin/../etc/passwd"]:
+        client.get(path)
+    rendered = client.get("/metrics").text
+    assert 'path="/"' in rendered
+    assert 'path="unmatched"' in rendered
+    assert "wp-admin" not in rendered and ".env" not in rendered
+
+def test_rebuilding_the_app_does_not_duplicate_gauges(client):
+    api.build_brain()  # what a brain update does
+    rendered = client.get("/metrics").text
+    types = [line for line in rendered.splitlines() if line.startswith("# TYPE bmsit_")]
+    assert len(types) == len(set(types))
+    assert "# TYPE bmsit_router_routed gauge" in types
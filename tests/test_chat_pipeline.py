@@ -0,0 +1,87 @@
+import asyncio
+
+import pytest
+from llama_index.core.base.response.schema import Response, StreamingResponse
+
+from admission import AdmissionControl, Overloaded
+from chat_pipeline import ChatPipeline
+from fakes import FakeEmbedding
+
+class SlowEngine:
+    def __init__(self, calls, streaming):
+        self.calls = calls
+        self.streaming = streaming
+
+    def retrieve(self, query_bundle):
+        return []
+
+    async def asynthesize(self, query_bundle, nodes):
+        self.calls.append(query_bundle.query_str)
+        await asyncio.sleep(0.05)  # long enough for the other caller to join the flight
+        if self.streaming:
+            return StreamingResponse(response_gen=iter(["exams start ", "on the 12th"]), source_nodes=[])
+        return Response(response="exams start on the 12th", source_nodes=[])
+
+class Stack:
+    native_async_store = False
+
+    def __init__(self):
+        self.embed_model = FakeEmbedding(dimensions=16)
+        self.calls = []
+
+    def get_engine(self, year, mode, streaming=False):
+        return SlowEngine(self.calls, streaming)
+
+def pipeline():
+    admission = AdmissionControl(user_rate_per_min=0.001, user_burst=1)
+    return ChatPipeline(Stack(), admission=admission), admission
+
+A = AdmissionControl.user_key("student-a", "10.0.0.1")
+B = AdmissionControl.user_key("student-b", "10.0.0.2")
+QUESTION = "when are the exams?"
+
+def test_rate_limited_leader_does_not_shed_the_flight():
+    async def scenario():
+        chat, admission = pipeline()
+        admission.charge(A)  # A has used their burst
+        leader = asyncio.ensure_future(chat.answer(QUESTION, "1", "Friendly", user=A))
+        follower = asyncio.ensure_future(chat.answer(QUESTION, "1", "Friendly", user=B))
+        return chat, await asyncio.gather(leader, follower, return_exceptions=True)
+
+    chat, (a, b) = asyncio.run(scenario())
+    assert isinstance(a, Overloaded) and a.reason == "rate limited"
+    assert str(b) == "exams start on the 12th"
+    assert chat.stack.calls == [QUESTION]
+
+def test_user_out_of_tokens_cannot_ride_another_flight():
+    async def scenario():
+        chat, admission = pipeline()
+        admission.charge(A)
+        leader = asyncio.ensure_future(chat.answer(QUESTION, "1", "Friendly", user=B))
+        await asyncio.sleep(0)
+        follower = asyncio.ensure_future(chat.answer(QUESTION, "1", "Friendly", user=A))
+        return await asyncio.gather(leader, follower, return_exceptions=True)
+
+    b, a = asyncio.run(scenario())
+    assert str(b) == "exams start on the 12th"
+    assert isinstance(a, Overloaded)
+
+def test_streams_charge_each_caller_and_refund_failures():
+    async def collect(chat, user):
+        return [kind async for kind, _ in chat.stream(QUESTION, "1", "Friendly", user=user)]
+
+    async def scenario():
+        chat, admission = pipeline()
+        admission.charge(A)
+        a, b = await asyncio.gather(collect(chat, A), collect(chat, B), return_exceptions=True)
+        assert isinstance(a, Overloaded)
+        assert b[0] == "sources" and "token" in b and "generated" not in b
+        with pytest.raises(Overloaded):  # B paid for the answer it got
+            admission.charge(B)
+
+        chat.stack.get_engine = lambda *args, **kwargs: None  # the next flight fails
+        with pytest.raises(AttributeError):
+            await collect(chat, AdmissionControl.user_key("student-c", "10.0.0.3"))
+        admission.charge(AdmissionControl.user_key("student-c", "10.0.0.3"))  # refunded
+
+    asyncio.run(scenario())
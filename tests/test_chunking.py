@@ -0,0 +1,37 @@
+import pytest
+
+import chunking
+from chunking import Deduper
+
+BASE = 0x0123_4567_89AB_CDEF
+
+def flip(fingerprint, *bits):
+    for bit in bits:
+        fingerprint ^= 1 << bit
+    return fingerprint
+
+@pytest.fixture
+def fingerprints(monkeypatch):
+    """text -> simhash, so tests can pick exactly which bits differ"""
+    table = {}
+    monkeypatch.setattr(chunking, "simhash", lambda text: table[text])
+    return table
+
+@pytest.mark.parametrize("distance", [0, 3, 5, 12])
+def test_finds_every_near_duplicate_within_the_distance(fingerprints, distance):
+    deduper = Deduper(max_distance=distance)
+    fingerprints["original"] = BASE
+    # One differing bit in each 16-bit band (and more): the fixed 4x16 index missed these past 3
+    fingerprints["near"] = flip(BASE, *[(i * 13 + 7) % 64 for i in range(distance)])
+    fingerprints["far"] = flip(BASE, *[(i * 13 + 7) % 64 for i in range(distance + 1)])
+    assert deduper.check("1", "original", "a")[2] is None
+    assert deduper.check("1", "near", "b")[2] == "a"
+    assert deduper.check("1", "far", "c")[2] is None
+
+def test_default_keeps_four_16_bit_bands():
+    assert Deduper(max_distance=3)._bands == [(0, 0xFFFF), (16, 0xFFFF), (32, 0xFFFF), (48, 0xFFFF)]
+
+@pytest.mark.parametrize("distance", [-1, 64])
+def test_rejects_impossible_distances(distance):
+    with pytest.raises(ValueError):
+        Deduper(max_distance=distance)
@@ -0,0 +1,37 @@
+import asyncio
+import threading
+
+from embed_cache import CachedEmbedding, EmbeddingCache
+from fakes import FakeEmbedding
+from shared_cache import SharedCache
+
+class WatchedSharedCache(SharedCache):
+    """Records which threads touch SQLite"""
+
+    def __init__(self, path):
+        super().__init__(path)
+        self.threads = []
+
+    def get(self, *args, **kwargs):
+        self.threads.append(threading.get_ident())
+        return super().get(*args, **kwargs)
+
+    def set(self, *args, **kwargs):
+        self.threads.append(threading.get_ident())
+        return super().set(*args, **kwargs)
+
+def test_async_query_embedding_keeps_sqlite_off_the_loop(tmp_path):
+    shared = WatchedSharedCache(str(tmp_path / "cache.sqlite"))
+    model = CachedEmbedding(FakeEmbedding(dimensions=8), EmbeddingCache(shared=shared), dimensions=8)
+
+    async def embed_twice():
+        loop_thread = threading.get_ident()
+        first = await model.aget_query_embedding("when are the exams")
+        model.cache._memory.clear()  # the second lookup has to go to SQLite
+        second = await model.aget_query_embedding("when are the exams")
+        return loop_thread, first, second
+
+    loop_thread, first, second = asyncio.run(embed_twice())
+    assert first == second
+    assert len(shared.threads) == 3  # miss + store, then a shared hit
+    assert loop_thread not in shared.threads
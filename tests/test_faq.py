@@ -0,0 +1,70 @@
+from types import SimpleNamespace
+
+import faq
+from manifest import SyncManifest
+
+QUESTIONS = {"1": ["When are the exams?", "What are the units in the syllabus?"]}
+MODES = ["Study Buddy", "The Bro"]
+
+def hit(file_id):
+    return SimpleNamespace(node=SimpleNamespace(ref_doc_id=file_id, metadata={"file_link": f"link-{file_id}"}))
+
+class Generator:
+    def __init__(self):
+        self.calls = []
+
+    def retrieve(self, year, question):
+        return [hit("timetable")] if "exam" in question.lower() else [hit("syllabus")]
+
+    def generate(self, year, mode, question, nodes):
+        self.calls.append((mode, question))
+        return f"{mode}: {question}"
+
+def manifest(**files):
+    result = SyncManifest(None)
+    result.files = {file_id: {"year": "1", "md5": md5, "name": file_id} for file_id, md5 in files.items()}
+    return result
+
+def refresh(store, files, generator):
+    return faq.refresh(store, QUESTIONS, MODES, files, generator.retrieve, generator.generate,
+                       prompt_for=lambda year, mode: f"prompt {mode}")
+
+def test_only_stale_answers_are_regenerated(tmp_path):
+    store, files = faq.FaqStore(str(tmp_path / "faq.json")), manifest(timetable="a", syllabus="b")
+    assert refresh(store, files, Generator())["generated"] == 4
+    store.save()
+
+    store, generator = faq.FaqStore(str(tmp_path / "faq.json")), Generator()
+    assert refresh(store, files, generator)["current"] == 4
+    assert generator.calls == []
+
+    files.files["timetable"]["md5"] = "changed"
+    refresh(store, files, generator)
+    assert sorted(generator.calls) == [(mode, "When are the exams?") for mode in MODES]
+
+def test_new_file_regenerates_only_answers_it_displaces(tmp_path):
+    store, files = faq.FaqStore(str(tmp_path / "faq.json")), manifest(timetable="a", syllabus="b")
+    generator = Generator()
+    refresh(store, files, generator)
+
+    # A new file nobody's top sources include: rechecked (retrieval only), no Gemini calls
+    files.files["lab"] = {"year": "1", "md5": "l", "name": "lab"}
+    generator.calls = []
+    report = refresh(store, files, generator)
+    assert report["rechecked"] == 4 and generator.calls == []
+    assert refresh(store, files, generator)["current"] == 4  # and it sticks
+
+    # A new circular that now answers the exam question: only that question is redone
+    files.files["circular"] = {"year": "1", "md5": "c", "name": "circular"}
+    generator.retrieve = lambda year, question: (
+        [hit("circular"), hit("timetable")] if "exam" in question.lower() else [hit("syllabus")])
+    report = refresh(store, files, generator)
+    assert sorted(generator.calls) == [(mode, "When are the exams?") for mode in MODES]
+    assert report["generated"] == 2 and report["rechecked"] == 2
+
+def test_lookup_matches_rephrased_questions_only():
+    lookup = faq.FaqLookup()
+    lookup.load([{"year": "1", "mode": "The Bro", "question": "When are the exams?", "answer": "5th", "links": ["x"]}])
+    assert lookup.match("when is the exam", "1", "The Bro").text == "5th"
+    assert lookup.match("exams for the lab", "1", "The Bro") is None
+    assert lookup.match("when are the exams", "2", "The Bro") is None
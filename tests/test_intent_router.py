@@ -0,0 +1,71 @@
+import asyncio
+import json
+import os
+
+import pytest
+
+from intent_router import IntentRouter
+
+DATABASE = {"1": "https://drive.example/year1"}
+TEMPLATES = {"Friendly": "Year {year}: {folder_link}{files}"}
+
+# CS subjects that happen to contain link / file / drive / materials
+SUBJECT_QUESTIONS = [
+    "explain the link between deadlock and starvation",
+    "data link layer protocols",
+    "teach me link state routing",
+    "need help understanding the link layer",
+    "I need help with file handling in python",
+    "I have a doubt about file handling in C",
+    "i want to understand materials science basics",
+    "any doubts regarding drive scheduling?",
+    "file allocation methods",
+]
+FILE_REQUESTS = [
+    "send the syllabus pdf link",
+    "what's the link for dbms notes",
+    "give me the timetable",
+    "where can I download last year's question papers",
+    "link to the lab manual",
+    "need 18cs51 notes",
+    "dbms notes",
+    "drive link",
+]
+
+@pytest.mark.parametrize("message", SUBJECT_QUESTIONS)
+def test_subject_questions_go_to_the_llm(message):
+    router = IntentRouter(DATABASE, TEMPLATES)
+    assert router.classify(message)[0] == "question"
+    assert asyncio.run(router.route(message, "1", "Friendly")) is None
+
+@pytest.mark.parametrize("message", FILE_REQUESTS)
+def test_file_requests_get_the_folder(message):
+    router = IntentRouter(DATABASE, TEMPLATES)
+    answer = asyncio.run(router.route(message, "1", "Friendly"))
+    assert answer is not None and DATABASE["1"] in answer.links
+
+def test_no_log_unless_a_path_is_given(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    router = IntentRouter(DATABASE, TEMPLATES)
+    assert asyncio.run(router.route("send the syllabus pdf link", "1", "Friendly")) is not None
+    router.flush()
+    assert router._log_queue is None
+    assert list(tmp_path.iterdir()) == []
+
+def test_decisions_are_written_in_the_background(tmp_path):
+    path = tmp_path / "logs" / "router.jsonl"
+    router = IntentRouter(DATABASE, TEMPLATES, log_path=str(path))
+    for message in ["send the syllabus pdf link", "what is normalisation?"]:
+        asyncio.run(router.route(message, "1", "Friendly"))
+    router.flush()
+    decisions = [json.loads(line) for line in path.read_text().splitlines()]
+    assert [d["route"] for d in decisions] == ["file", "question"]
+
+def test_log_rolls_over_past_the_size_cap(tmp_path):
+    path = tmp_path / "router.jsonl"
+    path.write_text("x" * 200 + "\n")
+    router = IntentRouter(DATABASE, TEMPLATES, log_path=str(path), log_max_mb=100 / (1024 * 1024))
+    asyncio.run(router.route("what is normalisation?", "1", "Friendly"))
+    router.flush()
+    assert os.path.exists(str(path) + ".1")
+    assert json.loads(path.read_text())["route"] == "question"
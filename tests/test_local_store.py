@@ -0,0 +1,37 @@
+import numpy as np
+from llama_index.core.schema import TextNode
+from llama_index.core.vector_stores.types import VectorStoreQuery
+
+from local_store import LocalVectorStore
+
+def node(node_id, axis, year="1"):
+    vector = np.zeros(8, np.float32)
+    vector[axis] = 1.0
+    return TextNode(id_=node_id, text=node_id, embedding=vector.tolist(), metadata={"year": year})
+
+def top(store, axis, k=1):
+    query = np.zeros(8, np.float32)
+    query[axis] = 1.0
+    return store.query(VectorStoreQuery(query_embedding=query.tolist(), similarity_top_k=k)).ids
+
+def test_segments_fold_into_partitions(tmp_path):
+    store = LocalVectorStore(str(tmp_path))
+    store.add([node("a", 0), node("b", 1), node("c", 2, year="2")])
+    store.persist()
+    store.compact()
+    assert top(store, 1) == ["b"]
+
+    # Checkpoints append deltas; queries keep seeing the compacted data until compact()
+    store.add([node("b", 3)])   # re-chunked: same ID, new vector
+    store.persist()
+    store.delete(ids=["a"])
+    store.persist()
+    assert len(store._segments.paths()) == 2
+    assert top(store, 0) == ["a"]
+
+    reopened = LocalVectorStore(str(tmp_path))  # as if the run died before compacting
+    reopened.compact()
+    assert top(reopened, 3) == ["b"]
+    assert "a" not in top(reopened, 0, k=5)
+    assert reopened.describe_index_stats().total_vector_count == 2
+    assert reopened._segments.paths() == []
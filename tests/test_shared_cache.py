@@ -0,0 +1,43 @@
+import numpy as np
+from llama_index.core.base.response.schema import Response
+from llama_index.core.schema import NodeWithScore, TextNode
+
+import shared_cache
+from shared_cache import SharedAnswerCache, SharedCache, SharedRetrievalCache
+
+def hit(node_id, score=0.5):
+    node = TextNode(id_=node_id, text=f"text {node_id}", embedding=[0.1, 0.2], metadata={"file_link": "link"})
+    return NodeWithScore(node=node, score=score)
+
+def unit(axis):
+    vector = np.zeros(4, np.float32)
+    vector[axis] = 1.0
+    return vector
+
+def test_answer_round_trip_leaves_the_callers_answer_alone(tmp_path):
+    answers = SharedAnswerCache(SharedCache(str(tmp_path / "cache.sqlite")))
+    answer = Response(response="Exams start on the 5th", source_nodes=[hit("a")], metadata={"rerank": {"kept": 1}})
+    answers.store("1", "The Bro", unit(0), answer, latency_ms=120.0)
+    assert answer.source_nodes[0].node.embedding == [0.1, 0.2]
+
+    cached = answers.lookup("1", "The Bro", unit(0))
+    assert cached.response == "Exams start on the 5th"
+    assert cached.source_nodes[0].node.node_id == "a"
+    assert cached.source_nodes[0].node.metadata["file_link"] == "link"
+    assert cached.source_nodes[0].node.embedding is None
+    assert cached.metadata == {"rerank": {"kept": 1}}
+    assert answers.lookup("1", "ELI5", unit(0)) is None
+
+def test_retrieval_round_trip(tmp_path):
+    retrieval = SharedRetrievalCache(SharedCache(str(tmp_path / "cache.sqlite")))
+    retrieval.put("2", "paging", [hit("a", 0.9), hit("b", 0.4)])
+    nodes = retrieval.get("2", "paging")
+    assert [(n.node.node_id, n.score) for n in nodes] == [("a", 0.9), ("b", 0.4)]
+    assert retrieval.get("3", "paging") is None
+
+def test_namespace_cap_is_applied_with_the_size_checks(tmp_path, monkeypatch):
+    monkeypatch.setattr(shared_cache, "EVICT_EVERY", 10)
+    answers = SharedAnswerCache(SharedCache(str(tmp_path / "cache.sqlite")), max_entries=3)
+    for n in range(10):
+        answers.store("1", "ELI5", np.eye(16, dtype=np.float32)[n], Response(response=str(n)), latency_ms=1.0)
+    assert answers.shared.report()["entries"] == 3
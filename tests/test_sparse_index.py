@@ -0,0 +1,80 @@
+import os
+import threading
+
+from llama_index.core.schema import TextNode
+
+from sparse_index import SparseIndex
+
+def node(node_id, text, year="1"):
+    return TextNode(id_=node_id, text=text, metadata={"year": year, "file_link": f"link-{node_id}"})
+
+def ids(index, year="1"):
+    partition = index.partition(year)
+    return {record["id"] for record in partition.nodes} if partition is not None else set()
+
+def test_add_during_persist_keeps_committed_chunks(tmp_path, monkeypatch):
+    index = SparseIndex(str(tmp_path))
+    index.add([node("n1", "deadlocks and scheduling")])
+
+    # Another upsert worker adds a chunk while persist() is writing the segment
+    writer = threading.Thread(target=index.add, args=([node("n2", "paging and segmentation")],))
+    write = index.segments.write
+    def slow_write(*args):
+        if writer.ident is None:  # first persist only
+            writer.start()
+            writer.join(timeout=0.2)
+        return write(*args)
+    monkeypatch.setattr(index.segments, "write", slow_write)
+
+    index.persist()
+    writer.join()
+    index.persist()
+    index.compact()
+    assert ids(index) == {"n1", "n2"}
+    assert ids(SparseIndex(str(tmp_path))) == {"n1", "n2"}
+
+def test_delete_and_search(tmp_path):
+    index = SparseIndex(str(tmp_path))
+    index.add([node("a", "18CS51 lab manual"), node("b", "deadlocks in operating systems"), node("c", "x", year="2")])
+    index.persist()
+    index.delete(["b"])
+    index.persist()
+    index.compact()
+    assert ids(index) == {"a"}
+    assert ids(index, "2") == {"c"}
+    assert [record["id"] for record, _ in index.partition("1").search("18CS51", 5)] == ["a"]
+
+def test_checkpoints_write_only_the_delta(tmp_path):
+    index = SparseIndex(str(tmp_path))
+    index.add([node(f"n{i}", f"chunk {i} about paging") for i in range(50)])
+    index.persist()
+    index.compact()
+
+    # A checkpoint after one edit writes that one row, not the year
+    index.add([node("n1", "chunk 1 rewritten about deadlocks")])
+    index.delete(["n2"])
+    index.persist()
+    segment = index.segments.paths()[-1]
+    with open(os.path.join(segment, "year=1", "nodes.json")) as f:
+        assert f.read().count('"id"') == 1
+    assert ids(index) == {f"n{i}" for i in range(50)}  # searches see compacted data only
+
+    # A run that dies before compacting: the next one folds its segments in
+    reopened = SparseIndex(str(tmp_path))
+    reopened.compact()
+    assert ids(reopened) == {f"n{i}" for i in range(50)} - {"n2"}
+    assert [record["id"] for record, _ in reopened.partition("1").search("deadlocks", 5)] == ["n1"]
+    assert reopened.segments.paths() == []
+
+def test_clear_drops_everything_before_it(tmp_path):
+    index = SparseIndex(str(tmp_path))
+    index.add([node("old", "old chunk"), node("other", "other year", year="2")])
+    index.persist()
+    index.compact()
+    index.clear()
+    index.persist()
+    index.add([node("new", "new chunk")])
+    index.persist()
+    index.compact()
+    assert ids(index) == {"new"}
+    assert ids(index, "2") == set()
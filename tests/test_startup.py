@@ -0,0 +1,27 @@
+import builtins
+
+import startup
+
+def test_import_hook_is_removed_once_warm():
+    original = builtins.__import__
+    startup.profile_imports()
+    try:
+        assert builtins.__import__ is startup._timed_import
+        warmup = startup.Warmup()
+        warmup.step("noop", lambda: None)
+        warmup.start()
+        warmup._thread.join(timeout=5)
+        assert warmup.ready
+        assert builtins.__import__ is original
+    finally:
+        builtins.__import__ = original
+
+def test_stop_leaves_someone_elses_hook_alone():
+    original = builtins.__import__
+    other = lambda *args, **kwargs: original(*args, **kwargs)
+    builtins.__import__ = other
+    try:
+        startup.stop_profiling()
+        assert builtins.__import__ is other
+    finally:
+        builtins.__import__ = original
@@ -0,0 +1,23 @@
+import os
+
+# ==============================================================================
+# 🔀 VECTOR BACKEND SWITCH
+# VECTOR_BACKEND=pinecone (default) or local. Both hand back a LlamaIndex
+# vector store plus an "admin" client that answers describe_index_stats() and
+# delete(ids=... / delete_all=True): the Pinecone index, or the local store.
+# ==============================================================================
+
+BACKEND = os.getenv("VECTOR_BACKEND", "pinecone").lower()
+LOCAL_INDEX_DIR = os.getenv("LOCAL_INDEX_DIR", "local_index")
+
+def connect(api_key=None, index_name=None, pool_threads=1):
+    if BACKEND == "local":
+        from local_store import LocalVectorStore
+        store = LocalVectorStore(LOCAL_INDEX_DIR)
+        return store, store
+    # Imported here so only the backend in use gets loaded
+    from pinecone import Pinecone
+    from llama_index.vector_stores.pinecone import PineconeVectorStore
+    pc = Pinecone(api_key=api_key, pool_threads=pool_threads)
+    pinecone_index = pc.Index(index_name, pool_threads=pool_threads)
+    return PineconeVectorStore(pinecone_index=pinecone_index), pinecone_index